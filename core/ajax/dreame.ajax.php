@@ -29,6 +29,24 @@ try {
   if (init('action') == 'discover') {
     dreame::discoverRobots(init('login'), init('password'), init('address'));
     ajax::success();
+  } elseif (init('action') == 'fleetCommand') {
+    $blids = init('blids', array());
+    $id = dreame::sendFleetCommand(init('command'), is_array($blids) ? $blids : array());
+    ajax::success(dreame::waitDaemonResult('dreame::batch::' . $id));
+  } elseif (init('action') == 'queryProperties') {
+    $properties = init('properties', array());
+    $blids = init('blids', array());
+    $id = dreame::queryProperties(is_array($properties) ? $properties : array(), is_array($blids) ? $blids : array());
+    ajax::success(dreame::waitDaemonResult('dreame::batch::' . $id));
+  } elseif (init('action') == 'stats') {
+    dreame::queryStats();
+    ajax::success(dreame::waitDaemonResult('dreame::stats'));
+  } elseif (init('action') == 'missions') {
+    dreame::queryMissions(init('blid'), init('days', 30));
+    ajax::success(dreame::waitDaemonResult('dreame::missions'));
+  } elseif (init('action') == 'refreshMaps') {
+    dreame::refreshMaps(init('login'), init('password'));
+    ajax::success(dreame::waitDaemonResult('dreame::maps', 60));
   } elseif (init('action') == 'delete_config') {
     $configFile = __DIR__ . '/../../data/config.ini';
     if (!file_exists($configFile)) {
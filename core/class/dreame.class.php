@@ -28,6 +28,19 @@ class dreame extends eqLogic {
     const CFG_MAC = 'mac';
     const CFG_IP_ADDR = 'netinfo_addr';
 
+    // feedback keys stored in the equipment configuration, sent by the daemon only when they change
+    const CONFIG_FEEDBACK = [
+        'batInfo_mName' => 'battery_type',
+        'mac' => self::CFG_MAC,
+        'hwPartsRev_wlan0HwAddr' => self::CFG_MAC,
+        'sku' => 'sku',
+        'netinfo_addr' => 'netinfo_addr',
+        'netinfo_mask' => 'netinfo_mask',
+        'netinfo_gw' => 'netinfo_gw',
+        'netinfo_dns1' => 'netinfo_dns1',
+        'netinfo_dns2' => 'netinfo_dns2',
+    ];
+
     const MODEL_FAMILY_ROOMBA = 'Roomba';
     const MODEL_FAMILY_ROOMBA_CARPET_BOOST = 'RoombaCarpetBoost';
     const MODEL_FAMILY_BRAAVA = 'BraavaJet';
@@ -189,6 +202,12 @@ class dreame extends eqLogic {
         $cmd .= ' --topic_prefix "' . trim(str_replace('"', '\"', $topic_prefix)) . '"';
         $cmd .= " --excluded_blid '{$excluded_blid}'";
         $cmd .= ' --socketport ' . self::getSocketPort();
+        $cmd .= ' --workers ' . intval(config::byKey('workers', __CLASS__, 0));
+        $cmd .= ' --mqtt5 ' . intval(config::byKey('mqtt5', __CLASS__, 0));
+        $cmd .= ' --retain ' . intval(config::byKey('retain', __CLASS__, 0));
+        $cmd .= ' --refresh ' . intval(config::byKey('refresh', __CLASS__, 300));
+        $cmd .= ' --stale_deadline ' . intval(config::byKey('stale_deadline', __CLASS__, 300));
+        $cmd .= ' --duplicate_window ' . intval(config::byKey('duplicate_window', __CLASS__, 60));
         $cmd .= ' --callback ' . network::getNetworkAccess('internal', 'proto:127.0.0.1:port:comp') . '/plugins/dreame/core/php/jeedreame.php';
         $cmd .= ' --apikey ' . jeedom::getApiKey(__CLASS__);
         $cmd .= ' --pid ' . jeedom::getTmpFolder(__CLASS__) . '/daemon.pid';
@@ -247,6 +266,125 @@ class dreame extends eqLogic {
         ));
     }
 
+    /**
+     * Send one command to several robots in a single request to the daemon,
+     * per robot results are stored in cache 'dreame::batch::<id>'
+     *
+     * @param string $command eg 'dock', 'start'
+     * @param array $blids empty for all robots
+     * @return string request id
+     */
+    public static function sendFleetCommand($command, $blids = array()) {
+        $id = uniqid();
+        self::sendToDaemon(array(
+            'action' => 'command',
+            'id' => $id,
+            'command' => $command,
+            'blids' => array_values($blids)
+        ));
+        return $id;
+    }
+
+    /**
+     * Read several properties of several robots in a single request to the daemon,
+     * values per robot are stored in cache 'dreame::batch::<id>'
+     *
+     * @param array $properties eg ['batPct', 'state']
+     * @param array $blids empty for all robots
+     * @return string request id
+     */
+    public static function queryProperties($properties, $blids = array()) {
+        $id = uniqid();
+        self::sendToDaemon(array(
+            'action' => 'get',
+            'id' => $id,
+            'properties' => array_values($properties),
+            'blids' => array_values($blids)
+        ));
+        return $id;
+    }
+
+    /**
+     * Read the maps of the robots from the iRobot cloud so regions can be started by name,
+     * number of regions per robot is stored in cache 'dreame::maps'
+     *
+     * @param string $login iRobot account login
+     * @param string $password iRobot account password
+     * @param array $blids empty for all robots
+     */
+    public static function refreshMaps($login, $password, $blids = array()) {
+        cache::delete('dreame::maps');
+        self::sendToDaemon(array(
+            'action' => 'maps',
+            'login' => $login,
+            'password' => $password,
+            'blids' => array_values($blids)
+        ));
+    }
+
+    /**
+     * Wait for the answer of the daemon to a request, stored in cache by jeedreame.php
+     *
+     * @param string $key cache key of the answer
+     * @param int $timeout seconds
+     * @return mixed
+     */
+    public static function waitDaemonResult($key, $timeout = 10) {
+        $limit = microtime(true) + $timeout;
+        do {
+            $value = cache::byKey($key)->getValue(null);
+            if ($value !== null) {
+                return $value;
+            }
+            usleep(200000);
+        } while (microtime(true) < $limit);
+        throw new RuntimeException(__('Pas de réponse du démon', __FILE__));
+    }
+
+    /**
+     * Ask the daemon to publish again all values, configuration ones included, eg after a Jeedom restart
+     *
+     * @param array $blids empty for all robots
+     */
+    public static function resyncRobots($blids = array()) {
+        self::sendToDaemon(array(
+            'action' => 'resync',
+            'blids' => array_values($blids)
+        ));
+    }
+
+    public static function start() {
+        if (self::deamon_info()['state'] == 'ok') {
+            self::resyncRobots();
+        }
+    }
+
+    /**
+     * Ask the daemon for its internal statistics, result is stored in cache 'dreame::stats'
+     */
+    public static function queryStats() {
+        cache::delete('dreame::stats');
+        self::sendToDaemon(array('action' => 'stats'));
+    }
+
+    /**
+     * Ask the daemon for the missions of the last days, result is stored in cache 'dreame::missions'
+     *
+     * @param string $blid empty for all robots
+     * @param int $days
+     */
+    public static function queryMissions($blid = '', $days = 30) {
+        $params = array(
+            'action' => 'missions',
+            'days' => intval($days)
+        );
+        if ($blid != '') {
+            $params['blid'] = $blid;
+        }
+        cache::delete('dreame::missions');
+        self::sendToDaemon($params);
+    }
+
     /**
      *
      * @param string $blid
@@ -291,6 +429,8 @@ class dreame extends eqLogic {
             $eqLogic->save();
 
             event::add('dreame::newDevice');
+            // configuration values may have been received before the equipment existed
+            self::resyncRobots(array($blid));
         }
         if (is_object($eqLogic) && $eqLogic->getConfiguration(self::CFG_MODEL_FAMILY, self::MODEL_FAMILY_ROOMBA) == self::MODEL_FAMILY_ROOMBA && $robot_type != self::MODEL_FAMILY_ROOMBA) {
             $eqLogic->setConfiguration(self::CFG_MODEL_FAMILY, $robot_type);
@@ -311,57 +451,28 @@ class dreame extends eqLogic {
                     log::add(__CLASS__, 'debug', 'no robot yet, waiting first payload');
                     return;
                 }
+                // values are sent by the daemon in their final form
+                $configChanged = false;
                 foreach ($data as $key => $value) {
+                    if (isset(self::CONFIG_FEEDBACK[$key])) {
+                        $configKey = self::CONFIG_FEEDBACK[$key];
+                        $current = $roomba->getConfiguration($configKey);
+                        // the battery type is only set when unknown, as before
+                        if ($current != $value && ($configKey != 'battery_type' || $current == '')) {
+                            $roomba->setConfiguration($configKey, $value);
+                            $configChanged = true;
+                        }
+                        continue;
+                    }
                     switch ($key) {
-                        case 'error_message':
-                            $value = ($value == 'None') ? '' : $value;
-                            if ($value != '' || $roomba->getCmdInfoValue('error_message') != '') {
-                                $roomba->checkAndUpdateCmd('error_message', $value == 'None' ? '' : $value);
-                            }
-                            break;
-                        case 'batInfo_mName':
-                            if ($roomba->getConfiguration('battery_type', 'undefined') == 'undefined') {
-                                $roomba->setConfiguration('battery_type', $value);
-                                $roomba->save(true);
-                            }
-                            break;
                         case 'batPct':
                             $roomba->checkAndUpdateCmd('batPct', $value);
                             $roomba->batteryStatus($value);
                             break;
-                        case 'bin_full':
-                        case 'bin_present':
-                        case 'childLock':
-                            $roomba->checkAndUpdateCmd($key, $value === 'False' ? 0 : 1);
-                            break;
                         case 'padWetness_disposable':
                         case 'padWetness_reusable':
                             $roomba->checkAndUpdateCmd('padWetness', $value);
                             break;
-                        case 'netinfo_addr':
-                        case 'netinfo_mask':
-                        case 'netinfo_gw':
-                        case 'netinfo_dns1':
-                        case 'netinfo_dns2':
-                            if (filter_var($value, FILTER_VALIDATE_IP) !== false) {
-                                $roomba->setConfiguration($key, $value);
-                                $roomba->save(true);
-                            } elseif (filter_var($value, FILTER_VALIDATE_INT) !== false) {
-                                $roomba->setConfiguration($key, long2ip($value));
-                                $roomba->save(true);
-                            } else {
-                                log::add(__CLASS__, 'warning', "Unknown format: {$key}={$value}");
-                            }
-                            break;
-                        case 'mac':
-                        case 'hwPartsRev_wlan0HwAddr':
-                            $roomba->setConfiguration(self::CFG_MAC, $value);
-                            $roomba->save(true);
-                            break;
-                        case 'sku':
-                            $roomba->setConfiguration($key, $value);
-                            $roomba->save(true);
-                            break;
                         case 'lastCommand_pmap_id':
                         case 'lastCommand_regions':
                         case 'lastCommand_user_pmapv_id':
@@ -382,6 +493,9 @@ class dreame extends eqLogic {
                             }
                     }
                 }
+                if ($configChanged) {
+                    $roomba->save(true);
+                }
             }
         } else {
             log::add(__CLASS__, 'warning', 'Message is not for dreame');
@@ -393,9 +507,8 @@ class dreame extends eqLogic {
         if (empty($pmap_id) || empty($user_pmapv_id) || empty($regions) || !is_iterable($regions))
             return;
 
-        foreach ($regions as $region) {
-            log::add(__CLASS__, 'debug', "Detected region {$region}");
-            $decoded_region = json_decode($region, true);
+        foreach ($regions as $decoded_region) {
+            log::add(__CLASS__, 'debug', 'Detected region ' . json_encode($decoded_region));
 
             if (!isset($decoded_region['type'], $decoded_region['region_id'])) {
                 log::add(__CLASS__, 'debug', "no type or no id?");
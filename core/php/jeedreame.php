@@ -49,6 +49,14 @@ try {
                 'message' => $message,
             ));
         }
+    } elseif (isset($result['missions'])) {
+        cache::set('dreame::missions', $result['missions']);
+    } elseif (isset($result['batch'])) {
+        cache::set('dreame::batch::' . $result['batch']['id'], $result['batch']['results'], 60);
+    } elseif (isset($result['maps'])) {
+        cache::set('dreame::maps', $result['maps']);
+    } elseif (isset($result['stats'])) {
+        cache::set('dreame::stats', $result['stats']);
     } elseif (isset($result['msg'])) {
         if ($result['msg'] == 'NO_ROBOT') {
             message::add('dreame', __('Aucun robot configuré, veuillez lancer une découverte depuis la page de gestion des équipements du plugin', __FILE__), '', 'dreame_no_robot');
@@ -0,0 +1,47 @@
+<?php
+
+/* This file is part of Jeedom.
+ *
+ * Jeedom is free software: you can redistribute it and/or modify
+ * it under the terms of the GNU General Public License as published by
+ * the Free Software Foundation, either version 3 of the License, or
+ * (at your option) any later version.
+ *
+ * Jeedom is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU General Public License
+ * along with Jeedom. If not, see <http://www.gnu.org/licenses/>.
+ */
+try {
+    require_once __DIR__ . "/../../../../core/php/core.inc.php";
+    include_file('core', 'authentification', 'php');
+
+    if (!isConnect()) {
+        http_response_code(401);
+        die();
+    }
+
+    /** @var dreame */
+    $eqLogic = eqLogic::byId(init('id'));
+    if (!is_object($eqLogic) || $eqLogic->getEqType_name() != 'dreame') {
+        http_response_code(404);
+        die();
+    }
+
+    // coverage map of the current or last mission, written by the daemon
+    $file = __DIR__ . '/../../data/maps/' . basename($eqLogic->getLogicalId()) . '.png';
+    if (!file_exists($file)) {
+        http_response_code(404);
+        die();
+    }
+
+    header('Content-Type: image/png');
+    header('Cache-Control: no-cache, must-revalidate');
+    header('Content-Length: ' . filesize($file));
+    readfile($file);
+} catch (Exception $e) {
+    log::add('dreame', 'error', displayException($e));
+}
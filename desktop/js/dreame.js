@@ -184,4 +184,50 @@ $("#irobot_method").change(function () {
     $('.irobot_local').hide();
     $('.irobot_cloud').show();
   }
+});
+
+$('#md_modal_dreame_maps').dialog({
+  autoOpen: false,
+  width: '600',
+  closeText: '',
+  buttons: {
+    "{{Annuler}}": function () {
+      $(this).dialog("close");
+    },
+    "{{Continuer}}": function () {
+      $(this).dialog("close");
+      $('#div_alert').showAlert({ message: '{{Récupération des cartes en cours, veuillez patienter.}}', level: 'success' });
+      $.ajax({
+        type: "POST",
+        url: "plugins/dreame/core/ajax/dreame.ajax.php",
+        data: {
+          action: "refreshMaps",
+          login: $('#irobot_maps_login').value(),
+          password: $('#irobot_maps_password').value()
+        },
+        dataType: 'json',
+        global: false,
+        error: function (request, status, error) {
+          handleAjaxError(request, status, error);
+        },
+        success: function (data) {
+          if (data.state != 'ok') {
+            $('#div_alert').showAlert({ message: data.result, level: 'danger' });
+            return;
+          }
+          let regions = [];
+          for (const blid in data.result) {
+            regions.push(blid + ' : ' + (data.result[blid] === null ? '{{échec}}' : data.result[blid]));
+          }
+          $('#div_alert').showAlert({ message: '{{Pièces et zones récupérées}} ' + regions.join(', '), level: 'success' });
+        }
+      });
+    }
+  }
+});
+
+$('#bt_mapsdreame').on('click', function () {
+  $('#irobot_maps_login').val('');
+  $('#irobot_maps_password').val('');
+  $('#md_modal_dreame_maps').dialog('open');
 });
\ No newline at end of file
@@ -0,0 +1,90 @@
+/* This file is part of Jeedom.
+ *
+ * Jeedom is free software: you can redistribute it and/or modify
+ * it under the terms of the GNU General Public License as published by
+ * the Free Software Foundation, either version 3 of the License, or
+ * (at your option) any later version.
+ *
+ * Jeedom is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU General Public License
+ * along with Jeedom. If not, see <http://www.gnu.org/licenses/>.
+ */
+
+function dreameHealthRequest(_data, _success) {
+  $.ajax({
+    type: "POST",
+    url: "plugins/dreame/core/ajax/dreame.ajax.php",
+    data: _data,
+    dataType: 'json',
+    global: false,
+    error: function (request, status, error) {
+      handleAjaxError(request, status, error);
+    },
+    success: function (data) {
+      if (data.state != 'ok') {
+        $('#md_modal').showAlert({ message: data.result, level: 'danger' });
+        return;
+      }
+      _success(data.result);
+    }
+  });
+}
+
+function dreameHealthRow(_blid) {
+  return $('#table_healthdreame tr[data-blid="' + _blid + '"]');
+}
+
+$('#bt_refreshHealthdreame').off('click').on('click', function () {
+  dreameHealthRequest({ action: 'queryProperties', properties: ['state', 'batPct'] }, function (result) {
+    for (const blid in result) {
+      if (result[blid] === null) continue;
+      dreameHealthRow(blid).find('.healthState').text(result[blid].state);
+      dreameHealthRow(blid).find('.healthBattery').text(result[blid].batPct + '%');
+    }
+  });
+});
+
+$('#bt_fleetCommanddreame').off('click').on('click', function () {
+  const command = $('#sel_fleetCommanddreame').value();
+  bootbox.confirm('{{Envoyer la commande à tous les robots ?}}', function (confirmed) {
+    if (!confirmed) return;
+    dreameHealthRequest({ action: 'fleetCommand', command: command }, function (result) {
+      $('#table_healthdreame .healthCommand').text('');
+      for (const blid in result) {
+        dreameHealthRow(blid).find('.healthCommand').text(command + ' : ' + result[blid]);
+      }
+    });
+  });
+});
+
+$('#bt_missionsdreame').off('click').on('click', function () {
+  dreameHealthRequest({ action: 'missions', days: 30 }, function (result) {
+    const tbody = $('#table_missionsdreame tbody').empty();
+    result.reverse().forEach(function (mission) {
+      const tr = $('<tr>');
+      [
+        dreameHealthRow(mission.blid).attr('data-name') || mission.blid,
+        new Date(mission.start * 1000).toLocaleString(),
+        mission.duration,
+        mission.result,
+        mission.sqft === null ? '' : mission.sqft,
+        mission.recharges,
+        mission.stuck,
+        mission.evacs
+      ].forEach(function (value) {
+        tr.append($('<td>').text(value));
+      });
+      tbody.append(tr);
+    });
+  });
+});
+
+$('#bt_statsdreame').off('click').on('click', function () {
+  dreameHealthRequest({ action: 'stats' }, function (result) {
+    $('#pre_statsdreame').text(JSON.stringify(result, null, 2)).show();
+  });
+});
\ No newline at end of file
@@ -20,6 +20,20 @@ if (!isConnect('admin')) {
 }
 ?>
 
+<div class="input-group pull-right" style="display:inline-flex;margin-bottom:5px;">
+    <span class="input-group-btn">
+        <select class="form-control input-sm roundedLeft" id="sel_fleetCommanddreame" style="width:150px;">
+            <option value="start">{{Démarrer}}</option>
+            <option value="pause">{{Pause}}</option>
+            <option value="resume">{{Reprendre}}</option>
+            <option value="stop">{{Arrêter}}</option>
+            <option value="dock">{{Retour à la base}}</option>
+        </select>
+        <a class="btn btn-sm btn-warning" id="bt_fleetCommanddreame"><i class="fas fa-paper-plane"></i> {{Envoyer à tous les robots}}</a>
+        <a class="btn btn-sm btn-default roundedRight" id="bt_refreshHealthdreame"><i class="fas fa-sync"></i> {{Actualiser}}</a>
+    </span>
+</div>
+
 <table class="table table-condensed tablesorter" id="table_healthdreame">
     <thead>
         <tr>
@@ -29,20 +43,51 @@ if (!isConnect('admin')) {
             <th>{{Status}}</th>
             <th>{{Bac plein}}</th>
             <th>{{Batterie}}</th>
+            <th>{{Commande}}</th>
         </tr>
     </thead>
     <tbody>
         <?php
         /** @var dreame */
         foreach (dreame::byType('dreame', true) as $eqLogic) {
-            echo '<tr><td><a href="' . $eqLogic->getLinkToConfiguration() . '" style="text-decoration: none;">' . $eqLogic->getHumanName(true) . '</a></td>';
+            echo '<tr data-blid="' . $eqLogic->getLogicalId() . '" data-name="' . htmlspecialchars($eqLogic->getName()) . '"><td><a href="' . $eqLogic->getLinkToConfiguration() . '" style="text-decoration: none;">' . $eqLogic->getHumanName(true) . '</a></td>';
             echo '<td><span class="label label-info" style="font-size : 1em;">' . $eqLogic->getConfiguration(dreame::CFG_MAC) . '</span></td>';
             echo '<td><span class="label label-info" style="font-size : 1em;">' . $eqLogic->getConfiguration(dreame::CFG_IP_ADDR) . '</span></td>';
-            echo '<td><span class="label label-info" style="font-size : 1em;">' . $eqLogic->getCmdInfoValue('state') . '</span></td>';
+            echo '<td><span class="label label-info healthState" style="font-size : 1em;">' . $eqLogic->getCmdInfoValue('state') . '</span></td>';
             echo '<td><span class="label label-info" style="font-size : 1em;">' . $eqLogic->getCmdInfoValue('bin_full') . '</span></td>';
-            echo '<td><span class="label label-info" style="font-size : 1em;">' . $eqLogic->getCmdInfoValue('batPct') . '%</span></td>';
+            echo '<td><span class="label label-info healthBattery" style="font-size : 1em;">' . $eqLogic->getCmdInfoValue('batPct') . '%</span></td>';
+            echo '<td><span class="label label-default healthCommand" style="font-size : 1em;"></span></td>';
             echo '</tr>';
         }
         ?>
     </tbody>
-</table>
\ No newline at end of file
+</table>
+
+<legend>
+    <i class="fas fa-history"></i> {{Missions des 30 derniers jours}}
+    <a class="btn btn-sm btn-default pull-right" id="bt_missionsdreame"><i class="fas fa-list"></i> {{Afficher}}</a>
+</legend>
+<table class="table table-condensed" id="table_missionsdreame">
+    <thead>
+        <tr>
+            <th>{{Nom}}</th>
+            <th>{{Début}}</th>
+            <th>{{Durée (min)}}</th>
+            <th>{{Résultat}}</th>
+            <th>{{Surface (pi²)}}</th>
+            <th>{{Recharges}}</th>
+            <th>{{Blocages}}</th>
+            <th>{{Vidages}}</th>
+        </tr>
+    </thead>
+    <tbody>
+    </tbody>
+</table>
+
+<legend>
+    <i class="fas fa-chart-bar"></i> {{Statistiques du démon}}
+    <a class="btn btn-sm btn-default pull-right" id="bt_statsdreame"><i class="fas fa-list"></i> {{Afficher}}</a>
+</legend>
+<pre id="pre_statsdreame" style="display:none;max-height:400px;overflow:auto;"></pre>
+
+<?php include_file('desktop', 'health', 'js', 'dreame'); ?>
\ No newline at end of file
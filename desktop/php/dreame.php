@@ -33,6 +33,11 @@ $eqLogics = eqLogic::byType($plugin->getId());
                 <br>
                 <span>{{Découverte}}</span>
             </div>
+            <div class="cursor logoSecondary" id="bt_mapsdreame">
+                <i class="fas fa-map"></i>
+                <br>
+                <span>{{Cartes}}</span>
+            </div>
             <div class="cursor logoSecondary" id="bt_healthdreame">
                 <i class="fas fa-medkit"></i>
                 <br>
@@ -256,5 +261,26 @@ $eqLogics = eqLogic::byType($plugin->getId());
     </form>
 </div>
 
+<div id="md_modal_dreame_maps" title="{{Cartes des robots}}">
+    <form class="form-horizontal" style="overflow:hidden !important;">
+        <div class="alert alert-info globalRemark">
+            {{Saisissez l'adresse eMail et le mot de passe de votre compte iRobot afin que le plugin récupère les cartes et les noms des pièces de vos robots depuis le cloud, pour pouvoir lancer un nettoyage par nom de pièce.}}<br>
+            {{Ces informations ne sont pas sauvegardées.}}
+        </div>
+        <div class="form-group">
+            <label class="col-sm-6 control-label">{{Identifiant}}</label>
+            <div class="col-sm-6">
+                <input type="text" class="form-control" id="irobot_maps_login" placeholder="{{Adresse eMail iRobot}}" />
+            </div>
+        </div>
+        <div class="form-group">
+            <label class="col-sm-6 control-label">{{Mot de passe}}</label>
+            <div class="col-sm-6">
+                <input type="password" class="form-control" id="irobot_maps_password" placeholder="{{Mot de passe iRobot}}" />
+            </div>
+        </div>
+    </form>
+</div>
+
 <?php include_file('desktop', 'dreame', 'js', 'dreame'); ?>
 <?php include_file('core', 'plugin.template', 'js'); ?>
\ No newline at end of file
@@ -31,6 +31,54 @@ if (!isConnect()) {
                 <input class="configKey form-control" data-l1key="socketport" placeholder="55072" />
             </div>
         </div>
+        <div class="form-group">
+            <label class="col-sm-4 control-label">{{Processus de traitement}}
+                <sup><i class="fas fa-question-circle tooltips" title="{{Nombre de processus se partageant les robots, 0 pour tout traiter dans le démon. Utile uniquement avec de nombreux robots.}}"></i></sup>
+            </label>
+            <div class="col-sm-2">
+                <input class="configKey form-control" data-l1key="workers" placeholder="0" />
+            </div>
+        </div>
+        <div class="form-group">
+            <label class="col-sm-4 control-label">{{MQTT v5}}
+                <sup><i class="fas fa-question-circle tooltips" title="{{Utiliser MQTT v5 avec le broker local s'il le supporte (alias de topics, expiration des valeurs fugaces), MQTT 3.1.1 sinon.}}"></i></sup>
+            </label>
+            <div class="col-sm-2">
+                <input type="checkbox" class="configKey" data-l1key="mqtt5" />
+            </div>
+        </div>
+        <div class="form-group">
+            <label class="col-sm-4 control-label">{{Conserver le dernier état}}
+                <sup><i class="fas fa-question-circle tooltips" title="{{Les valeurs qui changent rarement (modèle, firmware, réseau, programmation, cartes, statut) sont conservées par le broker (retain).}}"></i></sup>
+            </label>
+            <div class="col-sm-2">
+                <input type="checkbox" class="configKey" data-l1key="retain" />
+            </div>
+        </div>
+        <div class="form-group">
+            <label class="col-sm-4 control-label">{{Republication complète (s)}}
+                <sup><i class="fas fa-question-circle tooltips" title="{{Intervalle de republication de toutes les valeurs, 0 pour désactiver.}}"></i></sup>
+            </label>
+            <div class="col-sm-2">
+                <input class="configKey form-control" data-l1key="refresh" placeholder="300" />
+            </div>
+        </div>
+        <div class="form-group">
+            <label class="col-sm-4 control-label">{{Délai de silence maximum (s)}}
+                <sup><i class="fas fa-question-circle tooltips" title="{{Durée maximum sans message d'un robot avant de relancer sa connexion (30 minimum).}}"></i></sup>
+            </label>
+            <div class="col-sm-2">
+                <input class="configKey form-control" data-l1key="stale_deadline" placeholder="300" />
+            </div>
+        </div>
+        <div class="form-group">
+            <label class="col-sm-4 control-label">{{Fenêtre de messages identiques (s)}}
+                <sup><i class="fas fa-question-circle tooltips" title="{{Durée pendant laquelle un message identique à un message déjà traité est ignoré, 0 pour désactiver.}}"></i></sup>
+            </label>
+            <div class="col-sm-2">
+                <input class="configKey form-control" data-l1key="duplicate_window" placeholder="60" />
+            </div>
+        </div>
         <legend><i class="fas fa-skull-crossbones"></i> {{Zone danger}}</legend>
         <div class="form-group">
             <label class="col-sm-4 control-label">{{Configuration robots}}</label>
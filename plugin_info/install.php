@@ -45,6 +45,10 @@ function dreame_update() {
     config::save("api::{$pluginId}::restricted", 1);
     config::save('topic_prefix', null, $pluginId);
 
+    foreach (eqLogic::byType($pluginId) as $eqLogic) {
+        $eqLogic->createCommands();
+    }
+
     unlink(__DIR__ . '/packages.json');
 
     $dependencyInfo = dreame::dependancy_info();
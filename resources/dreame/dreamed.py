@@ -1,9 +1,22 @@
 import asyncio
+import json
+import logging
 import os
 from pathlib import Path
 
 from irobot.irobot import iRobot
 from irobot.configs import iRobotConfigs
+from irobot.missions import iRobotMissionLog
+from irobot.scheduler import iRobotScheduler
+from irobot.executors import default_executors
+from irobot.loopmonitor import iRobotLoopMonitor
+from irobot.startup import iRobotStartupReport, process_start
+from irobot.batch import batch_command, bulk_get
+from irobot.logs import setup_queue_logging
+from irobot.publisher import clear_retained
+from irobot.regions import iRobotRegionCatalogue
+from irobot.topicfilter import iRobotTopicFilters
+from irobot.fleet import iRobotFleet
 
 from jeedomdaemon.base_daemon import BaseDaemon
 from jeedomdaemon.base_config import BaseConfig
@@ -19,6 +32,12 @@ class DaemonConfig(BaseConfig):
         self.add_argument("--password", help="mqtt password", type=str)
         self.add_argument("--topic_prefix", help="topic_prefix", type=str, default='iRobot')
         self.add_argument("--excluded_blid", type=str)
+        self.add_argument("--mqtt5", help="use MQTT v5 with the local broker when available", type=int, default=0)
+        self.add_argument("--retain", help="retain the slow changing feedback values on the broker", type=int, default=0)
+        self.add_argument("--refresh", help="seconds between two publications of all values, 0 to disable", type=int, default=300)
+        self.add_argument("--stale_deadline", help="max seconds without message from a robot before reconnecting it", type=int, default=300)
+        self.add_argument("--duplicate_window", help="seconds during which a frame identical to one already processed is skipped, 0 to disable", type=int, default=60)
+        self.add_argument("--workers", help="number of worker processes, 0 to handle all robots in the daemon process", type=int, default=0)
 
     @property
     def mqtt_host(self):
@@ -45,81 +64,269 @@ class DaemonConfig(BaseConfig):
         blids = str(self._args.excluded_blid)
         return [str(x) for x in blids.split(',') if x != '']
 
+    @property
+    def mqtt5(self):
+        return bool(self._args.mqtt5)
+
+    @property
+    def retain(self):
+        return bool(self._args.retain)
+
+    @property
+    def refresh(self):
+        return max(0, int(self._args.refresh))
+
+    @property
+    def stale_deadline(self):
+        return max(30, int(self._args.stale_deadline))
+
+    @property
+    def duplicate_window(self):
+        return max(0, int(self._args.duplicate_window))
+
+    @property
+    def workers(self):
+        return max(0, int(self._args.workers))
+
 
 class dreame(BaseDaemon):
     def __init__(self) -> None:
+        self._startup = iRobotStartupReport(process_start())
+        self._startup.mark('import')
         self._config = DaemonConfig()
         super().__init__(self._config, self.on_start, self.on_message, self.on_stop)
+        # log records are written by a background thread, not by the event loop
+        setup_queue_logging()
 
         # self.set_logger_log_level('iRobot')
 
         self._robot_configs: iRobotConfigs = None
-        self._robots: list[iRobot] = []
+        self._data_path: Path = None
+        self._mission_log: iRobotMissionLog = None
+        self._scheduler = iRobotScheduler()
+        self._scheduler_task: asyncio.Task = None
+        self._loop_monitor = iRobotLoopMonitor()
+        self._supervisor = None
+        self._fleet = iRobotFleet(self.__create_robot, on_robot_online=self.__on_robot_online)
+        self._cloud = None
 
     async def on_start(self):
+        self._loop_monitor.start()
+        self._scheduler_task = asyncio.create_task(self._scheduler.run())
         basedir = os.path.dirname(__file__)
-        configFile = Path(os.path.abspath(basedir + '/../../data'))
-        self._robot_configs = iRobotConfigs(path=configFile)
+        self._data_path = Path(os.path.abspath(basedir + '/../../data'))
+        self._robot_configs = iRobotConfigs(path=self._data_path)
+        self._mission_log = iRobotMissionLog(self._data_path/'missions')
+        self._startup.mark('config_load')
 
         if len(self._robot_configs.robots) == 0:
             self._logger.info('No robot configured, trying auto discovery')
             await self._robot_configs.discover()
 
+        if self._config.workers > 0:
+            from irobot.shards import iRobotShardSupervisor
+            self._supervisor = iRobotShardSupervisor(self._config.workers, self.__worker_settings(), self._mission_log,
+                                                     on_robot_online=self.__on_robot_online,
+                                                     on_config_change=self._robot_configs.update)
+
         if len(self._robot_configs.robots) == 0:
             self._logger.warning('No robot configured, please run discovery from plugin page')
             await self.send_to_jeedom({'msg': "NO_ROBOT"})
-        else:
-            asyncio.create_task(self.__connect_robots())
+        if self._supervisor is not None:
+            # workers are started even without robot so a later discovery only has to reload them
+            await self._supervisor.start()
+        elif len(self._robot_configs.robots) > 0:
+            asyncio.create_task(self.__reconcile_robots())
+        self._startup.mark('daemon_started')
+        self._startup.write(self._data_path/'startup.json')
+        await self.__clear_retained()
+
+    def __on_robot_online(self, blid: str):
+        if 'first_robot_online' not in self._startup:
+            self._startup.mark('first_robot_online')
+            self._startup.write(self._data_path/'startup.json')
+
+    def __save_robot_configs(self, config):
+        '''
+        the robot may hold a config object replaced since by a discovery
+        '''
+        self._robot_configs.update(config.blid, {'ip': config.ip, 'mac': config.mac})
+
+    def __worker_settings(self):
+        return {
+            'data_path': str(self._data_path),
+            'log_level': logging.getLogger().getEffectiveLevel(),
+            'mqtt_host': self._config.mqtt_host,
+            'mqtt_port': self._config.mqtt_port,
+            'mqtt_user': self._config.mqtt_user,
+            'mqtt_password': self._config.mqtt_password,
+            'topic_prefix': self._config.topic_prefix,
+            'mqtt5': self._config.mqtt5,
+            'retain': self._config.retain,
+            'refresh': self._config.refresh,
+            'stale_deadline': self._config.stale_deadline,
+            'duplicate_window': self._config.duplicate_window,
+            'excluded_blid': self._config.excluded_blid
+        }
 
     async def on_stop(self):
-        await self.__disconnect_robots()
+        if self._supervisor is not None:
+            await self._supervisor.stop()
+        await self._fleet.stop()
+        if self._cloud is not None:
+            await self._cloud.close()
+        default_executors().shutdown(wait=False)
+        if self._scheduler_task is not None:
+            self._scheduler_task.cancel()
+        self._loop_monitor.stop()
 
     async def on_message(self, message: list):
         if message['action'] == 'discover':
             try:
                 result = await self._robot_configs.discover(message['address'], message['login'], message['password'])
+                if result and self._supervisor is not None:
+                    self._supervisor.reload()
+                elif result:
+                    await self.__reconcile_robots()
                 if result:
-                    await self.__connect_robots()
+                    await self.__clear_retained()
                 await self.send_to_jeedom({'discover': result})
+                if result and message['login'] and message['password']:
+                    await self.send_to_jeedom({'maps': await self.__refresh_maps(message['login'], message['password'])})
             except Exception as e:
                 self._logger.error('Exception during discovery: %s', e)
                 await self.send_to_jeedom({'discover': False})
+        elif message['action'] == 'missions':
+            missions = await asyncio.get_running_loop().run_in_executor(default_executors().decode, self._mission_log.query, message.get('blid'), int(message.get('days', 30)))
+            await self.send_to_jeedom({'missions': missions})
+        elif message['action'] in ['command', 'get']:
+            await self.send_to_jeedom({'batch': await self.__batch(message)})
+        elif message['action'] == 'maps':
+            await self.send_to_jeedom({'maps': await self.__refresh_maps(message['login'], message['password'], message.get('blids') or None)})
+        elif message['action'] == 'stats':
+            await self.send_to_jeedom({'stats': self.__stats()})
+        elif message['action'] == 'resync':
+            blids = message.get('blids') or None
+            if self._supervisor is not None:
+                self._supervisor.resync(blids)
+            else:
+                for robot in self._fleet.robots.values():
+                    if blids is None or robot.blid in blids:
+                        asyncio.create_task(robot.resync())
+
+    async def __batch(self, message: dict):
+        '''
+        one command sent to several robots, or several properties read from several robots
+        '''
+        blids = message.get('blids') or None
+        if self._supervisor is not None:
+            results = await self._supervisor.request(message)
+        elif message['action'] == 'command':
+            results = await batch_command(self._fleet.robots, blids, message['command'])
+        else:
+            results = bulk_get(self._fleet.robots, blids, message.get('properties', []))
+        return {'id': message.get('id'), 'action': message['action'], 'results': results}
 
-    async def __connect_robots(self):
-        await self.__disconnect_robots()
+    async def __clear_retained(self):
+        '''
+        remove from the broker the retained feedback of robots now excluded or removed,
+        or of all robots if retain mode has been disabled
+        '''
+        index = self._data_path/'retained.json'
+        try:
+            known = set(json.loads(index.read_text(encoding='utf-8')))
+        except (OSError, ValueError):
+            known = set()
+        active = set()
+        if self._config.retain:
+            active = {blid for blid in self._robot_configs.robots if blid not in self._config.excluded_blid}
+        stale = known - active
+        if stale:
+            topics = [f"{self._config.topic_prefix}/feedback/{blid}" for blid in stale]
+            try:
+                cleared = await asyncio.get_running_loop().run_in_executor(
+                    default_executors().connect, clear_retained, self._config.mqtt_host, self._config.mqtt_port,
+                    self._config.mqtt_user, self._config.mqtt_password, topics)
+                self._logger.info('Cleared %i retained topic(s) of %i robot(s)', cleared, len(stale))
+            except Exception as e:
+                self._logger.warning('Unable to clear retained topics: %s', e)
+                return
+        if known != active:
+            try:
+                index.write_text(json.dumps(sorted(active)), encoding='utf-8')
+            except OSError as e:
+                self._logger.warning('Unable to write %s: %s', index, e)
 
-        coros_connect = []
+    async def __refresh_maps(self, login: str, password: str, blids: list[str] | None = None):
+        '''
+        read the maps of the robots from the cloud into their region catalogue, return the number of regions per robot
+        '''
+        # only needed on request, not loaded at daemon startup
+        from irobot.cloud import iRobotCloud
 
-        for robot_config in self._robot_configs.robots.values():
+        if self._cloud is None or not self._cloud.uses(login, password):
+            if self._cloud is not None:
+                await self._cloud.close()
+            self._cloud = iRobotCloud(login, password)
+        robots = self._fleet.robots
+        results = {}
+        for blid in self._robot_configs.robots:
+            if blids is not None and blid not in blids:
+                continue
             try:
-                if robot_config.blid in self._config.excluded_blid:
-                    self._logger.debug("Exclude robot: %s", robot_config.name)
-                    continue
-
-                new_robot = iRobot(robot_config)
-                new_robot.setup_mqtt_client(
-                    self._config.mqtt_host,
-                    self._config.mqtt_port,
-                    self._config.mqtt_user,
-                    self._config.mqtt_password,
-                    brokerFeedback=self._config.topic_prefix+'/feedback',
-                    brokerCommand=self._config.topic_prefix+'/command',
-                    brokerSetting=self._config.topic_prefix+'/setting'
-                )
-
-                coros_connect.append(new_robot.async_connect())
-                self._robots.append(new_robot)
+                maps = await self._cloud.get_maps(blid)
             except Exception as e:
-                self._logger.error('Exception during connection of robot %s: %s', robot_config.name, e)
+                self._logger.warning('Unable to get maps of %s from the cloud: %s', blid, e)
+                results[blid] = None
+                continue
+            # workers reload the file when a region name is not found
+            catalogue = robots[blid].region_catalogue if blid in robots else iRobotRegionCatalogue(blid, self._data_path/'regions')
+            if catalogue.update_from_cloud(maps):
+                await asyncio.get_running_loop().run_in_executor(default_executors().decode, catalogue.save)
+            results[blid] = catalogue.region_count()
+        self._logger.info('Regions from cloud: %s, %s', results, self._cloud.stats())
+        return results
+
+    def __stats(self):
+        stats = {
+            'timers': self._scheduler.dump(),
+            'loop': self._loop_monitor.stats()
+        }
+        if self._supervisor is not None:
+            stats['workers'] = self._supervisor.stats()
+            stats.update(self._supervisor.robot_stats())
+        else:
+            # per robot size alone, total counts the strings shared by the fleet once
+            seen = set()
+            stats['memory'] = {robot.blid: robot.state_memory() for robot in self._fleet.robots.values()}
+            stats['memory_total'] = sum(robot.state_memory(seen) for robot in self._fleet.robots.values())
+            stats.update(self._fleet.stats())
+            stats['executors'] = default_executors().stats()
+        self._logger.info('Daemon stats: %s', stats)
+        return stats
 
-        if len(coros_connect) > 0:
-            await asyncio.gather(*coros_connect)
+    def __create_robot(self, robot_config, topic_filter) -> iRobot:
+        new_robot = iRobot(robot_config, data_path=self._data_path, mission_log=self._mission_log, scheduler=self._scheduler,
+                           topic_filter=topic_filter, on_config_change=self.__save_robot_configs)
+        new_robot.setup_mqtt_client(
+            self._config.mqtt_host,
+            self._config.mqtt_port,
+            self._config.mqtt_user,
+            self._config.mqtt_password,
+            brokerFeedback=self._config.topic_prefix+'/feedback',
+            brokerCommand=self._config.topic_prefix+'/command',
+            brokerSetting=self._config.topic_prefix+'/setting',
+            mqtt5=self._config.mqtt5,
+            retain=self._config.retain
+        )
+        new_robot.update_seconds = self._config.refresh
+        new_robot.watchdog.deadline = self._config.stale_deadline
+        new_robot.dedup.window = self._config.duplicate_window
+        return new_robot
 
-    async def __disconnect_robots(self):
-        for robot in self._robots:
-            await robot.disconnect()
-        self._robots.clear()
-        await asyncio.sleep(1)
+    async def __reconcile_robots(self):
+        await self._fleet.reconcile(self._robot_configs.robots, iRobotTopicFilters(self._data_path), self._config.excluded_blid)
 
 
-dreame().run()
+if __name__ == '__main__':
+    dreame().run()
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from __future__ import annotations
+
+import asyncio
+import logging
+
+from .irobot import iRobot
+
+_LOGGER = logging.getLogger()
+
+
+def select_robots(robots: dict[str, iRobot], blids: list[str] | None) -> tuple[dict[str, iRobot], list[str]]:
+    '''
+    robots targeted by a request (all if blids is empty) and the requested blids which are unknown
+    '''
+    if not blids:
+        return robots, []
+    return {blid: robots[blid] for blid in blids if blid in robots}, [blid for blid in blids if blid not in robots]
+
+
+async def batch_command(robots: dict[str, iRobot], blids: list[str] | None, command) -> dict[str, str]:
+    '''
+    queue command on each targeted robot, return the status per blid
+    '''
+    selected, unknown = select_robots(robots, blids)
+    results = {blid: 'unknown' for blid in unknown}
+
+    async def send(robot: iRobot):
+        if not robot.connected:
+            return 'offline'
+        try:
+            await robot.async_send_command(command)
+            return 'queued'
+        except Exception as e:
+            _LOGGER.error('Unable to send command to %s: %s', robot.name, e)
+            return 'error'
+
+    statuses = await asyncio.gather(*[send(robot) for robot in selected.values()])
+    results.update(zip(selected.keys(), statuses))
+    return results
+
+
+def bulk_get(robots: dict[str, iRobot], blids: list[str] | None, properties: list[str]) -> dict[str, dict]:
+    '''
+    read properties of each targeted robot from its in-memory state
+    '''
+    selected, unknown = select_robots(robots, blids)
+    results = {blid: None for blid in unknown}
+    for blid, robot in selected.items():
+        results[blid] = robot.get_properties(properties)
+    return results
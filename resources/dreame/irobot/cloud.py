@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# SigV4 signing ported from roomba/getcloudpassword.py
+# Copyright 2021 Matthew Garrett <mjg59@srcf.ucam.org>
+# Portions Copyright 2010-2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# Licensed under the Apache License, Version 2.0 (http://aws.amazon.com/apache2.0/)
+
+from __future__ import annotations
+
+import datetime
+import hashlib
+import hmac
+import logging
+import time
+import urllib.parse
+
+import aiohttp
+
+DISCOVERY_URL = "https://disc-prod.iot.irobotapi.com/v1/discover/endpoints?country_code=US"
+APP_ID = "ANDROID-C7FB240E-DF34-42D7-AE4E-A8C17079A294"
+EMPTY_PAYLOAD_HASH = hashlib.sha256(b'').hexdigest()
+
+
+def hmac_sha256(key: bytes, msg: str) -> bytes:
+    return hmac.new(key, msg.encode('utf-8'), hashlib.sha256).digest()
+
+
+class iRobotSigV4:
+    '''
+    AWS signature version 4 of GET requests.
+
+    The signing key only depends on the date, region and service: it is derived once per day
+    instead of for each request.
+    '''
+
+    SIGNED_HEADERS = 'host;x-amz-date;x-amz-security-token'
+
+    def __init__(self, region: str, access_key: str, secret_key: str, session_token: str, service: str = 'execute-api'):
+        self.region = region
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.session_token = session_token
+        self.service = service
+        self._datestamp = None
+        self._signing_key = None
+        self.key_derivations = 0
+
+    def signing_key(self, datestamp: str) -> bytes:
+        if datestamp != self._datestamp:
+            key = hmac_sha256(('AWS4' + self.secret_key).encode('utf-8'), datestamp)
+            for part in (self.region, self.service, 'aws4_request'):
+                key = hmac_sha256(key, part)
+            self._datestamp = datestamp
+            self._signing_key = key
+            self.key_derivations += 1
+        return self._signing_key
+
+    def headers(self, host: str, uri: str, query: str = "", now: datetime.datetime | None = None) -> dict[str, str]:
+        if now is None:
+            now = datetime.datetime.now(datetime.timezone.utc)
+        amzdate = now.strftime('%Y%m%dT%H%M%SZ')
+        datestamp = now.strftime('%Y%m%d')
+
+        canonical_headers = f"host:{host}\nx-amz-date:{amzdate}\nx-amz-security-token:{self.session_token}\n"
+        canonical_request = f"GET\n{uri}\n{query}\n{canonical_headers}\n{self.SIGNED_HEADERS}\n{EMPTY_PAYLOAD_HASH}"
+        credential_scope = f"{datestamp}/{self.region}/{self.service}/aws4_request"
+        string_to_sign = f"AWS4-HMAC-SHA256\n{amzdate}\n{credential_scope}\n{hashlib.sha256(canonical_request.encode('utf-8')).hexdigest()}"
+        signature = hmac.new(self.signing_key(datestamp), string_to_sign.encode('utf-8'), hashlib.sha256).hexdigest()
+
+        return {
+            'x-amz-security-token': self.session_token,
+            'x-amz-date': amzdate,
+            'Authorization': f"AWS4-HMAC-SHA256 Credential={self.access_key}/{credential_scope}, SignedHeaders={self.SIGNED_HEADERS}, Signature={signature}"
+        }
+
+
+class iRobotCloud:
+    '''
+    Async client of the iRobot cloud, only used on request to read the robots maps.
+
+    Keep one instance to reuse the login, the signing key and the responses: maps are cached
+    for cache_ttl seconds. The session credentials are renewed once when a request is refused.
+    '''
+
+    cache_ttl = 3600
+
+    def __init__(self, login: str, password: str, timeout: float = 30):
+        self._logger = logging.getLogger()
+        self._login = login
+        self._password = password
+        self._timeout = aiohttp.ClientTimeout(total=timeout)
+        self._session: aiohttp.ClientSession | None = None
+        self._signer: iRobotSigV4 | None = None
+        self._iot_host = None
+        self._robots: dict = {}
+        self._cache: dict[str, tuple[float, object]] = {}
+        self.requests = 0
+        self.cache_hits = 0
+
+    def uses(self, login: str, password: str) -> bool:
+        return (login, password) == (self._login, self._password)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def __get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(timeout=self._timeout)
+        return self._session
+
+    async def login(self):
+        session = self.__get_session()
+        async with session.get(DISCOVERY_URL) as r:
+            r.raise_for_status()
+            response = await r.json(content_type=None)
+        deployment = response['deployments'][next(iter(response['deployments']))]
+        http_base = deployment['httpBase']
+        self._iot_host = urllib.parse.urlparse(deployment['httpBaseAuth']).netloc
+        region = deployment['awsRegion']
+
+        data = {"apiKey": response['gigya']['api_key'],
+                "targetenv": "mobile",
+                "loginID": self._login,
+                "password": self._password,
+                "format": "json",
+                "targetEnv": "mobile",
+                }
+        self._logger.debug("Post accounts.login request")
+        async with session.post(f"https://accounts.{response['gigya']['datacenter_domain']}/accounts.login", data=data) as r:
+            r.raise_for_status()
+            response = await r.json(content_type=None)
+
+        data = {
+            "app_id": APP_ID,
+            "assume_robot_ownership": "0",
+            "gigya": {
+                "signature": response['UIDSignature'],
+                "timestamp": response['signatureTimestamp'],
+                "uid": response['UID'],
+            }
+        }
+        self._logger.debug("Post login request to %s", http_base)
+        async with session.post(f"{http_base}/v2/login", json=data) as r:
+            r.raise_for_status()
+            response = await r.json(content_type=None)
+
+        credentials = response['credentials']
+        self._signer = iRobotSigV4(region, credentials['AccessKeyId'], credentials['SecretKey'], credentials['SessionToken'])
+        self._robots = response.get('robots', {})
+        self._cache.clear()
+
+    async def get_robots(self) -> dict:
+        if self._signer is None:
+            await self.login()
+        return self._robots
+
+    async def __get(self, uri: str, query: str = ""):
+        key = f"{uri}?{query}"
+        cached = self._cache.get(key)
+        if cached is not None and time.monotonic() - cached[0] < self.cache_ttl:
+            self.cache_hits += 1
+            return cached[1]
+        for attempt in range(2):
+            if self._signer is None:
+                await self.login()
+            url = f"https://{self._iot_host}{uri}" + (f"?{query}" if query else "")
+            self.requests += 1
+            async with self.__get_session().get(url, headers=self._signer.headers(self._iot_host, uri, query)) as r:
+                if r.status in (401, 403) and attempt == 0:
+                    self._logger.info("Cloud credentials refused, login again")
+                    self._signer = None
+                    continue
+                r.raise_for_status()
+                result = await r.json(content_type=None)
+            self._cache[key] = (time.monotonic(), result)
+            return result
+
+    async def get_maps(self, blid: str) -> list[dict]:
+        return await self.__get(f"/dev/v1/{blid}/pmaps", "activeDetails=2")
+
+    def invalidate(self, blid: str | None = None):
+        if blid is None:
+            self._cache.clear()
+        else:
+            self._cache = {key: value for key, value in self._cache.items() if f"/{blid}/" not in key}
+
+    def stats(self) -> dict:
+        return {
+            'requests': self.requests,
+            'cache_hits': self.cache_hits,
+            'key_derivations': self._signer.key_derivations if self._signer else 0,
+        }
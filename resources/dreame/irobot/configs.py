@@ -8,14 +8,22 @@ from pathlib import Path
 from pprint import pformat
 import json
 import logging
+import os
 import socket
+import threading
 from ast import literal_eval
 import configparser
 
-from .password import iRobotPassword
 from .const import BROADCAST_IP, DEFAULT_TIMEOUT
 
 
+def parse_blid(payload: dict) -> str:
+    '''
+    blid of the robot answering a discovery request
+    '''
+    return payload.get('robotid', payload.get("hostname", "").split('-')[1])
+
+
 class iRobotConfig(object):
     def __init__(self, blid: str, data: dict):
         self.__blid: str = blid
@@ -44,6 +52,15 @@ class iRobotConfig(object):
     @ip.setter
     def ip(self, value):
         self.__ip = value
+        self.__data['ip'] = value
+
+    @property
+    def mac(self) -> str | None:
+        return self.__data.get('mac', None)
+
+    @mac.setter
+    def mac(self, value: str):
+        self.__data['mac'] = value
 
     @property
     def name(self):
@@ -53,6 +70,10 @@ class iRobotConfig(object):
     def name(self, value: str):
         self.__name = value
 
+    @property
+    def sku(self) -> str | None:
+        return self.__data.get('sku', None)
+
     @property
     def version(self):
         return int(self.__data.get('ver', 3))
@@ -76,6 +97,10 @@ class iRobotConfigs:
         self.__json_file = self.__path/'config.json'
 
         self.__robots: dict[str, iRobotConfig] = {}
+        # ip and mac of each robot in the file, a running robot may already have changed its config object
+        self.__saved: dict[str, tuple] = {}
+        # saves come from executor threads, eg a robot found at a new ip
+        self.__lock = threading.RLock()
 
         if ini_file.exists():
             self.__convert_config(ini_file)
@@ -99,7 +124,7 @@ class iRobotConfigs:
                 continue
             new_configs[value['blid']] = iRobotConfig(value['blid'], value['data']).toJSON()
 
-        self.__json_file.write_text(json.dumps(new_configs, indent=2), encoding='utf-8')
+        self.__write_config_file(new_configs)
 
     def __load_config(self):
         if self.__json_file.exists():
@@ -107,18 +132,48 @@ class iRobotConfigs:
             configs = json.loads(self.__json_file.read_text(encoding='utf-8'))
             for blid, data in configs.items():
                 self.__robots[blid] = iRobotConfig(blid, data)
+                self.__saved[blid] = (self.__robots[blid].ip, self.__robots[blid].mac)
+
+    def __write_config_file(self, data: dict):
+        '''
+        the file is replaced at once, a crash while writing leaves the previous one
+        '''
+        tmp_file = self.__json_file.with_suffix('.tmp')
+        tmp_file.write_text(json.dumps(data, indent=2), encoding='utf-8')
+        os.replace(tmp_file, self.__json_file)
 
     def __save_config_file(self):
-        data = {}
-        for robot in self.__robots.values():
-            data[robot.blid] = robot.toJSON()
-        self.__json_file.write_text(json.dumps(data, indent=2), encoding='utf-8')
+        with self.__lock:
+            data = {}
+            for robot in self.__robots.values():
+                data[robot.blid] = robot.toJSON()
+            self.__write_config_file(data)
+            self.__saved = {robot.blid: (robot.ip, robot.mac) for robot in self.__robots.values()}
         return True
 
     @property
     def robots(self):
         return self.__robots
 
+    def save(self):
+        return self.__save_config_file()
+
+    def update(self, blid: str, changes: dict) -> bool:
+        '''
+        apply the ip and/or mac reported for a robot and save the configuration if they changed
+        '''
+        with self.__lock:
+            robot = self.__robots.get(blid)
+            if robot is None:
+                return False
+            if changes.get('ip'):
+                robot.ip = changes['ip']
+            if changes.get('mac'):
+                robot.mac = changes['mac']
+            if self.__saved.get(blid) == (robot.ip, robot.mac):
+                return False
+            return self.__save_config_file()
+
     async def __receive_udp(self, timeout: int = DEFAULT_TIMEOUT, address: str = BROADCAST_IP):
         # set up UDP socket to receive data from robot
         port = 5678
@@ -137,7 +192,7 @@ class iRobotConfigs:
                 if udp_data and udp_data.decode() != message:
                     try:
                         parsedMsg = json.loads(udp_data.decode())
-                        blid = self.__parse_blid(parsedMsg)
+                        blid = parse_blid(parsedMsg)
                         if blid not in configs.keys():
                             s.sendto(message.encode(), (address, port))
                             self._logger.debug('Robot at IP: %s Data: %s', addr[0], json.dumps(parsedMsg))
@@ -156,9 +211,6 @@ class iRobotConfigs:
         s.close()
         return configs
 
-    def __parse_blid(self, payload: dict):
-        return payload.get('robotid', payload.get("hostname", "").split('-')[1])
-
     async def discover(self, address: str = BROADCAST_IP, cloud_login: str = None, cloud_password: str = None):
         '''
         Discover robots on the network, retrieve their password from the cloud if not already known and save the configuration
@@ -188,6 +240,9 @@ class iRobotConfigs:
                     self.__robots[discovered_robot.blid] = discovered_robot
 
         if len(robots_with_missing_pswd) > 0:
+            # only needed to retrieve passwords, not loaded at daemon startup
+            from .password import iRobotPassword
+
             if cloud_login and cloud_password:
                 self._logger.info("Try to get missing robots password from cloud...")
                 cloud_data = iRobotPassword.get_passwords_from_cloud(cloud_login, cloud_password)
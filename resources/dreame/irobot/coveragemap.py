@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from __future__ import annotations
+
+import logging
+import math
+import os
+from pathlib import Path
+import struct
+import zlib
+
+from .trajectory import iRobotTrajectory
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+ADLER_BASE = 65521
+
+
+def adler32_combine(adler1: int, adler2: int, len2: int) -> int:
+    '''
+    adler32 of the concatenation of two buffers from their own adler32, port of zlib's adler32_combine
+    '''
+    rem = len2 % ADLER_BASE
+    sum1 = adler1 & 0xffff
+    sum2 = (rem * sum1) % ADLER_BASE
+    sum1 += (adler2 & 0xffff) + ADLER_BASE - 1
+    sum2 += ((adler1 >> 16) & 0xffff) + ((adler2 >> 16) & 0xffff) + ADLER_BASE - rem
+    if sum1 >= ADLER_BASE:
+        sum1 -= ADLER_BASE
+    if sum1 >= ADLER_BASE:
+        sum1 -= ADLER_BASE
+    if sum2 >= (ADLER_BASE << 1):
+        sum2 -= (ADLER_BASE << 1)
+    if sum2 >= ADLER_BASE:
+        sum2 -= ADLER_BASE
+    return sum1 | (sum2 << 16)
+
+
+def png_chunk(kind: bytes, data: bytes) -> bytes:
+    return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+
+def heat_palette(levels: int) -> tuple[bytes, bytes]:
+    '''
+    PLTE and tRNS content: index 0 is transparent, then blue to red
+    '''
+    palette = bytearray(b'\x00\x00\x00')
+    for i in range(1, levels + 1):
+        ratio = (i - 1) / max(1, levels - 1)
+        palette += bytes((int(255 * ratio), int(128 * (1 - abs(2 * ratio - 1))), int(255 * (1 - ratio))))
+    return bytes(palette), b'\x00' + b'\xc0' * levels
+
+
+class iRobotCoverageMap:
+    '''
+    Coverage heatmap of a mission, rendered as a palette PNG.
+
+    The grid is split in square tiles created on demand, each pose only touches the tiles under
+    the robot footprint. The PNG stream is cached per band of tiles (raw deflate blocks ended by a
+    full flush) so a refresh only compresses the bands that changed since the previous render.
+    '''
+
+    RESOLUTION = 5  # cm per pixel
+    TILE = 64  # pixels
+    ROBOT_RADIUS = 17  # cm
+    LEVELS = 15  # number of heat levels, number of passes saturates there
+    MAX_JUMP = iRobotTrajectory.MAX_JUMP  # cm, a longer segment is not painted
+
+    def __init__(self, blid: str, path: Path | None = None):
+        self._logger = logging.getLogger()
+        self._blid = blid
+        self._path = path
+        self._plte, self._trns = heat_palette(self.LEVELS)
+        radius = max(1, round(self.ROBOT_RADIUS / self.RESOLUTION))
+        self._brush = [(dx, dy) for dx in range(-radius, radius + 1) for dy in range(-radius, radius + 1) if dx * dx + dy * dy <= radius * radius]
+        self.reset()
+
+    def reset(self):
+        self._tiles: dict[tuple[int, int], bytearray] = {}
+        self._bands: dict[int, tuple[bytes, int, int]] = {}
+        self._dirty_bands: set[int] = set()
+        self._x_range = None
+        self._last = None
+        self.dirty_tiles = 0
+
+    @property
+    def dirty(self):
+        return len(self._dirty_bands) > 0
+
+    def add_point(self, x: int, y: int, new_stroke: bool = False):
+        '''
+        paint the robot footprint along the segment from the previous point to (x, y) (in cm),
+        only at (x, y) if it starts a new stroke or is too far from the previous point
+        '''
+        px, py = x // self.RESOLUTION, -y // self.RESOLUTION
+        if (new_stroke or self._last is None
+                or math.hypot(px - self._last[0], py - self._last[1]) * self.RESOLUTION > self.MAX_JUMP):
+            self._last = (px, py)
+        lx, ly = self._last
+        steps = max(abs(px - lx), abs(py - ly), 1)
+        centers = {(lx + (px - lx) * i // steps, ly + (py - ly) * i // steps) for i in range(steps + 1)}
+        cells = {(cx + dx, cy + dy) for cx, cy in centers for dx, dy in self._brush}
+        self._last = (px, py)
+
+        tile_size = self.TILE
+        touched = set()
+        for cx, cy in cells:
+            key = (cx // tile_size, cy // tile_size)
+            tile = self._tiles.get(key)
+            if tile is None:
+                tile = self._tiles[key] = bytearray(tile_size * tile_size)
+            offset = (cy % tile_size) * tile_size + cx % tile_size
+            if tile[offset] < self.LEVELS:
+                tile[offset] += 1
+                touched.add(key)
+        for tx, ty in touched:
+            self._dirty_bands.add(ty)
+        self.dirty_tiles += len(touched)
+
+    def __encode_band(self, ty: int, tx0: int, tx1: int) -> tuple[bytes, int, int]:
+        tile_size = self.TILE
+        empty = bytes(tile_size)
+        band = [self._tiles.get((tx, ty)) for tx in range(tx0, tx1 + 1)]
+        raw = bytearray()
+        for row in range(tile_size):
+            raw.append(0)  # no filter
+            start = row * tile_size
+            for tile in band:
+                raw += empty if tile is None else tile[start:start + tile_size]
+        compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+        data = compressor.compress(raw) + compressor.flush(zlib.Z_FULL_FLUSH)
+        return data, zlib.adler32(raw), len(raw)
+
+    def render(self) -> bytes | None:
+        '''
+        return the PNG of the coverage, None if nothing has been painted yet
+        '''
+        if not self._tiles:
+            return None
+        txs = [tx for tx, _ in self._tiles]
+        tys = [ty for _, ty in self._tiles]
+        tx0, tx1, ty0, ty1 = min(txs), max(txs), min(tys), max(tys)
+        if self._x_range != (tx0, tx1):
+            self._x_range = (tx0, tx1)
+            self._bands.clear()
+
+        idat = bytearray(b'\x78\x01')
+        adler = 1
+        for ty in range(ty0, ty1 + 1):
+            if ty in self._dirty_bands or ty not in self._bands:
+                self._bands[ty] = self.__encode_band(ty, tx0, tx1)
+            data, band_adler, length = self._bands[ty]
+            idat += data
+            adler = adler32_combine(adler, band_adler, length)
+        self._dirty_bands.clear()
+        idat += zlib.compressobj(6, zlib.DEFLATED, -15).flush(zlib.Z_FINISH)
+        idat += struct.pack('>I', adler)
+
+        width = (tx1 - tx0 + 1) * self.TILE
+        height = (ty1 - ty0 + 1) * self.TILE
+        return b''.join((
+            PNG_SIGNATURE,
+            png_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 3, 0, 0, 0)),
+            png_chunk(b'PLTE', self._plte),
+            png_chunk(b'tRNS', self._trns),
+            png_chunk(b'IDAT', bytes(idat)),
+            png_chunk(b'IEND', b''),
+        ))
+
+    def save(self):
+        '''
+        render and write the PNG to <path>/<blid>.png if it changed, return True if written
+        '''
+        if self._path is None or not self.dirty:
+            return False
+        png = self.render()
+        if png is None:
+            return False
+        try:
+            self._path.mkdir(parents=True, exist_ok=True)
+            file = self._path/f"{self._blid}.png"
+            tmp_file = file.with_suffix('.tmp')
+            tmp_file.write_bytes(png)
+            os.replace(tmp_file, file)
+            return True
+        except OSError as e:
+            self._logger.warning('Unable to save coverage map of %s: %s', self._blid, e)
+        return False
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from __future__ import annotations
+
+import json
+import logging
+from pathlib import Path
+import threading
+
+
+class iRobotDeadband:
+    '''
+    Filter of the noisy feedback values, keyed by feedback topic (flattened key).
+
+    A rule may have:
+    - abs: absolute deadband, a numeric value is published if it moved more than this
+    - rel: relative deadband, as a fraction of the last published value
+    - min_interval: seconds between two publications, a change arriving earlier is kept and
+      published once the interval has passed (see due()), so the last transition is not lost
+    - heartbeat: seconds after which a value is published even if it did not move
+
+    Rules of DEFAULT_RULES can be changed or removed (null) in feedback_filters.json.
+    '''
+
+    DEFAULT_RULES = {
+        "pose_theta": {"abs": 5, "min_interval": 1, "heartbeat": 60},
+        "pose_point_x": {"abs": 10, "min_interval": 1, "heartbeat": 60},
+        "pose_point_y": {"abs": 10, "min_interval": 1, "heartbeat": 60},
+        "cleanMissionStatus_sqft": {"abs": 0, "min_interval": 10, "heartbeat": 300},
+        "cleanMissionStatus_mssnM": {"abs": 0, "min_interval": 60, "heartbeat": 300},
+        "signal_rssi": {"abs": 3, "min_interval": 30, "heartbeat": 300},
+        "signal_snr": {"abs": 3, "min_interval": 30, "heartbeat": 300},
+        "signal_noise": {"abs": 3, "min_interval": 30, "heartbeat": 300},
+        "batPct": {"abs": 0, "min_interval": 30, "heartbeat": 600},
+    }
+
+    def __init__(self, rules: dict[str, dict] | None = None):
+        self.rules = dict(self.DEFAULT_RULES if rules is None else rules)
+        self._lock = threading.Lock()
+        self._last: dict[str, tuple[str, float | None, float]] = {}  # value, numeric value, time published
+        self._trailing: dict[str, tuple[str, float]] = {}  # value, due time
+        self._next_due = float('inf')
+        self.counters: dict[str, dict[str, int]] = {}
+
+    @classmethod
+    def from_file(cls, file: Path) -> iRobotDeadband:
+        rules = dict(cls.DEFAULT_RULES)
+        if file.exists():
+            try:
+                for key, rule in json.loads(file.read_text(encoding='utf-8')).items():
+                    if rule is None:
+                        rules.pop(key, None)
+                    else:
+                        rules[key] = rule
+            except (OSError, ValueError, AttributeError) as e:
+                logging.getLogger().error('Unable to read %s: %s', file, e)
+        return cls(rules)
+
+    def __count(self, key: str, counter: str):
+        counters = self.counters.get(key)
+        if counters is None:
+            counters = self.counters[key] = {'published': 0, 'heartbeat': 0, 'deadband': 0, 'interval': 0, 'trailing': 0}
+        counters[counter] += 1
+
+    @staticmethod
+    def __numeric(value) -> float | None:
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return None
+
+    def __record(self, key: str, value, numeric: float | None, now: float):
+        self._last[key] = (value, numeric, now)
+        self._trailing.pop(key, None)
+
+    def accept(self, key: str, value, now: float) -> bool:
+        '''
+        True if value has to be published now
+        '''
+        rule = self.rules.get(key)
+        if rule is None:
+            return True
+        numeric = self.__numeric(value)
+        with self._lock:
+            last = self._last.get(key)
+            if last is None:
+                self.__record(key, value, numeric, now)
+                self.__count(key, 'published')
+                return True
+            last_value, last_numeric, published = last
+            if now - published >= rule.get('heartbeat', float('inf')):
+                self.__record(key, value, numeric, now)
+                self.__count(key, 'heartbeat')
+                return True
+            if numeric is not None and last_numeric is not None:
+                band = max(rule.get('abs', 0), rule.get('rel', 0) * abs(last_numeric))
+                moved = abs(numeric - last_numeric) > band
+            else:
+                moved = value != last_value
+            if not moved:
+                # back within the band of the published value: nothing left to publish
+                self._trailing.pop(key, None)
+                self.__count(key, 'deadband')
+                return False
+            if now - published < rule.get('min_interval', 0):
+                due = published + rule['min_interval']
+                self._trailing[key] = (value, due)
+                self._next_due = min(self._next_due, due)
+                self.__count(key, 'interval')
+                return False
+            self.__record(key, value, numeric, now)
+            self.__count(key, 'published')
+            return True
+
+    def reset(self):
+        '''
+        forget the published values, the next value of each key is published as the first one
+        '''
+        with self._lock:
+            self._last.clear()
+            self._trailing.clear()
+            self._next_due = float('inf')
+
+    def next_due(self) -> float:
+        '''
+        time at which a held back change can be published, inf if none
+        '''
+        return self._next_due
+
+    def due(self, now: float) -> list[tuple[str, object]]:
+        '''
+        changes held back by min_interval which can be published now
+        '''
+        if now < self._next_due:
+            return []
+        with self._lock:
+            values = []
+            for key, (value, due) in list(self._trailing.items()):
+                if due <= now:
+                    self.__record(key, value, self.__numeric(value), now)
+                    self.__count(key, 'trailing')
+                    values.append((key, value))
+            self._next_due = min((due for value, due in self._trailing.values()), default=float('inf'))
+            return values
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {key: dict(counters) for key, counters in sorted(self.counters.items())}
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from __future__ import annotations
+
+from collections import OrderedDict
+import hashlib
+import time
+
+import paho.mqtt.client as mqtt
+
+
+def sections(data: dict, depth: int) -> set[tuple[str, ...]]:
+    '''
+    paths of data cut at depth, eg ('state', 'reported', 'signal')
+    '''
+    result = set()
+    pending = [((), data)]
+    while pending:
+        path, value = pending.pop()
+        if len(path) < depth and isinstance(value, dict) and value:
+            pending.extend((path + (key,), sub_value) for key, sub_value in value.items())
+        else:
+            result.add(path)
+    return result
+
+
+class iRobotDuplicateFilter:
+    '''
+    Recent payloads of a robot per topic, to skip a frame identical to one already processed.
+
+    A repeated frame is skipped only if it was processed less than window seconds ago and no
+    message processed since changed one of the state sections it contains: applying it again
+    could not change anything. Topics matching one of the bypass patterns are always processed.
+    To use from the event loop, in the order the messages are processed.
+    '''
+
+    DEPTH = 3  # state sections: state.reported.<key>
+    MAX_PER_TOPIC = 8
+
+    def __init__(self, window: float = 60, bypass: list[str] | None = None):
+        self.window = window
+        self.bypass = list(bypass or [])
+        self._bypassed: dict[str, bool] = {}
+        # topic -> digest -> (time processed, generation, sections)
+        self._recent: dict[str, OrderedDict[bytes, tuple[float, int, set]]] = {}
+        self._generation = 0
+        self._changed: dict[tuple[str, ...], int] = {}
+        self._last: tuple[str, bytes, float] | None = None
+        self._cost: dict[str, float] = {}  # smoothed processing time per topic
+        self.hits: dict[str, int] = {}
+        self.misses = 0
+        self.saved_time = 0.0
+
+    def __is_bypassed(self, topic: str) -> bool:
+        bypassed = self._bypassed.get(topic)
+        if bypassed is None:
+            bypassed = self._bypassed[topic] = any(mqtt.topic_matches_sub(pattern, topic) for pattern in self.bypass)
+        return bypassed
+
+    def is_duplicate(self, topic: str, payload: bytes) -> bool:
+        self._last = None
+        if self.window <= 0 or self.__is_bypassed(topic):
+            return False
+        now = time.monotonic()
+        digest = hashlib.blake2b(payload, digest_size=16).digest()
+        entry = self._recent.get(topic, {}).get(digest)
+        if entry is not None and now - entry[0] <= self.window and all(self._changed.get(section, 0) <= entry[1] for section in entry[2]):
+            self.hits[topic] = self.hits.get(topic, 0) + 1
+            self.saved_time += self._cost.get(topic, 0.0)
+            return True
+        self.misses += 1
+        self._last = (topic, digest, now)
+        return False
+
+    def processed(self, topic: str, data: dict, changes: list[tuple[tuple[str, ...], object]], duration: float):
+        '''
+        the last frame checked has been processed: data decoded from it, changes made to the state
+        '''
+        if changes:
+            self._generation += 1
+            for path, value in changes:
+                if len(path) >= self.DEPTH:
+                    changed = [path[:self.DEPTH]]
+                elif isinstance(value, dict):
+                    changed = [path + section for section in sections(value, self.DEPTH - len(path))]
+                else:
+                    changed = [path]
+                for section in changed:
+                    if len(section) < self.DEPTH:
+                        # a whole part of the state has been replaced
+                        self._recent.clear()
+                    else:
+                        self._changed[section] = self._generation
+        if self._last is None or self._last[0] != topic:
+            return
+        topic, digest, now = self._last
+        self._last = None
+        data_sections = sections(data, self.DEPTH)
+        if any(len(section) < self.DEPTH for section in data_sections):
+            return  # not a state fragment, never skipped
+        cost = self._cost.get(topic)
+        self._cost[topic] = duration if cost is None else cost + 0.125 * (duration - cost)
+        recent = self._recent.setdefault(topic, OrderedDict())
+        recent[digest] = (now, self._generation, data_sections)
+        recent.move_to_end(digest)
+        while len(recent) > self.MAX_PER_TOPIC:
+            recent.popitem(last=False)
+
+    def stats(self) -> dict:
+        return {
+            'window': self.window,
+            'hits': dict(sorted(self.hits.items())),
+            'misses': self.misses,
+            'saved_ms': round(self.saved_time * 1000, 1),
+        }
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from __future__ import annotations
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import cache
+import threading
+import time
+
+
+class iRobotExecutor(ThreadPoolExecutor):
+    '''
+    Thread pool measuring how long each job waited for a free thread
+    '''
+
+    def __init__(self, name: str, max_workers: int):
+        super().__init__(max_workers=max_workers, thread_name_prefix=f"irobot-{name}")
+        self.name = name
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+        self._running = 0
+        self.submitted = 0
+        self.completed = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.last_wait = 0.0
+
+    def submit(self, fn, /, *args, **kwargs) -> Future:
+        queued = time.perf_counter()
+
+        def run():
+            wait = time.perf_counter() - queued
+            with self._lock:
+                self._running += 1
+                self.total_wait += wait
+                self.last_wait = wait
+                if wait > self.max_wait:
+                    self.max_wait = wait
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self._running -= 1
+                    self.completed += 1
+
+        with self._lock:
+            self.submitted += 1
+        return super().submit(run)
+
+    def stats(self) -> dict:
+        with self._lock:
+            started = self.completed + self._running
+            return {
+                'workers': self.max_workers,
+                'running': self._running,
+                'queued': self.submitted - started,
+                'completed': self.completed,
+                'wait_ms_mean': round(self.total_wait * 1000 / started, 1) if started else None,
+                'wait_ms_max': round(self.max_wait * 1000, 1),
+                'wait_ms_last': round(self.last_wait * 1000, 1),
+            }
+
+
+class iRobotExecutors:
+    '''
+    One pool per class of blocking work, shared by all the robots of a process, so robots which
+    can't be reached (connect blocks up to the socket timeout) don't delay the messages and
+    commands of the others
+    '''
+
+    POOLS = {
+        'connect': 8,  # robot and broker connections, loop_stop, config save, worker stop
+        'decode': 4,  # decode and publish of robot messages, region catalogue save, mission log
+        'command': 2,  # commands and settings sent to the robots
+    }
+
+    def __init__(self, sizes: dict[str, int] | None = None):
+        sizes = {**self.POOLS, **(sizes or {})}
+        self.connect = iRobotExecutor('connect', sizes['connect'])
+        self.decode = iRobotExecutor('decode', sizes['decode'])
+        self.command = iRobotExecutor('command', sizes['command'])
+
+    def pools(self) -> list[iRobotExecutor]:
+        return [self.connect, self.decode, self.command]
+
+    def shutdown(self, wait: bool = True):
+        for pool in self.pools():
+            pool.shutdown(wait=wait, cancel_futures=True)
+
+    def stats(self) -> dict:
+        return {pool.name: pool.stats() for pool in self.pools()}
+
+
+@cache
+def default_executors() -> iRobotExecutors:
+    '''
+    executors of the process, created on first use
+    '''
+    return iRobotExecutors()
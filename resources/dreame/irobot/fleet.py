@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Callable
+import logging
+
+from .configs import iRobotConfig
+from .irobot import iRobot
+from .topicfilter import iRobotTopicFilter, iRobotTopicFilters
+
+
+class iRobotFleet:
+    '''
+    Running robots of a process, reconciled with the configured ones.
+
+    After a discovery only the robots which changed are touched: new robots are started,
+    removed or excluded ones are stopped, robots whose address, password or topic filter
+    changed are restarted and a new name is applied in place. Robots are stopped in
+    parallel, within STOP_TIMEOUT.
+    '''
+
+    STOP_TIMEOUT = 10  # s
+
+    # per robot stats, reported by the daemon and by each worker process
+    stats_sections: dict[str, Callable[[iRobot], dict | None]] = {
+        'mqtt': lambda robot: robot.feedback.stats(),
+        'topics': lambda robot: robot.topic_filter.stats(),
+        'watchdog': lambda robot: robot.watchdog.stats(),
+        'tls': lambda robot: robot.tls.stats(),
+        'deadband': lambda robot: robot.feedback.deadband.stats() if robot.feedback.deadband is not None else None,
+        'dedup': lambda robot: robot.dedup.stats(),
+    }
+
+    def __init__(self, factory: Callable[[iRobotConfig, iRobotTopicFilter], iRobot],
+                 on_robot_online: Callable[[str], None] | None = None):
+        '''
+        factory creates and sets up a robot, it is connected by the fleet
+        '''
+        self._logger = logging.getLogger()
+        self._factory = factory
+        self._on_robot_online = on_robot_online
+        self._robots: dict[str, iRobot] = {}
+        # what each robot has been started with: password and topic filter
+        self._started: dict[str, tuple] = {}
+        # name of each robot at the last reconcile, the config object may be shared and already renamed
+        self._names: dict[str, str] = {}
+
+    @property
+    def robots(self) -> dict[str, iRobot]:
+        return self._robots
+
+    def __len__(self):
+        return len(self._robots)
+
+    def __start(self, config: iRobotConfig, topic_filter: iRobotTopicFilter):
+        robot = self._factory(config, topic_filter)
+        self._robots[config.blid] = robot
+        self._started[config.blid] = (config.password, topic_filter.include, topic_filter.exclude, topic_filter.repeats)
+        self._names[config.blid] = config.name
+        robot.connect().add_done_callback(lambda task: self.__connected(config.blid, task))
+
+    def __connected(self, blid: str, task: asyncio.Task):
+        if task.cancelled() or task.exception() is not None or not task.result():
+            return
+        if self._on_robot_online is not None:
+            self._on_robot_online(blid)
+
+    def __needs_restart(self, config: iRobotConfig, topic_filter: iRobotTopicFilter) -> bool:
+        robot = self._robots[config.blid]
+        address = robot.address or robot.config.ip
+        return (address != config.ip
+                or self._started[config.blid] != (config.password, topic_filter.include, topic_filter.exclude, topic_filter.repeats))
+
+    async def __stop(self, blids: list[str]) -> list[str]:
+        '''
+        close the robots, return the blids of the ones closed cleanly
+        '''
+        robots = [self._robots.pop(blid) for blid in blids]
+        for blid in blids:
+            del self._started[blid]
+            del self._names[blid]
+        if not robots:
+            return []
+        tasks = [asyncio.ensure_future(robot.close()) for robot in robots]
+        done, pending = await asyncio.wait(tasks, timeout=self.STOP_TIMEOUT)
+        stopped = []
+        for blid, robot, task in zip(blids, robots, tasks):
+            if task in pending:
+                self._logger.warning('%s did not stop within %is', robot.name, self.STOP_TIMEOUT)
+                task.cancel()
+            elif task.exception() is not None:
+                self._logger.warning('Error while stopping %s: %s', robot.name, task.exception())
+            else:
+                stopped.append(blid)
+        return stopped
+
+    async def reconcile(self, configs: dict[str, iRobotConfig], topic_filters: iRobotTopicFilters,
+                        excluded: list[str] | None = None) -> dict[str, list[str]]:
+        '''
+        start, stop or restart robots so the running ones match configs, return the blids per action
+        '''
+        excluded = excluded or []
+        desired = {blid: config for blid, config in configs.items() if blid not in excluded}
+        for blid in configs.keys() & excluded:
+            self._logger.debug("Exclude robot: %s", configs[blid].name)
+        filters = {blid: topic_filters.for_robot(config) for blid, config in desired.items()}
+
+        removed = [blid for blid in self._robots if blid not in desired]
+        added = [blid for blid in desired if blid not in self._robots]
+        changed = [blid for blid in desired if blid in self._robots and self.__needs_restart(desired[blid], filters[blid])]
+        renamed = [blid for blid in desired if blid in self._robots and blid not in changed
+                   and self._names[blid] != desired[blid].name]
+
+        stopped = await self.__stop(removed + changed)
+        # a replacement shares the status topic and last will of the old robot, it waits for a clean stop
+        for blid in changed:
+            if blid not in stopped:
+                self._logger.warning('%s not restarted, it will be started by the next reconciliation', desired[blid].name)
+        changed = [blid for blid in changed if blid in stopped]
+        for blid in renamed:
+            self._logger.info('Robot %s renamed %s', self._names[blid], desired[blid].name)
+            self._robots[blid].config.name = desired[blid].name
+            self._names[blid] = desired[blid].name
+        for blid in added + changed:
+            try:
+                self.__start(desired[blid], filters[blid])
+            except Exception as e:
+                self._logger.error('Exception during connection of robot %s: %s', desired[blid].name, e)
+
+        result = {'started': added, 'stopped': removed, 'restarted': changed, 'renamed': renamed}
+        self._logger.info('Robots reconciled: %s, %i running', {action: len(blids) for action, blids in result.items()}, len(self._robots))
+        return result
+
+    async def stop(self):
+        await self.__stop(list(self._robots))
+
+    def stats(self) -> dict[str, dict[str, dict]]:
+        '''
+        stats of each section by robot
+        '''
+        result = {}
+        for section, robot_stats in self.stats_sections.items():
+            values = {blid: robot_stats(robot) for blid, robot in self._robots.items()}
+            result[section] = {blid: value for blid, value in values.items() if value is not None}
+        return result
@@ -1,23 +1,43 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+from __future__ import annotations
 
 __version__ = "3.0.0"
 
 import asyncio
-from collections.abc import Mapping
+from collections.abc import Callable, Mapping
+import copy
 import datetime
 import json
 import logging
+from pathlib import Path
 import socket
 import time
 import uuid
 import paho.mqtt.client as mqtt
+from paho.mqtt.packettypes import PacketTypes
+from paho.mqtt.properties import Properties
 
 from .const import ERROR_CONNECTION_REFUSED, ERROR_NO_ROUTE_TO_HOST, ROBOT_PORT
 
-from .utils import generate_tls_context
+from .utils import iRobotTLSContext
 from .configs import iRobotConfig
+from .trajectory import iRobotTrajectory, pose_to_point
+from .coveragemap import iRobotCoverageMap
+from .missions import iRobotMission, iRobotMissionLog
+from .scheduler import iRobotScheduler, iRobotTimer
+from .executors import iRobotExecutors, default_executors
+from .publisher import iRobotFeedbackPublisher
+from .deadband import iRobotDeadband
+from .topicfilter import iRobotTopicFilter
+from .dedup import iRobotDuplicateFilter
+from .resolver import resolve
+from .regions import iRobotRegionCatalogue
+from .watchdog import iRobotWatchdog
+from .logs import iRobotLogSampler, iRobotLogThrottle
+from .state import compact_object, deep_sizeof, iRobotLazyValue, iRobotStatus, unwrap
+from .subscriptions import changed_keys, iRobotStateSubscription, iRobotStateSubscriptions
 
 
 class iRobot:
@@ -30,6 +50,42 @@ class iRobot:
 
     VERSION = __version__ = "3.0"
 
+    # values published by the daemon and the master_state keys they are derived from,
+    # they are only recomputed when one of these keys changed
+    derived_values = {
+        "error_message": frozenset(["error"]),
+        "roomba_percent_complete": frozenset(["sqft"]),
+    }
+
+    # keys read by the state machine, mission history, trajectory and mission summary
+    state_inputs = frozenset(["cycle", "phase", "rechrgM", "bin", "full", "pose", "sqft", "error", "mssnStrtTm"])
+
+    # failed connections to the robot before looking for a new address (DHCP lease change), and again after as many
+    resolve_after_failures = 3
+
+    # max seconds without message from the robot before its connection is restarted
+    stale_deadline = 300
+
+    # seconds during which a frame identical to one already processed is skipped, 0 to disable
+    duplicate_window = 60
+
+    # MQTT v5: QoS 1/2 messages the local broker may send before they are acknowledged
+    broker_receive_maximum = 10
+
+    # received messages logged in full detail at debug level: 1 in log_sample_every
+    log_sample_every = 50
+
+    # state machine transitions: the action of the first matching condition is run
+    state_transitions = (
+        ("_is_waiting_run", "_wait_run"),
+        ("_is_bogus_run", "_ignore_bogus_run"),
+        ("_is_bogus_charge", "_ignore_bogus_charge"),
+        ("_is_docking", "_dock"),
+        ("_is_mission_changed", "_change_mission"),
+        ("_is_recharging", "_recharge"),
+        (None, "_follow_phase"),
+    )
+
     states = {"charge": "Charging",
               "new": "New Mission",
               "run": "Running",
@@ -166,9 +222,13 @@ class iRobot:
         1009: "Robot stalled",
     }
 
-    def __init__(self, config: iRobotConfig):
+    def __init__(self, config: iRobotConfig, data_path: Path | None = None, mission_log: iRobotMissionLog | None = None,
+                 scheduler: iRobotScheduler | None = None, topic_filter: iRobotTopicFilter | None = None,
+                 on_config_change: Callable[[iRobotConfig], None] | None = None, executors: iRobotExecutors | None = None):
         '''
         Initialize the iRobot object
+        on_config_change is called from an executor thread when the robot ip or mac has been updated, to save the config
+        executors run the blocking work, the pools of the process are used by default
         '''
         self._loop = asyncio.get_running_loop()
         self._debug = False
@@ -189,29 +249,77 @@ class iRobot:
             raise ValueError(f"Missing parameter(s): {', '.join(missing_params)}. Could not configure iRobot")
 
         self._config = config
+        self._executors = executors if executors is not None else default_executors()
         self.port = ROBOT_PORT
         self.__local_mqtt_client = None
         self.__local_mqtt = False
+        self.__local_mqtt_args = ()
+        self.__local_mqtt_v5 = False
+        self.__local_mqtt_connected = False
+        self.feedback = iRobotFeedbackPublisher('/irobot/feedback',
+                                                deadband=iRobotDeadband.from_file(data_path/'feedback_filters.json') if data_path else iRobotDeadband())
         self.__connected = False
         self.__try_to_connect = True
+        self.__connect_failures = 0
+        self.__resolving = False
+        self._on_config_change = on_config_change
         self.raw = False
         self.mapSize = None
         self.current_state = None
         self.master_state = {}
-        self.update_seconds = 300  # update with all values every 5 minutes
+        self.status = iRobotStatus()
+        self.update_seconds = 300  # update with all values every 5 minutes, 0 to disable
         self.__robot_mqtt_client = None
+        self.address: str | None = None  # ip the robot MQTT client connects to
+        self.tls = iRobotTLSContext()
         self.history = {}
-        self.timers = {}
+        self.timers: dict[str, iRobotTimer] = {}
+        self.mission_start: float | None = None
         self.flags = {}
         self.max_sqft = None
         self.cb = None
+        self.subscriptions = iRobotStateSubscriptions()
+        self.topic_filter = topic_filter if topic_filter is not None else iRobotTopicFilter()
+        self.dedup = iRobotDuplicateFilter(self.duplicate_window, self.topic_filter.repeats)
+        self._log_sampler = iRobotLogSampler(self.log_sample_every)
+        self._log_throttle = iRobotLogThrottle(60)
+        self._transitions = [(getattr(self, condition) if condition else None, getattr(self, action))
+                             for condition, action in self.state_transitions]
+        self.trajectory = iRobotTrajectory(config.blid, data_path/'trajectories' if data_path else None)
+        self.coverage = iRobotCoverageMap(config.blid, data_path/'maps' if data_path else None)
+        self.region_catalogue = iRobotRegionCatalogue(config.blid, data_path/'regions' if data_path else None)
+        self.map_refresh_seconds = 5
+        self.__map_saved = 0
+        self.mission_summary = iRobotMission(config.blid)
+        self._mission_log = mission_log
+
+        # background tasks of this robot, all cancelled by close()
+        self._tasks: set[asyncio.Task] = set()
+        if scheduler is None:
+            # standalone usage, the daemon shares one scheduler between all robots
+            scheduler = iRobotScheduler()
+            self._create_task(scheduler.run())
+        self._scheduler = scheduler
+        self.feedback.flush_timer = scheduler.register(config.blid, 'feedback_flush', self.feedback.flush)
+        self.watchdog = iRobotWatchdog(scheduler, config.blid, config.name, self.__probe_connection, self.__on_stale_connection,
+                                       deadline=self.stale_deadline)
 
         self.__is_connected = asyncio.Event()
         self.__robot_msg_queue: asyncio.Queue[mqtt.MQTTMessage] = asyncio.Queue()
         self.__command_queue: asyncio.Queue[dict] = asyncio.Queue()
-        self._loop.create_task(self.__process_robot_msg_queue())
-        self._loop.create_task(self.__process_command_queue())
-        self._loop.create_task(self.__periodic_update())
+        self._create_task(self.__process_robot_msg_queue())
+        self._create_task(self.__process_command_queue())
+        self._create_task(self.__periodic_update())
+
+    def _create_task(self, coro) -> asyncio.Task:
+        task = self._loop.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    @property
+    def config(self) -> iRobotConfig:
+        return self._config
 
     @property
     def name(self):
@@ -221,6 +329,14 @@ class iRobot:
     def ip(self):
         return self._config.ip
 
+    @property
+    def blid(self):
+        return self._config.blid
+
+    @property
+    def connected(self):
+        return self.__connected
+
     async def event_wait(self, evt, timeout):
         '''
         Event.wait() with timeout
@@ -243,11 +359,12 @@ class iRobot:
             self.__robot_mqtt_client.on_connect = self.on_robot_mqtt_connect
             self.__robot_mqtt_client.on_subscribe = self.on_robot_mqtt_subscribe
             self.__robot_mqtt_client.on_disconnect = self.on_robot_mqtt_disconnect
+            self.__robot_mqtt_client.on_connect_fail = self.on_robot_mqtt_connect_fail
 
             self._logger.info("Setting TLS")
             try:
-                ssl_context = generate_tls_context()
-                self.__robot_mqtt_client.tls_set_context(ssl_context)
+                # per robot context on top of the shared one, to resume the TLS session on reconnection
+                self.__robot_mqtt_client.tls_set_context(self.tls)
                 self.__robot_mqtt_client.tls_insecure_set(True)
             except Exception as e:
                 self._logger.exception("Error setting TLS: %s", e)
@@ -262,7 +379,7 @@ class iRobot:
         '''
         just create async_connect task
         '''
-        return self._loop.create_task(self.async_connect())
+        return self._create_task(self.async_connect())
 
     async def async_connect(self):
         '''
@@ -276,11 +393,12 @@ class iRobot:
                 if self.__robot_mqtt_client is None:
                     self._logger.info("Try to connect to %s with ip %s", self._config.name, self._config.ip)
                     await self.setup_client()
-                    await self._loop.run_in_executor(None, self.__robot_mqtt_client.connect, self._config.ip, self.port, 60)
+                    self.address = self._config.ip
+                    await self._loop.run_in_executor(self._executors.connect, self.__robot_mqtt_client.connect, self._config.ip, self.port, 60)
                 else:
                     self._logger.info("Attempting to Reconnect...")
                     self.__robot_mqtt_client.loop_stop()
-                    await self._loop.run_in_executor(None, self.__robot_mqtt_client.reconnect)
+                    await self._loop.run_in_executor(self._executors.connect, self.__robot_mqtt_client.reconnect)
                 self.__robot_mqtt_client.loop_start()
                 await self.event_wait(self.__is_connected, 1)  # wait for MQTT on_connect to fire (timeout 1 second)
             except (ConnectionRefusedError, OSError) as e:
@@ -297,7 +415,12 @@ class iRobot:
                 self._logger.error("Attempting retry Connection# %i", count)
 
                 count += 1
-                if count >= max_retries:
+                if count % self.resolve_after_failures == 0 and await self.__resolve_address():
+                    # connect from scratch to the new address
+                    self.__robot_mqtt_client = None
+                    count = 0
+                    retry_timeout = 1
+                elif count >= max_retries:
                     retry_timeout = 60
 
             except asyncio.CancelledError:
@@ -312,16 +435,107 @@ class iRobot:
             self._logger.error("Unable to connect to %s", self._config.name)
         return self.__connected
 
+    async def __resolve_address(self) -> bool:
+        '''
+        look for the robot at another address, eg after a DHCP lease change, True if it has been found
+        '''
+        if self.__resolving:
+            return False
+        self.__resolving = True
+        start = time.monotonic()
+        try:
+            ip = await resolve(self._config.blid, self._config.mac, self._config.ip)
+        except OSError as e:
+            self._logger.warning('Unable to look for %s on the network: %s', self.name, e)
+            return False
+        finally:
+            self.__resolving = False
+        if ip is None or ip == self._config.ip:
+            self._logger.info('%s not found at another address', self.name)
+            return False
+        self._logger.warning('%s moved from %s to %s (found in %.1fs)', self.name, self._config.ip, ip, time.monotonic() - start)
+        self._config.ip = ip
+        self.__config_changed()
+        return True
+
+    async def __reconnect_new_address(self):
+        if not await self.__resolve_address():
+            return
+        # paho only retries the address it was given
+        client = self.__robot_mqtt_client
+        self.__robot_mqtt_client = None
+        if client is not None:
+            await self._loop.run_in_executor(self._executors.connect, client.loop_stop)
+        await self.async_connect()
+
+    def __probe_connection(self):
+        '''
+        a new subscription must be answered by a SUBACK if the connection still works
+        '''
+        if self.__robot_mqtt_client is not None:
+            self.__robot_mqtt_client.subscribe(self.topic_filter.subscriptions()[0])
+
+    def __on_stale_connection(self):
+        self._create_task(self.__restart_connection())
+
+    async def __restart_connection(self):
+        '''
+        the connection is open but nothing comes anymore, close it and connect again
+        '''
+        self._set_connected(False)
+        self.__is_connected.clear()
+        client = self.__robot_mqtt_client
+        if client is not None:
+            await self._loop.run_in_executor(self._executors.connect, client.loop_stop)
+        await self.async_connect()
+
+    def __config_changed(self):
+        if self._on_config_change is not None:
+            self._loop.run_in_executor(self._executors.connect, self._on_config_change, self._config)
+
     async def disconnect(self):
+        self.watchdog.stop()
+        self._scheduler.unregister(self._config.blid)
+        self.timers.clear()
         if not self.__connected:
             return
         try:
             self.__robot_mqtt_client.disconnect()
-            if self.__local_mqtt:
-                self.__local_mqtt_client.loop_stop()
         except Exception as e:
             self._logger.warning("Some exception occured during mqtt disconnect: %s", e)
 
+    async def close(self):
+        '''
+        stop connecting, disconnect and cancel the background tasks, the object can't be used anymore
+        '''
+        self.__try_to_connect = False
+        tasks = [task for task in self._tasks if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await self.disconnect()
+        client = self.__robot_mqtt_client
+        if client is not None:
+            await self._loop.run_in_executor(self._executors.connect, client.loop_stop)
+        if self.__local_mqtt:
+            await self._loop.run_in_executor(self._executors.connect, self.__close_local_mqtt)
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def __close_local_mqtt(self):
+        '''
+        publish the final status and disconnect cleanly: the broker discards the last will, which
+        would otherwise overwrite the status of a new instance of the robot once the socket times out
+        '''
+        self.__local_mqtt = False
+        self._set_connected(False)
+        client = self.feedback.close()
+        if client is None:
+            client = self.__local_mqtt_client
+        try:
+            client.disconnect()
+        except Exception as e:
+            self._logger.warning("Some exception occured during broker disconnect: %s", e)
+        client.loop_stop()
+
     def _set_connected(self, state: bool):
         self.__connected = state
         self.publish('status', 'Online' if self.__connected else f"Offline at {time.ctime()}")
@@ -329,9 +543,11 @@ class iRobot:
     def on_robot_mqtt_connect(self, client, userdata, flags, reason_code, properties):
         if reason_code == 0:
             self._logger.info("%s connected", self.name)
+            self.__connect_failures = 0
+            self._loop.call_soon_threadsafe(self.watchdog.alive)
             self._set_connected(True)
-            self.__robot_mqtt_client.subscribe('#')
-            self.__robot_mqtt_client.subscribe("$SYS/#")
+            for topic in self.topic_filter.subscriptions():
+                self.__robot_mqtt_client.subscribe(topic)
         else:
             self._logger.error("Connected with result code %s", reason_code)
             self._logger.error("Please make sure your blid and password are correct for robot %s", self._config.name)
@@ -340,29 +556,62 @@ class iRobot:
             self.__robot_mqtt_client.disconnect()
         self._loop.call_soon_threadsafe(self.__is_connected.set)
 
+    def on_robot_mqtt_connect_fail(self, client, userdata):
+        '''
+        automatic reconnection of paho failed
+        '''
+        self.__connect_failures += 1
+        if self.__connect_failures % self.resolve_after_failures == 0:
+            self._loop.call_soon_threadsafe(self._create_task, self.__reconnect_new_address())
+
     def on_robot_mqtt_message(self, client, userdata, message: mqtt.MQTTMessage):
+        if not self.topic_filter.accept(message.topic):
+            return
         asyncio.run_coroutine_threadsafe(self.__robot_msg_queue.put(message), self._loop)
 
     async def __process_robot_msg_queue(self):
         while True:
             try:
                 if self.__robot_msg_queue.qsize() > 15:
-                    self._logger.warning('Pending event queue size is: %i', self.__robot_msg_queue.qsize())
+                    suppressed = self._log_throttle.allow('queue_size')
+                    if suppressed is not None:
+                        self._logger.warning('Pending event queue size is: %i (%i similar warnings suppressed)',
+                                             self.__robot_msg_queue.qsize(), suppressed)
                 msg = await self.__robot_msg_queue.get()
 
                 if not self.__command_queue.empty():
                     self._logger.debug('Command waiting in queue, pausing processing')
                     await asyncio.sleep(0.1)
 
-                json_data = self.decode_payload(msg.topic, msg.payload)
-                self.dict_merge(self.master_state, json_data)
+                if not self.raw and self.dedup.is_duplicate(msg.topic, msg.payload):
+                    # already applied and nothing changed it since: same state, same feedback
+                    self.watchdog.feed(self.status.phase)
+                    self.__robot_msg_queue.task_done()
+                    continue
 
-                self._logger.debug("Received data: %s, %s", msg.topic, msg.payload)
+                start = time.perf_counter()
+                json_data = self.decode_payload(msg.topic, msg.payload)
+                changes = []
+                self.dict_merge(self.master_state, json_data, changes)
+                self.status.update(changes)
+                if self.status.mac and self.status.mac != self._config.mac:
+                    self._config.mac = self.status.mac
+                    self.__config_changed()
+                self.watchdog.feed(self.status.phase)
+                if changes and len(self.subscriptions) > 0:
+                    self.subscriptions.notify(changes)
+                keys = changed_keys(changes)
+                if 'pmaps' in keys and self.region_catalogue.update_from_shadow(self.get_property('pmaps')):
+                    await self._loop.run_in_executor(self._executors.decode, self.region_catalogue.save)
+
+                if self._debug and self._log_sampler.sample():
+                    self._logger.debug("Received data (1 in %i): %s, %s, %i change(s)", self._log_sampler.every, msg.topic, msg.payload, len(changes))
 
                 if self.raw:
                     self.publish(msg.topic, msg.payload)
                 else:
-                    await self._loop.run_in_executor(None, self.decode_topics, json_data)
+                    await self._loop.run_in_executor(self._executors.decode, self.decode_topics, json_data, None, keys)
+                    self.dedup.processed(msg.topic, json_data, changes, time.perf_counter() - start)
 
                 self.__robot_msg_queue.task_done()
                 await asyncio.sleep(0.1)
@@ -380,11 +629,11 @@ class iRobot:
                 setting = value.get('setting')
                 schedule = value.get('schedule')
                 if command:
-                    await self._loop.run_in_executor(None, self._send_command, command)
+                    await self._loop.run_in_executor(self._executors.command, self._send_command, command)
                 if setting:
-                    await self._loop.run_in_executor(None, self._set_preference, *setting)
+                    await self._loop.run_in_executor(self._executors.command, self._set_preference, *setting)
                 if schedule:
-                    await self._loop.run_in_executor(None, self._set_cleanSchedule, schedule)
+                    await self._loop.run_in_executor(self._executors.command, self._set_cleanSchedule, schedule)
                 self.__command_queue.task_done()
             except asyncio.CancelledError:
                 break
@@ -395,20 +644,30 @@ class iRobot:
         while True:
             try:
                 # default every 5 minutes
-                await asyncio.sleep(self.update_seconds)
-                if self.__connected:
+                await asyncio.sleep(self.update_seconds if self.update_seconds > 0 else 60)
+                if self.__connected and self.update_seconds > 0:
                     self._logger.info("Publishing %s master_state", self.name)
-                    await self._loop.run_in_executor(None, self.decode_topics, self.master_state)
+                    await self._loop.run_in_executor(self._executors.decode, self.decode_topics, self.master_state)
             except asyncio.CancelledError:
                 break
             except Exception as e:
                 self._logger.exception(e)
 
+    async def resync(self):
+        '''
+        publish all values again, configuration and deadband filtered ones included
+        '''
+        self.feedback.resend()
+        if self.master_state:
+            await self._loop.run_in_executor(self._executors.decode, self.decode_topics, self.master_state)
+
     def on_robot_mqtt_subscribe(self, client, userdata, mid, reason_codes, properties):
         self._logger.debug("Subscribed: %s %s", mid, reason_codes)
+        self._loop.call_soon_threadsafe(self.watchdog.alive)
 
     def on_robot_mqtt_disconnect(self, client, userdata, flags, reason_code, properties):
         self._loop.call_soon_threadsafe(self.__is_connected.clear)
+        self._loop.call_soon_threadsafe(self.watchdog.stop)
         self._set_connected(False)
         if reason_code != 0:
             self._logger.warning("Unexpected disconnect from %s! - reconnecting", self.name)
@@ -426,13 +685,15 @@ class iRobot:
                           passwd=None,
                           brokerFeedback='/irobot/feedback',
                           brokerCommand='/irobot/command',
-                          brokerSetting='/irobot/setting'):
+                          brokerSetting='/irobot/setting',
+                          mqtt5=False,
+                          retain=False):
         # returns an awaitable future
 
-        return self._loop.run_in_executor(None, self._setup_mqtt_client, broker,
+        return self._loop.run_in_executor(self._executors.connect, self._setup_mqtt_client, broker,
                                           port, user, passwd,
                                           brokerFeedback, brokerCommand,
-                                          brokerSetting)
+                                          brokerSetting, mqtt5, retain)
 
     def _setup_mqtt_client(self, broker=None,
                            port=1883,
@@ -440,36 +701,75 @@ class iRobot:
                            passwd=None,
                            brokerFeedback='/irobot/feedback',
                            brokerCommand='/irobot/command',
-                           brokerSetting='/irobot/setting'):
+                           brokerSetting='/irobot/setting',
+                           mqtt5=False,
+                           retain=False):
         '''
         setup local mqtt connection to broker for feedback,
         commands and settings
+        with mqtt5, MQTT v5 is tried first and MQTT 3.1.1 used if the broker refuses it
+        with retain, the slow changing feedback values are retained by the broker
         '''
+        self.__local_mqtt_args = (broker, port, user, passwd, brokerFeedback, brokerCommand, brokerSetting)
+        self.feedback.retain = retain
         try:
             self.brokerFeedback = self.set_mqtt_topic(brokerFeedback)
             self.brokerCommand = self.set_mqtt_topic(brokerCommand, True)
             self.brokerSetting = self.set_mqtt_topic(brokerSetting, True)
+            self.feedback.prefix = self.brokerFeedback
 
             # connect to broker
-            self.__local_mqtt_client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, f"iRobot-{uuid.uuid4().hex[:10]}")
+            self.__local_mqtt_v5 = mqtt5
+            self.__local_mqtt_connected = False
+            self.__local_mqtt_client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, f"iRobot-{uuid.uuid4().hex[:10]}",
+                                                   protocol=mqtt.MQTTv5 if mqtt5 else mqtt.MQTTv311)
             # Assign event callbacks
             self.__local_mqtt_client.on_message = self.broker_on_message
             self.__local_mqtt_client.on_connect = self.broker_on_connect
             self.__local_mqtt_client.on_disconnect = self.broker_on_disconnect
             if user and passwd:
                 self.__local_mqtt_client.username_pw_set(user, passwd)
-            self.__local_mqtt_client.connect(broker, port, 60)
+            if self.feedback.retain:
+                # the retained status must not stay 'Online' if the daemon dies
+                self.__local_mqtt_client.will_set(f"{self.brokerFeedback}/status", "Offline", retain=True)
+            if mqtt5:
+                properties = Properties(PacketTypes.CONNECT)
+                properties.ReceiveMaximum = self.broker_receive_maximum
+                self.__local_mqtt_client.connect(broker, port, 60, properties=properties)
+            else:
+                self.__local_mqtt_client.connect(broker, port, 60)
+            self.feedback.attach(self.__local_mqtt_client, mqtt5)
             self.__local_mqtt_client.loop_start()
             self.__local_mqtt = True
         except socket.error:
             self._logger.error("Unable to connect to MQTT Broker")
             self.__local_mqtt_client = None
+            self.feedback.attach(None)
         return self.__local_mqtt_client
 
+    def __fallback_mqtt311(self):
+        '''
+        the broker did not accept MQTT v5, reconnect with MQTT 3.1.1
+        '''
+        if not self.__local_mqtt_v5:
+            return
+        self.__local_mqtt_v5 = False
+        self._logger.warning("MQTT v5 refused by broker, falling back to MQTT 3.1.1")
+        client = self.__local_mqtt_client
+        if client is not None:
+            client.loop_stop()
+            client.disconnect()
+        self._setup_mqtt_client(*self.__local_mqtt_args, mqtt5=False, retain=self.feedback.retain)
+
     def broker_on_connect(self, client: mqtt.Client, userdata, flags, reason_code, properties):
         self._logger.debug("Broker Connected with result code %s", reason_code)
+        if reason_code != 0 and self.__local_mqtt_v5 and not self.__local_mqtt_connected:
+            self._loop.call_soon_threadsafe(self._loop.run_in_executor, self._executors.connect, self.__fallback_mqtt311)
+            return
         # subscribe to commands and settings messages
         if reason_code == 0:
+            self.__local_mqtt_connected = True
+            self.feedback.connected(properties)
             client.subscribe(self.brokerCommand)
             client.subscribe(self.brokerSetting)
             self._logger.info('subscribed to %s, %s', self.brokerCommand, self.brokerSetting)
@@ -489,6 +789,9 @@ class iRobot:
 
     def broker_on_disconnect(self, client: mqtt.Client, userdata, flags, reason_code, properties):
         self._logger.debug("Broker disconnected")
+        if self.__local_mqtt_v5 and not self.__local_mqtt_connected and client is self.__local_mqtt_client:
+            # some MQTT 3 brokers just close the connection on a v5 CONNECT
+            self._loop.call_soon_threadsafe(self._loop.run_in_executor, self._executors.connect, self.__fallback_mqtt311)
 
     async def async_send_command(self, command):
         await self.__command_queue.put({'command': command})
@@ -547,10 +850,9 @@ class iRobot:
                 }
         command is json string, or dictionary.
         need 'regions' defined, or else whole map will be cleaned.
-        if 'pmap_id' is not specified, the first pmap_id found in robots list is used.
+        regions are dicts as above, region ids or region names known by the region catalogue (eg "kitchen").
+        if 'pmap_id' is not specified, the map of the named regions or the first map reported by the robot is used.
         '''
-        pmaps = self.get_property('pmaps')
-        self._logger.info('pmaps: %s', pmaps)
         myCommand = {}
         if not isinstance(command, dict):
             command = json.loads(command)
@@ -558,32 +860,31 @@ class iRobot:
         myCommand['command'] = command.get('command', 'start')
         myCommand['ordered'] = 1
         pmap_id = command.get('pmap_id')
-        user_pmap_id = command.get('user_pmapv_id')
-
-        if pmaps:
-            found = False
-            for pmap in pmaps:
-                for k, v in pmap.items():
-                    if pmap_id:
-                        if k == pmap_id:
-                            user_pmap_id = v
-                            found = True
-                            break
-                    else:
-                        pmap_id = k
-                        user_pmap_id = v
-                        found = True
-                        break
-                if found:
-                    break
+        catalogue = self.region_catalogue
 
-        myCommand['pmap_id'] = pmap_id
+        regions = []
         for region in command.get('regions', []):
-            myCommand.setdefault('regions', [])
-            if not isinstance(region, dict) and str(region).isdigit():
-                region = {'region_id': str(region), 'type': 'rid'}
             if isinstance(region, dict):
-                myCommand['regions'].append(region)
+                regions.append(region)
+                continue
+            found = catalogue.find_region(region, pmap_id)
+            if found is None and catalogue.reload_if_changed():
+                found = catalogue.find_region(region, pmap_id)
+            if found is None:
+                self._logger.warning('Unknown region %s for %s, ignored', region, self.name)
+                continue
+            region_pmap_id, entry = found
+            if pmap_id is None:
+                pmap_id = region_pmap_id
+            regions.append(entry)
+
+        if pmap_id is None:
+            pmap_id = catalogue.default_map()
+        user_pmap_id = catalogue.user_pmapv_id(pmap_id) or command.get('user_pmapv_id')
+
+        myCommand['pmap_id'] = pmap_id
+        if regions:
+            myCommand['regions'] = regions
         myCommand['user_pmapv_id'] = user_pmap_id
 
         self._send_command(myCommand)
@@ -627,13 +928,22 @@ class iRobot:
 
     def publish(self, topic, message):
         if self.__local_mqtt_client is not None and message is not None:
-            topic = f"{self.brokerFeedback}/{topic}"
-            self._logger.debug("Publishing item: %s: %s", topic, message)
-            self.__local_mqtt_client.publish(topic, message)
+            self.feedback.publish(topic, message)
 
     def set_callback(self, cb=None):
+        '''
+        cb is called with the whole master_state after each message, from an executor thread.
+        Prefer subscribe() to only receive what changed.
+        '''
         self.cb = cb
 
+    def subscribe(self, patterns: str | list[str], maxsize: int = 100) -> iRobotStateSubscription:
+        '''
+        subscribe to changes of master_state paths, eg 'state.reported.cleanMissionStatus.*' or 'state.reported.#'
+        each item of the returned async iterator is the list of (path, value) of the leaves changed by one robot message
+        '''
+        return self.subscriptions.subscribe(patterns, maxsize)
+
     def set_options(self, raw=False, max_sqft=0):
         self.raw = raw
         self.max_sqft = int(max_sqft)
@@ -646,7 +956,7 @@ class iRobot:
         td = dt - datetime.datetime(1970, 1, 1)
         return int(td.total_seconds())
 
-    def dict_merge(self, dct, merge_dct):
+    def dict_merge(self, dct, merge_dct, changes=None, path=()):
         '''
         Recursive dict merge. Inspired by :meth:``dict.update()``, instead
         of updating only top-level keys, dict_merge recurses down into dicts
@@ -654,13 +964,16 @@ class iRobot:
         merged into ``dct``.
         :param dct: dict onto which the merge is executed
         :param merge_dct: dct merged into dct
+        :param changes: if a list, (path, value) of each modified leaf or new sub dict is appended to it
         :return: None
         '''
         for k, v in merge_dct.items():
             if (k in dct and isinstance(dct[k], dict)
                     and isinstance(merge_dct[k], Mapping)):
-                self.dict_merge(dct[k], merge_dct[k])
+                self.dict_merge(dct[k], merge_dct[k], changes, path + (k,))
             else:
+                if changes is not None and (k not in dct or dct[k] != v):
+                    changes.append((path + (k,), v))
                 dct[k] = merge_dct[k]
 
     def recursive_lookup(self, search_dict, key, cap=False):
@@ -674,7 +987,7 @@ class iRobot:
                 if k == 'cap':
                     return self.recursive_lookup(v, key, False)
             elif k == key:
-                return v
+                return unwrap(v)
             elif isinstance(v, dict) and k != 'cap':
                 val = self.recursive_lookup(v, key, cap)
                 if val is not None:
@@ -701,7 +1014,8 @@ class iRobot:
             # order), else return as is...
             json_data = json.loads(
                 payload.decode("utf-8").replace(":nan", ":NaN").
-                replace(":inf", ":Infinity").replace(":-inf", ":-Infinity"))  # removed object_pairs_hook=OrderedDict
+                replace(":inf", ":Infinity").replace(":-inf", ":-Infinity"),
+                object_pairs_hook=compact_object)
             # if it's not a dictionary, probably just a number
             if not isinstance(json_data, dict):
                 return dict(json_data)
@@ -711,51 +1025,48 @@ class iRobot:
 
         return dict(json_data)
 
-    def decode_topics(self, state: dict, prefix=None):
+    def decode_topics(self, state: dict, prefix=None, changed: set[str] | None = None):
         '''
         decode json data dict, and publish as individual topics to
         brokerFeedback/topic the keys are concatenated with _ to make one unique
-        topic name strings are expressly converted to strings to avoid unicode
-        representations
+        topic name
+        changed is the set of keys modified by the message, None to re-evaluate everything
         '''
+        if prefix is not None:
+            self._decode_topics(state, prefix)
+            return
+        # the state and other critical values overtake the rest of a full dump
+        with self.feedback.batch():
+            self._decode_topics(state, None)
+            self.update_state_machine(changed=changed)
+
+    def _decode_topics(self, state: dict, prefix: str | None):
         for k, v in state.items():
+            if isinstance(v, iRobotLazyValue):
+                v = v.value
             if isinstance(v, dict):
                 if prefix is None:
-                    self.decode_topics(v, k)
+                    self._decode_topics(v, k)
                 else:
-                    self.decode_topics(v, prefix+"_"+k)
+                    self._decode_topics(v, prefix+"_"+k)
             else:
-                if isinstance(v, list):
-                    newlist = []
-                    for i in v:
-                        if isinstance(i, dict):
-                            json_i = json.dumps(i)
-                            self._logger.debug("json value for %s is %s", k, json_i)
-                            newlist.append(json_i)
-                        else:
-                            if not isinstance(i, str):
-                                i = str(i)
-                            newlist.append(i)
-                    v = json.dumps(newlist)
                 if prefix is not None:
                     k = prefix+"_"+k
                 # all data starts with this, so it's redundant
                 k = k.replace("state_reported_", "")
-                if not isinstance(v, str):
-                    v = str(v)
-                self.publish(k, v)
-
-        if prefix is None:
-            self.update_state_machine()
+                # lists, booleans and addresses are converted by the feedback publisher
+                self.publish(k, '' if v is None else v)
 
     async def get_settings(self, items):
-        result = {}
+        return self.get_properties(items)
+
+    def get_properties(self, items):
+        '''
+        values of several properties read from the in-memory state, 'state' is the decoded current state
+        '''
         if not isinstance(items, list):
             items = [items]
-        for item in items:
-            value = await self._loop.run_in_executor(None, self.get_property, item)
-            result[item] = value
-        return result
+        return {item: self.current_state if item == 'state' else self.get_property(item) for item in items}
 
     def get_error_message(self, error_num):
         try:
@@ -766,7 +1077,7 @@ class iRobot:
         return error_message
 
     def publish_error_message(self):
-        self.publish("error_message", self.error_message)
+        self.publish("error_message", self.error_message if self.error_num else '')
 
     def get_property(self, property, cap=False):
         '''
@@ -778,13 +1089,17 @@ class iRobot:
                 return value
         return self.recursive_lookup(self.master_state, property, cap)
 
+    def state_memory(self, seen: set[int] | None = None) -> int:
+        '''
+        approximate bytes used by master_state, pass the same seen set for all robots to count shared strings once
+        '''
+        return deep_sizeof(self.master_state, seen)
+
     @property
     def error_num(self):
-        try:
-            return self.cleanMissionStatus.get('error')
-        except AttributeError:
-            pass
-        return 0
+        if self.status.error is None:
+            return 0
+        return self.status.error
 
     @property
     def error_message(self):
@@ -796,11 +1111,11 @@ class iRobot:
 
     @property
     def batPct(self):
-        return self.get_property("batPct")
+        return self.status.batPct
 
     @property
     def bin_full(self):
-        return self.get_property("bin_full")
+        return self.status.bin_full
 
     @property
     def tanklvl(self):
@@ -808,20 +1123,20 @@ class iRobot:
 
     @property
     def rechrgM(self):
-        return self.get_property("rechrgM")
+        return self.status.rechrgM
 
     def calc_mssM(self):
-        start_time = self.get_property("mssnStrtTm")
+        start_time = self.status.mssnStrtTm
         if start_time:
             return int((datetime.datetime.now() - datetime.datetime.fromtimestamp(start_time)).total_seconds()//60)
-        start = self.timers.get('start')
+        start = self.mission_start
         if start:
             return int((time.time()-start)//60)
         return None
 
     @property
     def mssnM(self):
-        mssM = self.get_property("mssnM")
+        mssM = self.status.mssnM
         if not mssM:
             run_time = self.calc_mssM()
             return run_time if run_time else mssM
@@ -837,15 +1152,15 @@ class iRobot:
 
     @property
     def sku(self):
-        return self.get_property("sku")
+        return self.status.sku
 
     @property
     def mission(self):
-        return self.get_property("cycle")
+        return self.status.cycle
 
     @property
     def phase(self):
-        return self.get_property("phase")
+        return self.status.phase
 
     @property
     def cleanMissionStatus_phase(self):
@@ -900,7 +1215,7 @@ class iRobot:
 
     def update_precent_complete(self):
         try:
-            sq_ft = self.get_property("sqft")
+            sq_ft = self.status.sqft
             if self.max_sqft and sq_ft is not None:
                 percent_complete = int(sq_ft)*100//self.max_sqft
                 self.publish("roomba_percent_complete", percent_complete)
@@ -918,7 +1233,7 @@ class iRobot:
         else:
             current = self.get_property(property, cap)
         if isinstance(current, dict):
-            current = current.copy()
+            current = copy.deepcopy(current)
         previous = self.history.get(property, {}).get('current')
         if previous is None:
             previous = current
@@ -928,7 +1243,7 @@ class iRobot:
 
     def set_history(self, property, value=None):
         if isinstance(value, dict):
-            value = value.copy()
+            value = copy.deepcopy(value)
         self.history[property] = {'current': value,
                                   'previous': value}
 
@@ -943,22 +1258,29 @@ class iRobot:
         return changed
 
     def is_set(self, name):
-        return self.timers.get(name, {}).get('value', False)
+        timer = self.timers.get(name)
+        return timer is not None and timer.pending
 
     def when_run(self, name):
-        th = self.timers.get(name, {}).get('reset', None)
-        if th:
-            return max(0, int(th._when - self._loop.time()))
+        timer = self.timers.get(name)
+        if timer:
+            return int(timer.remaining())
         return 0
 
     def timer(self, name, value=False, duration=10):
-        self.timers.setdefault(name, {})
-        self.timers[name]['value'] = value
-        self._logger.debug('Set %s to: %s', name, value)
-        if self.timers[name].get('reset'):
-            self.timers[name]['reset'].cancel()
+        '''
+        set flag name to value, a True value is reset after duration seconds
+        '''
+        timer = self.timers.get(name)
+        if timer is None:
+            timer = self.timers[name] = self._scheduler.register(self._config.blid, name, lambda: self._logger.debug('Reset %s', name))
         if value:
-            self.timers[name]['reset'] = self._loop.call_later(duration, self.timer, name)  # reset reset timer in duration seconds
+            timer.arm(duration)
+        elif timer.armed:
+            timer.cancel()
+        else:
+            return
+        self._logger.debug('Set %s to: %s', name, value)
 
     def roomba_type(self, type):
         '''
@@ -975,7 +1297,7 @@ class iRobot:
             return self.sku[0].lower() in type
         return None
 
-    def update_state_machine(self, new_state=None):
+    def update_state_machine(self, new_state=None, changed: set[str] | None = None):
         '''
         iRobot progresses through states (phases), current identified states
         are:
@@ -1035,7 +1357,7 @@ class iRobot:
               {"x": -161, "y": 181},
               {"x": 0, "y": 0}
 
-              For now use self.distance_betwwen() to ignore large changes in position
+              self.trajectory uses distance_between() and a speed limit to ignore large changes in position
 
         Need to identify a new mission to initialize map, and end of mission to
         finalise map.
@@ -1048,77 +1370,146 @@ class iRobot:
             self._logger.info("set current state to: %s", self.current_state)
             return
 
-        self.publish_error_message()  # publish error messages
-        self.update_precent_complete()
-        mission = self.update_history("cycle")  # mission
-        phase = self.update_history("phase")  # mission phase
-        self.update_history("pose")  # update co-ordinates
+        if changed is None or self.derived_values["error_message"] & changed:
+            self.publish_error_message()  # publish error messages
+        if changed is None or self.derived_values["roomba_percent_complete"] & changed:
+            self.update_precent_complete()
 
         if self.cb is not None:  # call callback if set
             self.cb(self.master_state)
 
+        if changed is not None and not self.state_inputs & changed and self.current_state != self.states["new"]:
+            return  # nothing relevant for the state machine, eg signal or wifistat update
+
+        mission = self.update_history("cycle", self.status.cycle)  # mission
+        phase = self.update_history("phase", self.status.phase)  # mission phase
+        self.update_history("pose")  # update co-ordinates
+
         if phase is None or mission is None:
             return
 
         if self._debug:
             self.timer('ignore_coordinates')
+            self._logger.debug(
+                '%s current_state: %s, current phase: %s, mission: %s, mission_min: %s, recharge_min: %s, co-ords changed: %s',
+                self.name,
+                self.current_state,
+                phase,
+                mission,
+                self.mssnM,
+                self.rechrgM,
+                self.changed('pose')
+            )
+
+        for condition, action in self._transitions:
+            if condition is None or condition(phase, mission):
+                action(phase, mission)
+                break
+
+        self.publish("state", self.current_state)
+
+        if mission != 'none':
+            if not self.mission_summary.active:
+                self.mission_summary.start(mission, self.mission_start)
+            self.mission_summary.update(phase, self.error_num, self.error_message, self.status.sqft, self.bin_full)
 
-        self._logger.debug(
-            '%s current_state: %s, current phase: %s, mission: %s, mission_min: %s, recharge_min: %s, co-ords changed: %s',
-            self.name,
-            self.current_state,
-            phase,
-            mission,
-            self.mssnM,
-            self.rechrgM,
-            self.changed('pose')
-        )
-
-        if self.current_state == self.states["new"] and phase != 'run':
-            self._logger.info('waiting for run state for New Missions')
-            if time.time() - self.timers['start'] >= 20:
-                self._logger.warning('Timeout waiting for run state')
-                self.current_state = self.states[phase]
-
-        elif phase == "run" and (self.is_set('ignore_run') or mission == 'none'):
-            self._logger.info('Ignoring bogus run state')
-
-        elif phase == "charge" and mission == 'none' and self.is_set('ignore_run'):
-            self._logger.info('Ignoring bogus charge/mission state')
-            self.update_history("cycle", self.previous('cycle'))
-
-        elif phase in ["hmPostMsn", "hmMidMsn", "hmUsrDock"]:
-            self.timer('ignore_run', True, 10)
+        if self.is_set('ignore_coordinates') and self.current_state != self.states["new"]:
+            self._logger.info('Ignoring co-ordinate updates')
+        elif mission != 'none' and self.changed('pose'):
+            if not self.trajectory.active:
+                # daemon started during a mission
+                self.trajectory.start(self.mission_start)
+                self.coverage.reset()
+            if self.trajectory.add(self.pose, phase):
+                self.update_coverage(pose_to_point(self.pose), self.trajectory.new_segment)
+
+    def _is_waiting_run(self, phase, mission):
+        return self.current_state == self.states["new"] and phase != 'run'
+
+    def _wait_run(self, phase, mission):
+        self._logger.info('waiting for run state for New Missions')
+        if time.time() - self.mission_start >= 20:
+            self._logger.warning('Timeout waiting for run state')
             self.current_state = self.states[phase]
 
-        elif self.changed('cycle'):  # if mission has changed
-            if mission != 'none':
-                self.current_state = self.states["new"]
-                self.timers['start'] = time.time()
-                if isinstance(self.sku, str) and self.sku[0].lower() in ['i', 's', 'm']:
-                    # self.timer('ignore_coordinates', True, 30)  #ignore updates for 30 seconds at start of new mission
-                    pass
-            else:
-                self.timers.pop('start', None)
-                if self.bin_full:
-                    self.current_state = self.states["cancelled"]
-                else:
-                    self.current_state = self.states["completed"]
-                self.timer('ignore_run', True, 5)  # still get bogus 'run' states after mission complete.
+    def _is_bogus_run(self, phase, mission):
+        return phase == "run" and (self.is_set('ignore_run') or mission == 'none')
+
+    def _ignore_bogus_run(self, phase, mission):
+        self._logger.info('Ignoring bogus run state')
+
+    def _is_bogus_charge(self, phase, mission):
+        return phase == "charge" and mission == 'none' and self.is_set('ignore_run')
+
+    def _ignore_bogus_charge(self, phase, mission):
+        self._logger.info('Ignoring bogus charge/mission state')
+        self.update_history("cycle", self.previous('cycle'))
+
+    def _is_docking(self, phase, mission):
+        return phase in ["hmPostMsn", "hmMidMsn", "hmUsrDock"]
+
+    def _dock(self, phase, mission):
+        self.timer('ignore_run', True, 10)
+        self.current_state = self.states[phase]
+
+    def _is_mission_changed(self, phase, mission):
+        return self.changed('cycle')
 
-        elif phase == "charge" and self.rechrgM:
+    def _change_mission(self, phase, mission):
+        if mission != 'none':
+            self.current_state = self.states["new"]
+            self.mission_start = time.time()
+            self.trajectory.start(self.mission_start)
+            self.coverage.reset()
+            self.mission_summary.start(mission, self.mission_start)
+            if isinstance(self.sku, str) and self.sku[0].lower() in ['i', 's', 'm']:
+                # self.timer('ignore_coordinates', True, 30)  #ignore updates for 30 seconds at start of new mission
+                pass
+        else:
+            self.mission_start = None
+            self.trajectory.finish()
+            self.coverage.save()
             if self.bin_full:
-                self.current_state = self.states["pause"]
+                self.current_state = self.states["cancelled"]
             else:
-                self.current_state = self.states["recharge"]
+                self.current_state = self.states["completed"]
+            self.timer('ignore_run', True, 5)  # still get bogus 'run' states after mission complete.
+            self.publish_mission(self.mission_summary.finish(self.current_state))
+
+    def _is_recharging(self, phase, mission):
+        return phase == "charge" and self.rechrgM
 
+    def _recharge(self, phase, mission):
+        if self.bin_full:
+            self.current_state = self.states["pause"]
         else:
-            try:
-                self.current_state = self.states[phase]
-            except KeyError:
-                self._logger.warning('phase: %s not found in self.states', phase)
+            self.current_state = self.states["recharge"]
 
-        self.publish("state", self.current_state)
+    def _follow_phase(self, phase, mission):
+        try:
+            self.current_state = self.states[phase]
+        except KeyError:
+            self._logger.warning('phase: %s not found in self.states', phase)
 
-        if self.is_set('ignore_coordinates') and self.current_state != self.states["new"]:
-            self._logger.info('Ignoring co-ordinate updates')
+    def publish_mission(self, summary: dict | None):
+        '''
+        save the summary of the finished mission and publish it
+        '''
+        if summary is None:
+            return
+        self._logger.info('%s mission %s: %s after %s min, %s sqft, %s recharge(s)', self.name, summary['cycle'],
+                          summary['result'], summary['duration'], summary['sqft'], summary['recharges'])
+        if self._mission_log is not None:
+            self._mission_log.append(summary)
+        for key in ['result', 'duration', 'sqft', 'recharges', 'stuck', 'evacs']:
+            self.publish(f"lastMission_{key}", summary[key])
+        self.publish("lastMission", json.dumps(summary))
+
+    def update_coverage(self, point, new_segment=False):
+        '''
+        paint the new position on the coverage map, the PNG is rewritten at most every map_refresh_seconds
+        '''
+        self.coverage.add_point(*point, new_stroke=new_segment)
+        if time.time() - self.__map_saved >= self.map_refresh_seconds:
+            if self.coverage.save():
+                self.__map_saved = time.time()
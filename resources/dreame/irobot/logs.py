@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from __future__ import annotations
+
+import atexit
+import logging
+from logging.handlers import QueueHandler, QueueListener
+import queue
+import threading
+import time
+
+# arguments of these types can be formatted later in the writer thread
+_IMMUTABLE_TYPES = (str, bytes, int, float, bool, type(None))
+
+
+class iRobotQueueHandler(QueueHandler):
+    '''
+    Hand records over to the writer thread, the message is only formatted there unless
+    some argument could be modified in the meantime (dict, list...)
+    '''
+
+    dropped = 0
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        args = record.args
+        if isinstance(args, tuple) and all(isinstance(arg, _IMMUTABLE_TYPES) for arg in args) and not record.exc_info:
+            return record
+        return super().prepare(record)
+
+
+def setup_queue_logging(logger: logging.Logger | None = None, maxsize: int = 10000) -> QueueListener | None:
+    '''
+    move the handlers of logger (root by default) to a background writer thread,
+    logging calls then only enqueue the record. Records are dropped if the writer falls behind by maxsize.
+    Returns the started listener, to stop on exit.
+    '''
+    if logger is None:
+        logger = logging.getLogger()
+    handlers = [handler for handler in logger.handlers if not isinstance(handler, QueueHandler)]
+    if not handlers:
+        return None
+    records: queue.Queue = queue.Queue(maxsize)
+    listener = QueueListener(records, *handlers, respect_handler_level=True)
+    for handler in handlers:
+        logger.removeHandler(handler)
+    logger.addHandler(iRobotQueueHandler(records))
+    listener.start()
+    # flush what is left when the process exits
+    atexit.register(listener.stop)
+    return listener
+
+
+class iRobotLogThrottle:
+    '''
+    Allow a message at most once per interval for each key, count the suppressed ones
+    '''
+
+    def __init__(self, interval: float = 60):
+        self.interval = interval
+        self._last: dict[str, float] = {}
+        self._suppressed: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def allow(self, key: str) -> int | None:
+        '''
+        number of messages suppressed since the last allowed one, None if this one must be suppressed too
+        '''
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last.get(key, -self.interval) < self.interval:
+                self._suppressed[key] = self._suppressed.get(key, 0) + 1
+                return None
+            self._last[key] = now
+            return self._suppressed.pop(key, 0)
+
+
+class iRobotLogSampler:
+    '''
+    Select 1 event in every, so detailed logs of a busy robot stay readable and cheap
+    '''
+
+    def __init__(self, every: int = 50):
+        self.every = max(1, every)
+        self._count = self.every - 1  # first event is sampled
+
+    def sample(self) -> bool:
+        self._count += 1
+        if self._count >= self.every:
+            self._count = 0
+            return True
+        return False
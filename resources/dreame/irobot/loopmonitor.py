@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from __future__ import annotations
+
+import asyncio
+from collections import deque
+import logging
+import sys
+import threading
+import time
+import traceback
+
+
+class iRobotLoopMonitor:
+    '''
+    Measure the scheduling lag of the event loop and find the calls blocking it.
+
+    A task wakes up every interval and records how late it is in a histogram. A watchdog
+    thread checks the last wake up: when the loop did not run for more than threshold, the
+    stack of the loop thread is captured while it is still blocked, and logged.
+    '''
+
+    BUCKETS = (1, 5, 10, 50, 100, 250, 500, 1000, 5000)  # ms, upper bounds
+    MAX_CAPTURES = 10
+
+    def __init__(self, interval: float = 0.25, threshold: float = 0.5):
+        self._logger = logging.getLogger()
+        self.interval = interval
+        self.threshold = threshold
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._loop_thread_id: int | None = None
+        self._task: asyncio.Task | None = None
+        self._thread: threading.Thread | None = None
+        self._stop = threading.Event()
+        self._beat = 0.0
+        self._captured_beat = None
+        self.histogram = [0] * (len(self.BUCKETS) + 1)
+        self.samples = 0
+        self.max_lag = 0.0
+        self.total_lag = 0.0
+        self.stalls = 0
+        self.captures: deque[dict] = deque(maxlen=self.MAX_CAPTURES)
+
+    def start(self):
+        '''
+        to call from the event loop to monitor
+        '''
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._beat = time.monotonic()
+        self._stop.clear()
+        self._task = self._loop.create_task(self.__measure())
+        self._thread = threading.Thread(target=self.__watch, name='irobot-loop-monitor', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def __record(self, lag: float):
+        ms = lag * 1000
+        for index, bound in enumerate(self.BUCKETS):
+            if ms <= bound:
+                break
+        else:
+            index = len(self.BUCKETS)
+        self.histogram[index] += 1
+        self.samples += 1
+        self.total_lag += lag
+        if lag > self.max_lag:
+            self.max_lag = lag
+
+    async def __measure(self):
+        while True:
+            try:
+                expected = time.monotonic() + self.interval
+                await asyncio.sleep(self.interval)
+                now = time.monotonic()
+                lag = max(0.0, now - expected)
+                self._beat = now
+                self.__record(lag)
+                if lag > self.threshold:
+                    self.stalls += 1
+                    self._logger.warning('Event loop was blocked for %i ms', lag * 1000)
+            except asyncio.CancelledError:
+                break
+
+    def __watch(self):
+        while not self._stop.wait(self.threshold / 2):
+            beat = self._beat
+            blocked = time.monotonic() - beat - self.interval
+            if blocked <= self.threshold or beat == self._captured_beat:
+                continue
+            # only one capture per stall, the loop thread is still inside the blocking call
+            self._captured_beat = beat
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            stack = ''.join(traceback.format_stack(frame))
+            self.captures.append({'time': time.time(), 'blocked_ms': int(blocked * 1000), 'stack': stack})
+            self._logger.warning('Event loop blocked for more than %i ms in:\n%s', blocked * 1000, stack)
+
+    def stats(self) -> dict:
+        labels = [f"<={bound}ms" for bound in self.BUCKETS] + [f">{self.BUCKETS[-1]}ms"]
+        return {
+            'samples': self.samples,
+            'mean_lag_ms': round(self.total_lag * 1000 / self.samples, 1) if self.samples else None,
+            'max_lag_ms': round(self.max_lag * 1000, 1),
+            'stalls': self.stalls,
+            'histogram': dict(zip(labels, self.histogram)),
+            'captures': list(self.captures),
+        }
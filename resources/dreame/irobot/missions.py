@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from __future__ import annotations
+
+import datetime
+import json
+import logging
+from pathlib import Path
+import threading
+import time
+
+
+class iRobotMission:
+    '''
+    Summary of a mission built incrementally from the state machine
+    '''
+
+    def __init__(self, blid: str):
+        self._blid = blid
+        self._active = False
+        self.__reset()
+
+    def __reset(self):
+        self.cycle = None
+        self.start_time = None
+        self.sqft = 0
+        self.recharges = 0
+        self.stuck = 0
+        self.evacs = 0
+        self.bin_full = 0
+        self.errors: dict[int, str] = {}
+        self._phase = None
+        self._bin_full = False
+
+    @property
+    def active(self):
+        return self._active
+
+    def start(self, cycle: str, start_time: float | None = None):
+        self.__reset()
+        self._active = True
+        self.cycle = cycle
+        self.start_time = time.time() if start_time is None else start_time
+
+    def update(self, phase: str, error_num: int | None = None, error_message: str | None = None, sqft=None, bin_full=False):
+        '''
+        account for the current robot status, counters are incremented on transitions only
+        '''
+        if not self._active:
+            return
+        if phase != self._phase:
+            if phase == 'hmMidMsn':
+                self.recharges += 1
+            elif phase == 'stuck':
+                self.stuck += 1
+            elif phase == 'evac':
+                self.evacs += 1
+            self._phase = phase
+        if bin_full and not self._bin_full:
+            self.bin_full += 1
+        self._bin_full = bool(bin_full)
+        if error_num:
+            self.errors.setdefault(int(error_num), error_message)
+        try:
+            self.sqft = max(self.sqft, int(sqft))
+        except (TypeError, ValueError):
+            pass
+
+    def finish(self, result: str, end_time: float | None = None) -> dict | None:
+        '''
+        close the mission and return its summary
+        '''
+        if not self._active:
+            return None
+        self._active = False
+        end_time = time.time() if end_time is None else end_time
+        return {
+            'blid': self._blid,
+            'cycle': self.cycle,
+            'result': result,
+            'start': int(self.start_time),
+            'end': int(end_time),
+            'duration': int(end_time - self.start_time) // 60,
+            'sqft': self.sqft,
+            'recharges': self.recharges,
+            'stuck': self.stuck,
+            'evacs': self.evacs,
+            'bin_full': self.bin_full,
+            'errors': [{'code': code, 'message': message} for code, message in self.errors.items()]
+        }
+
+
+class iRobotMissionLog:
+    '''
+    Append-only log of finished missions of all robots.
+
+    Summaries are stored one JSON per line in missions.jsonl. index.jsonl is appended
+    with [blid, day, offset, end] for each line so queries only read the matching lines.
+    On load the index is checked against the size of the log: lines written after the
+    last indexed one (eg a crash between both writes) are indexed, an index going past
+    the end of the log or unreadable is rebuilt.
+    '''
+
+    def __init__(self, path: Path):
+        self._logger = logging.getLogger()
+        self.__path = path
+        self.__log_file = path/'missions.jsonl'
+        self.__index_file = path/'index.jsonl'
+        self.__lock = threading.Lock()
+        self.__index: dict[str, dict[str, list[int]]] = {}
+        self.__indexed = 0  # end of the last indexed line of the log
+        self.__load_index()
+
+    def __load_index(self):
+        size = self.__log_file.stat().st_size if self.__log_file.exists() else 0
+        if self.__index_file.exists():
+            try:
+                with self.__index_file.open('rb') as file:
+                    for line in file:
+                        blid, day, offset, end = json.loads(line)
+                        self.__add(blid, day, offset, end)
+            except (ValueError, TypeError) as e:
+                self._logger.warning('Invalid mission index, rebuilding it: %s', e)
+                self.__indexed = size + 1
+        if self.__indexed > size:
+            self.__index = {}
+            self.__indexed = 0
+            self.__index_file.unlink(missing_ok=True)
+        if self.__indexed < size:
+            try:
+                self.__index_log()
+            except OSError as e:
+                self._logger.warning('Unable to index missions: %s', e)
+
+    def __index_log(self):
+        '''
+        index the lines of the log after the last indexed one
+        '''
+        entries = []
+        with self.__log_file.open('rb') as file:
+            file.seek(self.__indexed)
+            offset = self.__indexed
+            for line in file:
+                end = offset + len(line)
+                if not line.endswith(b'\n'):
+                    break  # partial line of an interrupted write
+                try:
+                    mission = json.loads(line)
+                    entries.append([mission['blid'], self.__day(mission), offset, end])
+                except (ValueError, KeyError, TypeError):
+                    pass
+                offset = end
+        for entry in entries:
+            self.__add(*entry)
+        self.__write_entries(entries)
+        self.__indexed = offset
+
+    @staticmethod
+    def __day(mission: dict) -> str:
+        return datetime.date.fromtimestamp(mission['start']).isoformat()
+
+    def __add(self, blid: str, day: str, offset: int, end: int):
+        self.__index.setdefault(blid, {}).setdefault(day, []).append(offset)
+        self.__indexed = max(self.__indexed, end)
+
+    def __write_entries(self, entries: list[list]):
+        if entries:
+            with self.__index_file.open('ab') as file:
+                file.write(b''.join((json.dumps(entry, separators=(',', ':')) + '\n').encode('utf-8') for entry in entries))
+
+    def append(self, mission: dict):
+        line = (json.dumps(mission, separators=(',', ':')) + '\n').encode('utf-8')
+        with self.__lock:
+            try:
+                self.__path.mkdir(parents=True, exist_ok=True)
+                with self.__log_file.open('ab') as file:
+                    offset = file.tell()
+                    file.write(line)
+                if offset != self.__indexed:
+                    # the log has been changed by someone else
+                    self.__index_log()
+                    return
+                entry = [mission['blid'], self.__day(mission), offset, offset + len(line)]
+                self.__add(*entry)
+                self.__write_entries([entry])
+            except OSError as e:
+                self._logger.warning('Unable to save mission of %s: %s', mission.get('blid'), e)
+
+    def query(self, blid: str | None = None, days: int = 30) -> list[dict]:
+        '''
+        missions started during the last days, of one robot or all robots
+        '''
+        since = (datetime.date.today() - datetime.timedelta(days=days)).isoformat()
+        with self.__lock:
+            offsets = sorted(offset for robot, index in self.__index.items() if blid is None or robot == blid
+                             for day, day_offsets in index.items() if day >= since for offset in day_offsets)
+            if not offsets:
+                return []
+            result = []
+            with self.__log_file.open('rb') as file:
+                for offset in offsets:
+                    file.seek(offset)
+                    result.append(json.loads(file.readline()))
+        return result
@@ -3,7 +3,6 @@ from __future__ import annotations
 import logging
 import socket
 import struct
-import requests
 
 from .utils import generate_tls_context
 
@@ -32,6 +31,8 @@ class iRobotPassword:
 
     @staticmethod
     def get_passwords_from_cloud(login: str, password: str) -> dict | None:
+        import requests  # heavy, only needed during discovery with cloud login
+
         try:
             r = requests.get("https://disc-prod.iot.irobotapi.com/v1/discover/endpoints?country_code=US")
             r.raise_for_status()
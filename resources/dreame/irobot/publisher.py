@@ -0,0 +1,388 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from __future__ import annotations
+
+from contextlib import contextmanager
+import ipaddress
+import json
+import threading
+import time
+import uuid
+
+import paho.mqtt.client as mqtt
+from paho.mqtt.packettypes import PacketTypes
+from paho.mqtt.properties import Properties
+
+from .deadband import iRobotDeadband
+from .scheduler import iRobotTimer
+
+
+class iRobotFeedbackPublisher:
+    '''
+    Publish the feedback values of one robot on the local broker.
+
+    With MQTT v5 the frequent topics get a topic alias, only their first publication of
+    a connection carries the topic name, and transient values expire instead of being
+    delivered late to a slow subscriber.
+
+    Values go through one queue per priority lane: critical, mission progress, inventory.
+    The sending thread always takes the next value from the highest lane, and inside batch()
+    (eg a full state dump) only the critical lane is sent before the batch ends, so a phase
+    change or an error is not queued behind hundreds of static values. A value waiting in
+    a queue is replaced by a newer value of the same key.
+
+    Values are published in their final Jeedom form: booleans as 1/0, addresses of the robot
+    network as dotted strings, lists and dicts as plain JSON. Configuration values are only
+    published when they change, once per connection to the broker and after resend().
+
+    Noisy values are first filtered by the deadband, if any. Changes it holds back are
+    published by flush(), run by flush_timer when they are due. After resend() the next
+    value of each key is published whatever the deadband.
+    '''
+
+    # lane 0, never held back by a batch
+    critical_keys = frozenset([
+        "state", "status", "error_message", "batPct", "bin_full", "bin_present", "dock_known",
+        "cleanMissionStatus_phase", "cleanMissionStatus_cycle", "cleanMissionStatus_error", "cleanMissionStatus_notReady",
+    ])
+    # lane 1 (a key matches if it starts with one of them), any other key is in the inventory lane
+    progress_keys = ("cleanMissionStatus_", "roomba_percent_complete", "pose_", "signal_", "lastMission", "bbrun_", "bbmssn_", "mission_")
+    LANES = ('critical', 'progress', 'inventory')
+
+    # feedback keys published often, they get a topic alias while the broker grants some
+    alias_keys = frozenset([
+        "pose_theta", "pose_point_x", "pose_point_y",
+        "signal_rssi", "signal_snr", "signal_noise",
+        "batPct", "state", "roomba_percent_complete",
+        "cleanMissionStatus_phase", "cleanMissionStatus_sqft", "cleanMissionStatus_mssnM",
+        "cleanMissionStatus_rechrgM", "cleanMissionStatus_expireM",
+    ])
+
+    # feedback keys only meaningful for a short time
+    transient_keys = frozenset([
+        "pose_theta", "pose_point_x", "pose_point_y",
+        "signal_rssi", "signal_snr", "signal_noise",
+        "roomba_percent_complete", "cleanMissionStatus_mssnM", "cleanMissionStatus_expireM",
+    ])
+    transient_expiry = 60  # s
+
+    # feedback keys rarely changing, retained by the broker in retain mode so a subscriber
+    # gets the last known value immediately (a key matches if it starts with one of them)
+    retained_keys = ("sku", "softwareVer", "name", "mac", "hwPartsRev_", "netinfo_", "cleanSchedule", "pmaps", "status", "lastMission")
+
+    # feedback keys stored in the Jeedom equipment configuration, only sent when they change
+    # (a key matches if it starts with one of them)
+    config_keys = ("mac", "sku", "netinfo_", "hwPartsRev_wlan0HwAddr", "batInfo_mName")
+
+    # feedback keys holding an IPv4 address, sent by the robot as an integer
+    address_keys = frozenset(["netinfo_addr", "netinfo_mask", "netinfo_gw", "netinfo_dns1", "netinfo_dns2"])
+
+    def __init__(self, prefix: str, retain: bool = False, deadband: iRobotDeadband | None = None):
+        self.prefix = prefix
+        self.retain = retain
+        self.deadband = deadband
+        self.flush_timer: iRobotTimer | None = None
+        self._retained: dict[str, bool] = {}
+        self._config: dict[str, bool] = {}
+        self._config_sent: dict[str, object] = {}
+        self._client: mqtt.Client | None = None
+        self._v5 = False
+        self._lock = threading.Lock()
+        self._aliases: dict[str, int] = {}
+        self._alias_max = 0
+        self._properties: dict[str, Properties | None] = {}
+        self.published = 0
+        self.aliased = 0
+        self.expiring = 0
+        self.bytes_sent = 0
+        self.bytes_saved = 0
+        self.retained = 0
+        self.unchanged = 0
+        self._lanes_of: dict[str, int] = {}
+        self._queue_lock = threading.Lock()
+        self._send_lock = threading.Lock()
+        self._pending: list[dict[str, tuple[object, float]]] = [{} for _ in self.LANES]
+        self._holding = 0
+        self.lane_sent = [0] * len(self.LANES)
+        self.lane_coalesced = [0] * len(self.LANES)
+        self.lane_max_wait = [0.0] * len(self.LANES)
+
+    def lane_of(self, key: str) -> int:
+        lane = self._lanes_of.get(key)
+        if lane is None:
+            if key in self.critical_keys:
+                lane = 0
+            elif key.startswith(self.progress_keys):
+                lane = 1
+            else:
+                lane = 2
+            self._lanes_of[key] = lane
+        return lane
+
+    def is_retained(self, key: str) -> bool:
+        if not self.retain:
+            return False
+        retained = self._retained.get(key)
+        if retained is None:
+            retained = self._retained[key] = key.startswith(self.retained_keys)
+        return retained
+
+    def is_config(self, key: str) -> bool:
+        config = self._config.get(key)
+        if config is None:
+            config = self._config[key] = key.startswith(self.config_keys)
+        return config
+
+    def resend(self):
+        '''
+        publish the next values even if unchanged or within their deadband, eg Jeedom has been restarted
+        '''
+        with self._lock:
+            self._config_sent.clear()
+        if self.deadband is not None:
+            self.deadband.reset()
+
+    def close(self) -> mqtt.Client | None:
+        '''
+        send the values still pending and stop publishing, return the client to disconnect
+        '''
+        with self._send_lock:
+            pass  # wait for a thread still sending
+        self.__drain()
+        with self._lock:
+            client, self._client = self._client, None
+        return client
+
+    def normalise(self, key: str, value):
+        '''
+        value as stored by Jeedom
+        '''
+        if isinstance(value, bool):
+            return 1 if value else 0
+        if isinstance(value, int) and key in self.address_keys:
+            return str(ipaddress.IPv4Address(value & 0xFFFFFFFF))
+        if isinstance(value, (list, dict)):
+            return json.dumps(value)
+        return value
+
+    def attach(self, client: mqtt.Client | None, v5: bool = False):
+        with self._lock:
+            self._client = client
+            self._v5 = v5
+            self._aliases.clear()
+            self._properties.clear()
+            self._alias_max = 0
+
+    def connected(self, properties: Properties | None = None):
+        '''
+        to call on each (re)connection, aliases only live as long as the connection
+        '''
+        with self._lock:
+            self._aliases.clear()
+            self._properties.clear()
+            self._config_sent.clear()
+            self._alias_max = getattr(properties, 'TopicAliasMaximum', 0) if self._v5 and properties is not None else 0
+
+    def __properties(self, key: str, alias: int | None) -> Properties | None:
+        if key not in self._properties:
+            properties = None
+            if alias is not None or key in self.transient_keys:
+                properties = Properties(PacketTypes.PUBLISH)
+                if alias is not None:
+                    properties.TopicAlias = alias
+                if key in self.transient_keys:
+                    properties.MessageExpiryInterval = self.transient_expiry
+            self._properties[key] = properties
+        return self._properties[key]
+
+    @contextmanager
+    def batch(self):
+        '''
+        hold back the progress and inventory values published inside, they are sent at the end after the critical ones
+        '''
+        with self._queue_lock:
+            self._holding += 1
+        try:
+            yield
+        finally:
+            with self._queue_lock:
+                self._holding -= 1
+            self.__drain()
+
+    def publish(self, key: str, value):
+        if self._client is None:
+            return
+        value = self.normalise(key, value)
+        if self.is_config(key):
+            with self._lock:
+                if key in self._config_sent and self._config_sent[key] == value:
+                    self.unchanged += 1
+                    return
+                self._config_sent[key] = value
+        if self.deadband is not None:
+            now = time.monotonic()
+            for due_key, due_value in self.deadband.due(now):
+                self.__enqueue(due_key, due_value)
+            if self.deadband.accept(key, value, now):
+                self.__enqueue(key, value)
+            self.__arm_flush(now)
+        else:
+            self.__enqueue(key, value)
+        self.__drain()
+
+    def flush(self):
+        '''
+        publish the changes held back by the deadband which are due, even if nothing else is published
+        '''
+        if self._client is None or self.deadband is None:
+            return
+        now = time.monotonic()
+        for key, value in self.deadband.due(now):
+            self.__enqueue(key, value)
+        self.__drain()
+        self.__arm_flush(now)
+
+    def __arm_flush(self, now: float):
+        timer = self.flush_timer
+        next_due = self.deadband.next_due()
+        if timer is None or next_due == float('inf'):
+            return
+        delay = max(0.0, next_due - now)
+        if not timer.armed or timer.remaining() > delay:
+            timer.arm(delay)
+
+    def __enqueue(self, key: str, value):
+        lane = self.lane_of(key)
+        with self._queue_lock:
+            pending = self._pending[lane]
+            if key in pending:
+                self.lane_coalesced[lane] += 1
+                pending[key] = (value, pending[key][1])
+            else:
+                pending[key] = (value, time.perf_counter())
+
+    def __next(self) -> tuple[int, str, object, float] | None:
+        with self._queue_lock:
+            lanes = len(self.LANES) if self._holding == 0 else 1
+            for lane in range(lanes):
+                pending = self._pending[lane]
+                if pending:
+                    key = next(iter(pending))
+                    value, queued = pending.pop(key)
+                    return lane, key, value, queued
+        return None
+
+    def __drain(self):
+        '''
+        send the pending values, highest lane first; if another thread is already sending, it sends ours too
+        '''
+        while True:
+            if not self._send_lock.acquire(blocking=False):
+                return
+            try:
+                while (item := self.__next()) is not None:
+                    lane, key, value, queued = item
+                    wait = time.perf_counter() - queued
+                    if wait > self.lane_max_wait[lane]:
+                        self.lane_max_wait[lane] = wait
+                    self.lane_sent[lane] += 1
+                    self.__send(key, value)
+            finally:
+                self._send_lock.release()
+            # a value queued while the lock was being released would wait for the next publication
+            with self._queue_lock:
+                lanes = len(self.LANES) if self._holding == 0 else 1
+                if not any(self._pending[lane] for lane in range(lanes)):
+                    return
+
+    def __send(self, key: str, value):
+        client = self._client
+        if client is None:
+            return
+        topic = f"{self.prefix}/{key}"
+        size = len(topic) + len(str(value))
+        retain = self.is_retained(key)
+        if retain:
+            self.retained += 1
+        if not self._v5:
+            client.publish(topic, value, retain=retain)
+            self.published += 1
+            self.bytes_sent += size
+            return
+        with self._lock:
+            alias = self._aliases.get(key)
+            aliased = alias is not None
+            if alias is None and key in self.alias_keys and len(self._aliases) < self._alias_max:
+                alias = self._aliases[key] = len(self._aliases) + 1
+            properties = self.__properties(key, alias)
+            # the publish stays under the lock so the one declaring the alias is sent first
+            client.publish('' if aliased else topic, value, retain=retain, properties=properties)
+        self.published += 1
+        if aliased:
+            self.aliased += 1
+            self.bytes_saved += len(topic)
+            size -= len(topic)
+        if key in self.transient_keys:
+            self.expiring += 1
+        self.bytes_sent += size
+
+    def stats(self) -> dict:
+        return {
+            'protocol': 'v5' if self._v5 else 'v3.1.1',
+            'retained': self.retained,
+            'unchanged': self.unchanged,
+            'aliases': len(self._aliases),
+            'alias_max': self._alias_max,
+            'published': self.published,
+            'aliased': self.aliased,
+            'expiring': self.expiring,
+            'bytes_sent': self.bytes_sent,
+            'bytes_saved': self.bytes_saved,
+            'lanes': {name: {'sent': self.lane_sent[lane], 'coalesced': self.lane_coalesced[lane],
+                             'pending': len(self._pending[lane]), 'max_wait_ms': round(self.lane_max_wait[lane] * 1000, 1)}
+                      for lane, name in enumerate(self.LANES)},
+        }
+
+
+def clear_retained(broker: str, port: int, user: str | None, passwd: str | None, topics: list[str], wait: float = 1) -> int:
+    '''
+    remove the retained messages below each of topics from the broker, eg the feedback of a removed robot.
+    Blocking, returns the number of cleared topics.
+    '''
+    found: list[str] = []  # appended by the network thread
+    subscribed = threading.Event()
+
+    def on_connect(client: mqtt.Client, userdata, flags, reason_code, properties):
+        if reason_code == 0:
+            client.subscribe([(f"{topic}/#", 0) for topic in topics])
+        else:
+            subscribed.set()
+
+    def on_subscribe(client, userdata, mid, reason_codes, properties):
+        subscribed.set()
+
+    def on_message(client, userdata, message: mqtt.MQTTMessage):
+        if message.retain and message.payload:
+            found.append(message.topic)
+
+    client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, f"iRobot-clean-{uuid.uuid4().hex[:10]}")
+    client.on_connect = on_connect
+    client.on_subscribe = on_subscribe
+    client.on_message = on_message
+    if user and passwd:
+        client.username_pw_set(user, passwd)
+    client.connect(broker, port, 60)
+    client.loop_start()
+    try:
+        subscribed.wait(10)
+        time.sleep(wait)  # retained messages are sent right after the SUBACK
+        client.unsubscribe([f"{topic}/#" for topic in topics])
+        cleared = set(found)
+        infos = [client.publish(topic, b'', qos=1, retain=True) for topic in sorted(cleared)]
+        for info in infos:
+            info.wait_for_publish(5)
+    finally:
+        client.disconnect()
+        client.loop_stop()
+    return len(cleared)
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+from pathlib import Path
+
+
+def region_key(name: str) -> str:
+    return ' '.join(str(name).split()).casefold()
+
+
+class iRobotRegionCatalogue:
+    '''
+    Maps and regions of a robot, indexed by pmap_id, user_pmapv_id, region id and region name.
+
+    The list of maps and their current version come from the shadow ('pmaps'), region names
+    and zones only from the cloud maps. The catalogue is saved to <path>/<blid>.json so names
+    are known again at startup without the cloud.
+    '''
+
+    def __init__(self, blid: str, path: Path | None = None):
+        self._logger = logging.getLogger()
+        self._blid = blid
+        self._file = path/f"{blid}.json" if path else None
+        self._mtime = None
+        # pmap_id -> {'name': str, 'user_pmapv_id': str, 'regions': {region_id: {'name': str, 'type': 'rid' | 'zid'}}}
+        self._maps: dict[str, dict] = {}
+        self._order: list[str] = []  # pmap_ids in the order of the shadow, the first one is the default
+        self._by_version: dict[str, str] = {}
+        self._by_name: dict[str, list[tuple[str, str]]] = {}
+        self.load()
+
+    def __len__(self):
+        return len(self._maps)
+
+    def __reindex(self):
+        self._by_version = {pmap['user_pmapv_id']: pmap_id for pmap_id, pmap in self._maps.items() if pmap.get('user_pmapv_id')}
+        self._by_name = {}
+        for pmap_id in self._order + [pmap_id for pmap_id in self._maps if pmap_id not in self._order]:
+            for region_id, region in self._maps[pmap_id]['regions'].items():
+                if region.get('name'):
+                    self._by_name.setdefault(region_key(region['name']), []).append((pmap_id, region_id))
+
+    def __map(self, pmap_id: str) -> dict:
+        pmap = self._maps.get(pmap_id)
+        if pmap is None:
+            pmap = self._maps[pmap_id] = {'name': None, 'user_pmapv_id': None, 'regions': {}}
+        return pmap
+
+    def update_from_shadow(self, pmaps: list[dict] | None) -> bool:
+        '''
+        pmaps as reported by the robot: [{"<pmap_id>": "<user_pmapv_id>"}, ...], return True if something changed
+        '''
+        if not pmaps:
+            return False
+        order = []
+        changed = False
+        for item in pmaps:
+            for pmap_id, user_pmapv_id in item.items():
+                order.append(pmap_id)
+                pmap = self.__map(pmap_id)
+                if pmap['user_pmapv_id'] != user_pmapv_id:
+                    pmap['user_pmapv_id'] = user_pmapv_id
+                    changed = True
+        if order != self._order:
+            self._order = order
+            changed = True
+        if changed:
+            self.__reindex()
+        return changed
+
+    def update_from_cloud(self, maps: list[dict]) -> bool:
+        '''
+        maps as returned by the cloud pmaps API with activeDetails=2, return True if something changed
+        '''
+        changed = False
+        for cloud_map in maps:
+            pmap_id = cloud_map.get('pmap_id')
+            if not pmap_id:
+                continue
+            details = cloud_map.get('active_pmapv_details') or {}
+            regions = {}
+            for region in details.get('regions', []):
+                regions[str(region['id'])] = {'name': region.get('name') or region.get('region_type'), 'type': 'rid'}
+            for zone in details.get('zones', []):
+                regions[str(zone['id'])] = {'name': zone.get('name'), 'type': 'zid'}
+            pmap = self.__map(pmap_id)
+            name = cloud_map.get('visible_name') or cloud_map.get('name')
+            if pmap['regions'] != regions or pmap['name'] != name:
+                pmap['regions'] = regions
+                pmap['name'] = name
+                changed = True
+            # the shadow is more recent, the cloud version only fills a map not reported yet
+            if pmap['user_pmapv_id'] is None:
+                version = cloud_map.get('user_pmapv_id') or details.get('active_pmapv', {}).get('user_pmapv_id')
+                if version:
+                    pmap['user_pmapv_id'] = version
+                    changed = True
+        if changed:
+            self.__reindex()
+        return changed
+
+    def region_count(self) -> int:
+        return sum(len(pmap['regions']) for pmap in self._maps.values())
+
+    def default_map(self) -> str | None:
+        if self._order:
+            return self._order[0]
+        return next(iter(self._maps), None)
+
+    def user_pmapv_id(self, pmap_id: str) -> str | None:
+        pmap = self._maps.get(pmap_id)
+        return pmap['user_pmapv_id'] if pmap else None
+
+    def map_of_version(self, user_pmapv_id: str) -> str | None:
+        return self._by_version.get(user_pmapv_id)
+
+    def find_region(self, region: str, pmap_id: str | None = None) -> tuple[str | None, dict] | None:
+        '''
+        region id or name, in pmap_id if given; return the pmap_id of the region and its command entry
+        {'region_id': .., 'type': ..}, or None if the name is unknown or matches several other maps
+        '''
+        region = str(region).strip()
+        target = pmap_id if pmap_id is not None else self.default_map()
+        pmap = self._maps.get(target)
+        if pmap is not None and region in pmap['regions']:
+            return target, {'region_id': region, 'type': pmap['regions'][region]['type']}
+        matches = self._by_name.get(region_key(region), [])
+        if len(matches) > 1 or pmap_id is not None:
+            # a name used in several maps is taken from the requested map, else from the default one
+            matches = [match for match in matches if match[0] == target] or (matches if pmap_id is None else [])
+        if len({match[0] for match in matches}) == 1:
+            found_pmap_id, region_id = matches[0]
+            return found_pmap_id, {'region_id': region_id, 'type': self._maps[found_pmap_id]['regions'][region_id]['type']}
+        if len(matches) > 1:
+            self._logger.warning('Region %s of %s found in several maps, pmap_id needed', region, self._blid)
+        elif region.isdigit():
+            return pmap_id, {'region_id': region, 'type': 'rid'}
+        return None
+
+    def toJSON(self):
+        return {'order': self._order, 'maps': self._maps}
+
+    def load(self):
+        if self._file is None or not self._file.exists():
+            return
+        try:
+            mtime = self._file.stat().st_mtime
+            data = json.loads(self._file.read_text(encoding='utf-8'))
+            self._maps = data.get('maps', {})
+            self._order = data.get('order', [])
+            self._mtime = mtime
+            self.__reindex()
+        except (OSError, ValueError) as e:
+            self._logger.warning('Unable to read region catalogue of %s: %s', self._blid, e)
+
+    def reload_if_changed(self) -> bool:
+        '''
+        load the file again if it has been written by another process (cloud refresh done by the daemon)
+        '''
+        if self._file is None:
+            return False
+        try:
+            mtime = self._file.stat().st_mtime
+        except OSError:
+            return False
+        if mtime == self._mtime:
+            return False
+        self.load()
+        return True
+
+    def save(self):
+        if self._file is None:
+            return False
+        try:
+            self._file.parent.mkdir(parents=True, exist_ok=True)
+            tmp_file = self._file.with_suffix('.tmp')
+            tmp_file.write_text(json.dumps(self.toJSON(), indent=2), encoding='utf-8')
+            os.replace(tmp_file, self._file)
+            self._mtime = self._file.stat().st_mtime
+            return True
+        except OSError as e:
+            self._logger.warning('Unable to save region catalogue of %s: %s', self._blid, e)
+        return False
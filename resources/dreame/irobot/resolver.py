@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+from pathlib import Path
+
+from .configs import parse_blid
+from .const import BROADCAST_IP
+
+ARP_TABLE = Path('/proc/net/arp')
+DISCOVERY_PORT = 5678
+
+_LOGGER = logging.getLogger()
+
+
+def normalize_mac(mac: str) -> str:
+    return ':'.join(part.zfill(2) for part in mac.strip().lower().replace('-', ':').split(':'))
+
+
+def arp_lookup(mac: str, table: Path = ARP_TABLE) -> str | None:
+    '''
+    ip currently associated to mac in the kernel ARP table, None if unknown (or not on Linux)
+    '''
+    mac = normalize_mac(mac)
+    try:
+        lines = table.read_text(encoding='utf-8').splitlines()[1:]
+    except OSError:
+        return None
+    for line in lines:
+        # IP address, HW type, Flags, HW address, Mask, Device
+        fields = line.split()
+        if len(fields) >= 4 and fields[2] != '0x0' and normalize_mac(fields[3]) == mac:
+            return fields[0]
+    return None
+
+
+class _ProbeProtocol(asyncio.DatagramProtocol):
+    def __init__(self, blid: str, found: asyncio.Future):
+        self._blid = blid
+        self._found = found
+
+    def datagram_received(self, data: bytes, addr):
+        try:
+            payload = json.loads(data.decode())
+            if parse_blid(payload) == self._blid and not self._found.done():
+                self._found.set_result(addr[0])
+        except (ValueError, IndexError, AttributeError):
+            pass
+
+
+async def probe(blid: str, address: str = BROADCAST_IP, timeout: float = 3) -> str | None:
+    '''
+    send a discovery request to address (unicast or broadcast), return the ip of the robot blid if it answers
+    '''
+    loop = asyncio.get_running_loop()
+    found = loop.create_future()
+    transport, _ = await loop.create_datagram_endpoint(lambda: _ProbeProtocol(blid, found), local_addr=('0.0.0.0', 0),
+                                                       allow_broadcast=address == BROADCAST_IP)
+    try:
+        transport.sendto(b'irobotmcs', (address, DISCOVERY_PORT))
+        return await asyncio.wait_for(found, timeout)
+    except asyncio.TimeoutError:
+        return None
+    finally:
+        transport.close()
+
+
+async def resolve(blid: str, mac: str | None, current_ip: str | None = None) -> str | None:
+    '''
+    find the current ip of a robot which does not answer on its known address:
+    the ARP table entry of its MAC address (checked with a unicast probe) or else a broadcast probe
+    '''
+    if mac:
+        candidate = arp_lookup(mac)
+        if candidate and candidate != current_ip:
+            _LOGGER.debug('ARP table has %s for %s, probing it', candidate, mac)
+            if await probe(blid, candidate) is not None:
+                return candidate
+    return await probe(blid)
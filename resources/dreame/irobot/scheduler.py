@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Callable
+import heapq
+import itertools
+import logging
+import threading
+import time
+
+
+class VirtualClock:
+    '''
+    Manually advanced clock, for tests and replays
+    '''
+
+    def __init__(self, start: float = 0.0):
+        self.now = start
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+
+class iRobotTimer:
+    '''
+    Named timer registered in an iRobotScheduler, re-arming it never allocates a new timer
+    '''
+
+    __slots__ = ('owner', 'name', 'callback', 'deadline', 'queued', 'armed', 'fired', '_scheduler')
+
+    def __init__(self, scheduler: iRobotScheduler, owner: str, name: str, callback: Callable[[], None] | None):
+        self._scheduler = scheduler
+        self.owner = owner
+        self.name = name
+        self.callback = callback
+        self.deadline = 0.0
+        self.queued = None  # deadline of this timer's entry in the heap, None if not in the heap
+        self.armed = False
+        self.fired = 0
+
+    def arm(self, delay: float):
+        self._scheduler.arm(self, delay)
+
+    def cancel(self):
+        self._scheduler.cancel(self)
+
+    def remaining(self) -> float:
+        return self._scheduler.remaining(self)
+
+    @property
+    def pending(self):
+        return self.armed and self.remaining() > 0
+
+
+class iRobotScheduler:
+    '''
+    One heap of named timers shared by all robots of the daemon.
+
+    A timer re-armed later than its queued deadline keeps its heap entry, the entry is moved
+    when it pops; only re-arming earlier pushes a new entry. Callbacks are run by run() in the
+    event loop, arm() and cancel() can be called from any thread.
+    '''
+
+    def __init__(self, clock: Callable[[], float] | None = None):
+        self._logger = logging.getLogger()
+        self._clock = clock if clock is not None else time.monotonic
+        self._heap: list[tuple[float, int, iRobotTimer]] = []
+        self._timers: dict[tuple[str, str], iRobotTimer] = {}
+        self._counter = itertools.count()
+        self._lock = threading.RLock()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._wakeup: asyncio.Event | None = None
+
+    def now(self) -> float:
+        return self._clock()
+
+    def register(self, owner: str, name: str, callback: Callable[[], None] | None = None) -> iRobotTimer:
+        '''
+        return the timer named name of owner, created on first call
+        '''
+        with self._lock:
+            timer = self._timers.get((owner, name))
+            if timer is None:
+                timer = self._timers[(owner, name)] = iRobotTimer(self, owner, name, callback)
+            elif callback is not None:
+                timer.callback = callback
+            return timer
+
+    def unregister(self, owner: str):
+        '''
+        cancel and forget all timers of owner
+        '''
+        with self._lock:
+            for key in [key for key in self._timers if key[0] == owner]:
+                self._timers.pop(key).armed = False
+
+    def arm(self, timer: iRobotTimer, delay: float):
+        with self._lock:
+            timer.deadline = self._clock() + delay
+            timer.armed = True
+            if timer.queued is not None and timer.queued <= timer.deadline:
+                return
+            timer.queued = timer.deadline
+            earliest = self._heap[0][0] if self._heap else None
+            heapq.heappush(self._heap, (timer.deadline, next(self._counter), timer))
+        if earliest is None or timer.deadline < earliest:
+            self.__wakeup()
+
+    def cancel(self, timer: iRobotTimer):
+        with self._lock:
+            timer.armed = False
+
+    def remaining(self, timer: iRobotTimer) -> float:
+        if not timer.armed:
+            return 0
+        return max(0.0, timer.deadline - self._clock())
+
+    def run_due(self) -> float | None:
+        '''
+        fire the callbacks of expired timers, return the delay until the next deadline
+        '''
+        due = []
+        with self._lock:
+            now = self._clock()
+            while self._heap and self._heap[0][0] <= now:
+                deadline, _, timer = heapq.heappop(self._heap)
+                if timer.queued != deadline:
+                    continue  # stale entry, the timer has been pushed again earlier
+                timer.queued = None
+                if not timer.armed:
+                    continue
+                if timer.deadline > now:
+                    # re-armed later, move the entry
+                    timer.queued = timer.deadline
+                    heapq.heappush(self._heap, (timer.deadline, next(self._counter), timer))
+                    continue
+                timer.armed = False
+                timer.fired += 1
+                due.append(timer)
+            next_delay = max(0.0, self._heap[0][0] - now) if self._heap else None
+
+        for timer in due:
+            if timer.callback is None:
+                continue
+            try:
+                timer.callback()
+            except Exception as e:
+                self._logger.exception('Error in timer %s of %s: %s', timer.name, timer.owner, e)
+        return next_delay
+
+    def __wakeup(self):
+        if self._loop is not None and self._wakeup is not None:
+            try:
+                self._loop.call_soon_threadsafe(self._wakeup.set)
+            except RuntimeError:
+                pass  # loop closed
+
+    async def run(self):
+        '''
+        fire timers until cancelled, to be run as a task of the daemon loop
+        '''
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        while True:
+            try:
+                self._wakeup.clear()
+                delay = self.run_due()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                self._logger.exception(e)
+
+    def dump(self) -> list[dict]:
+        '''
+        state of all registered timers
+        '''
+        with self._lock:
+            return [{
+                'owner': timer.owner,
+                'name': timer.name,
+                'armed': timer.armed,
+                'remaining': round(self.remaining(timer), 3),
+                'fired': timer.fired
+            } for timer in self._timers.values()]
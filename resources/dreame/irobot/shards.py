@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Callable
+import logging
+import multiprocessing
+from multiprocessing.connection import Connection
+from pathlib import Path
+import threading
+import time
+import zlib
+
+from .batch import batch_command, bulk_get
+from .configs import iRobotConfig, iRobotConfigs
+from .executors import default_executors
+from .fleet import iRobotFleet
+from .irobot import iRobot
+from .logs import setup_queue_logging
+from .loopmonitor import iRobotLoopMonitor
+from .missions import iRobotMissionLog
+from .scheduler import iRobotScheduler
+from .topicfilter import iRobotTopicFilters
+
+
+def shard_of(blid: str, count: int) -> int:
+    '''
+    stable assignment of a robot to one of count workers
+    '''
+    return zlib.crc32(blid.encode('utf-8')) % count
+
+
+class iRobotShardChannel:
+    '''
+    Thread safe wrapper around one end of the supervisor <-> worker pipe
+    '''
+
+    def __init__(self, conn: Connection):
+        self._conn = conn
+        self._lock = threading.Lock()
+
+    def send(self, message: dict):
+        with self._lock:
+            self._conn.send(message)
+
+
+class iRobotMissionRelay:
+    '''
+    Mission log of a worker: summaries are forwarded to the supervisor which owns the real log
+    '''
+
+    def __init__(self, channel: iRobotShardChannel):
+        self._channel = channel
+
+    def append(self, mission: dict):
+        self._channel.send({'mission': mission})
+
+
+class iRobotShardWorker:
+    '''
+    Robots of one shard, running in a worker process with its own event loop and broker connections
+    '''
+
+    def __init__(self, index: int, count: int, settings: dict, conn: Connection):
+        self._logger = logging.getLogger()
+        self._index = index
+        self._count = count
+        self._settings = settings
+        self._conn = conn
+        self._channel = iRobotShardChannel(conn)
+        self._scheduler = iRobotScheduler()
+        self._loop_monitor = iRobotLoopMonitor()
+        self._fleet = iRobotFleet(self.__create_robot, on_robot_online=lambda blid: self._channel.send({'online': blid}))
+
+    def __create_robot(self, robot_config, topic_filter) -> iRobot:
+        new_robot = iRobot(robot_config, data_path=Path(self._settings['data_path']),
+                           mission_log=iRobotMissionRelay(self._channel), scheduler=self._scheduler,
+                           topic_filter=topic_filter, on_config_change=self.__config_changed)
+        new_robot.setup_mqtt_client(
+            self._settings['mqtt_host'],
+            self._settings['mqtt_port'],
+            self._settings['mqtt_user'],
+            self._settings['mqtt_password'],
+            brokerFeedback=self._settings['topic_prefix']+'/feedback',
+            brokerCommand=self._settings['topic_prefix']+'/command',
+            brokerSetting=self._settings['topic_prefix']+'/setting',
+            mqtt5=self._settings['mqtt5'],
+            retain=self._settings['retain']
+        )
+        new_robot.update_seconds = self._settings['refresh']
+        new_robot.watchdog.deadline = self._settings['stale_deadline']
+        new_robot.dedup.window = self._settings['duplicate_window']
+        return new_robot
+
+    def __config_changed(self, config: iRobotConfig):
+        '''
+        the supervisor is the only process writing the configuration file
+        '''
+        self._channel.send({'config': config.blid, 'changes': {'ip': config.ip, 'mac': config.mac}})
+
+    async def __reconcile_robots(self):
+        robot_configs = iRobotConfigs(path=Path(self._settings['data_path']))
+        configs = {blid: config for blid, config in robot_configs.robots.items() if shard_of(blid, self._count) == self._index}
+        await self._fleet.reconcile(configs, iRobotTopicFilters(Path(self._settings['data_path'])), self._settings['excluded_blid'])
+        self._logger.info('Worker %i handles %i robot(s)', self._index, len(self._fleet))
+
+    async def __batch(self, message: dict):
+        robots = self._fleet.robots
+        blids = [blid for blid in message.get('blids') or [] if shard_of(blid, self._count) == self._index] or None
+        if message.get('blids') and blids is None:
+            results = {}  # none of the requested robots belongs to this shard
+        elif message['action'] == 'command':
+            results = await batch_command(robots, blids, message['command'])
+        else:
+            results = bulk_get(robots, blids, message.get('properties', []))
+        self._channel.send({'response': message['request'], 'results': results})
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        inbox: asyncio.Queue[dict] = asyncio.Queue()
+
+        def on_readable():
+            try:
+                inbox.put_nowait(self._conn.recv())
+            except (EOFError, OSError):
+                # supervisor is gone
+                loop.remove_reader(self._conn.fileno())
+                inbox.put_nowait({'action': 'stop'})
+
+        loop.add_reader(self._conn.fileno(), on_readable)
+        self._loop_monitor.start()
+        scheduler_task = loop.create_task(self._scheduler.run())
+        connect_task = loop.create_task(self.__reconcile_robots())
+
+        while True:
+            message = await inbox.get()
+            action = message.get('action')
+            if action == 'ping':
+                self._channel.send({'pong': self._index, 'robots': len(self._fleet), 'time': message.get('time'),
+                                    'executors': default_executors().stats(), 'loop': self._loop_monitor.stats(),
+                                    'robot_stats': self._fleet.stats()})
+            elif action == 'reload':
+                await asyncio.gather(connect_task, return_exceptions=True)
+                connect_task = loop.create_task(self.__reconcile_robots())
+            elif action in ['command', 'get']:
+                loop.create_task(self.__batch(message))
+            elif action == 'resync':
+                for robot in self._fleet.robots.values():
+                    if not message.get('blids') or robot.blid in message['blids']:
+                        loop.create_task(robot.resync())
+            elif action == 'stop':
+                break
+
+        connect_task.cancel()
+        await self._fleet.stop()
+        scheduler_task.cancel()
+        self._loop_monitor.stop()
+        default_executors().shutdown(wait=False)
+
+
+def run_worker(index: int, count: int, settings: dict, conn: Connection):
+    '''
+    entry point of a worker process
+    '''
+    logging.basicConfig(level=settings['log_level'],
+                        format=f"[%(asctime)s][%(levelname)s] : [worker {index}] %(message)s",
+                        datefmt="%Y-%m-%d %H:%M:%S")
+    setup_queue_logging()
+    try:
+        asyncio.run(iRobotShardWorker(index, count, settings, conn).run())
+    except KeyboardInterrupt:
+        pass
+
+
+class iRobotShardSupervisor:
+    '''
+    Start and watch the worker processes, restart the ones which crashed or stopped answering
+    '''
+
+    HEALTH_CHECK_INTERVAL = 10  # s
+    HEALTH_CHECK_TIMEOUT = 30  # s without answer before a worker is restarted
+    STOP_TIMEOUT = 5  # s
+
+    def __init__(self, count: int, settings: dict, mission_log: iRobotMissionLog, on_robot_online: Callable[[str], None] | None = None,
+                 on_config_change: Callable[[str, dict], None] | None = None):
+        '''
+        on_config_change is called from an executor thread with the blid and the new ip and mac of a robot
+        '''
+        self._logger = logging.getLogger()
+        self._count = count
+        self._settings = settings
+        self._mission_log = mission_log
+        self._on_robot_online = on_robot_online
+        self._on_config_change = on_config_change
+        self._requests: dict[int, tuple[asyncio.Future, dict, int]] = {}
+        self._request_id = 0
+        self._context = multiprocessing.get_context('spawn')
+        self._workers: list[dict] = [{'process': None, 'conn': None, 'last_seen': 0.0, 'restarts': 0, 'robots': 0, 'executors': None, 'loop': None, 'robot_stats': {}} for _ in range(count)]
+        self._task: asyncio.Task | None = None
+
+    def __start_worker(self, index: int):
+        loop = asyncio.get_running_loop()
+        worker = self._workers[index]
+        parent_conn, child_conn = self._context.Pipe()
+        process = self._context.Process(target=run_worker, args=(index, self._count, self._settings, child_conn),
+                                        name=f"dreame-worker-{index}", daemon=True)
+        process.start()
+        child_conn.close()
+        worker['process'] = process
+        worker['conn'] = parent_conn
+        worker['last_seen'] = time.monotonic()
+        worker['robot_stats'] = {}
+        loop.add_reader(parent_conn.fileno(), self.__on_worker_message, index)
+        self._logger.info('Worker %i started with pid %s', index, process.pid)
+
+    def __remove_reader(self, index: int):
+        conn = self._workers[index]['conn']
+        if conn is not None:
+            asyncio.get_running_loop().remove_reader(conn.fileno())
+
+    def __stop_worker(self, index: int):
+        '''
+        blocking, run in executor after __remove_reader()
+        '''
+        worker = self._workers[index]
+        if worker['conn'] is not None:
+            try:
+                worker['conn'].send({'action': 'stop'})
+            except (OSError, ValueError):
+                pass
+        if worker['process'] is not None:
+            worker['process'].join(self.STOP_TIMEOUT)
+            if worker['process'].is_alive():
+                self._logger.warning('Worker %i did not stop, killing it', index)
+                worker['process'].kill()
+                worker['process'].join()
+        if worker['conn'] is not None:
+            worker['conn'].close()
+        worker['process'] = None
+        worker['conn'] = None
+
+    def __on_worker_message(self, index: int):
+        worker = self._workers[index]
+        try:
+            message = worker['conn'].recv()
+        except (EOFError, OSError):
+            asyncio.get_running_loop().remove_reader(worker['conn'].fileno())
+            return
+        worker['last_seen'] = time.monotonic()
+        if 'mission' in message:
+            asyncio.get_running_loop().run_in_executor(default_executors().decode, self._mission_log.append, message['mission'])
+        elif 'config' in message:
+            if self._on_config_change is not None:
+                asyncio.get_running_loop().run_in_executor(default_executors().connect, self._on_config_change, message['config'], message['changes'])
+        elif 'online' in message:
+            if self._on_robot_online is not None:
+                self._on_robot_online(message['online'])
+        elif 'response' in message:
+            self.__on_response(message['response'], message['results'])
+        elif 'pong' in message:
+            worker['robots'] = message.get('robots', 0)
+            worker['executors'] = message.get('executors')
+            worker['loop'] = message.get('loop')
+            worker['robot_stats'] = message.get('robot_stats') or {}
+
+    def __on_response(self, request_id: int, results: dict):
+        pending = self._requests.get(request_id)
+        if pending is None:
+            return  # request timed out
+        future, merged, expected = pending
+        merged.update(results)
+        expected -= 1
+        self._requests[request_id] = (future, merged, expected)
+        if expected <= 0 and not future.done():
+            future.set_result(merged)
+
+    async def request(self, message: dict, timeout: float = 10) -> dict:
+        '''
+        forward a batch request to every worker and merge their per robot results
+        '''
+        self._request_id += 1
+        request_id = self._request_id
+        future = asyncio.get_running_loop().create_future()
+        self._requests[request_id] = (future, {}, self._count)
+        for index in range(self._count):
+            self.__send(index, {**message, 'request': request_id})
+        try:
+            results = await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            self._logger.warning('Timeout waiting for workers answer to %s', message.get('action'))
+            results = self._requests[request_id][1]
+        finally:
+            self._requests.pop(request_id, None)
+        # robots of a dead or late worker are reported as batch_command() and bulk_get() do for unknown ones
+        missing = 'unknown' if message['action'] == 'command' else None
+        for blid in message.get('blids') or []:
+            results.setdefault(blid, missing)
+        return results
+
+    def __send(self, index: int, message: dict):
+        conn = self._workers[index]['conn']
+        if conn is not None:
+            try:
+                conn.send(message)
+            except (OSError, ValueError) as e:
+                self._logger.warning('Unable to send message to worker %i: %s', index, e)
+
+    async def __health_check(self):
+        while True:
+            try:
+                await asyncio.sleep(self.HEALTH_CHECK_INTERVAL)
+                for index, worker in enumerate(self._workers):
+                    process = worker['process']
+                    if process is None or not process.is_alive():
+                        self._logger.error('Worker %i died (exit code %s), restarting it', index, process.exitcode if process else None)
+                    elif time.monotonic() - worker['last_seen'] > self.HEALTH_CHECK_TIMEOUT:
+                        self._logger.error('Worker %i does not answer, restarting it', index)
+                    else:
+                        self.__send(index, {'action': 'ping', 'time': time.time()})
+                        continue
+                    self.__remove_reader(index)
+                    await asyncio.get_running_loop().run_in_executor(default_executors().connect, self.__stop_worker, index)
+                    worker['restarts'] += 1
+                    self.__start_worker(index)
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                self._logger.exception(e)
+
+    async def start(self):
+        for index in range(self._count):
+            self.__start_worker(index)
+        self._task = asyncio.create_task(self.__health_check())
+
+    def reload(self):
+        '''
+        ask all workers to reconnect their robots, eg after a discovery
+        '''
+        for index in range(self._count):
+            self.__send(index, {'action': 'reload'})
+
+    def resync(self, blids: list[str] | None = None):
+        '''
+        ask the workers to publish all values of their robots again
+        '''
+        for index in range(self._count):
+            self.__send(index, {'action': 'resync', 'blids': blids})
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+        for index in range(self._count):
+            self.__remove_reader(index)
+        await asyncio.gather(*[asyncio.get_running_loop().run_in_executor(default_executors().connect, self.__stop_worker, index) for index in range(self._count)])
+
+    def robot_stats(self) -> dict[str, dict[str, dict]]:
+        '''
+        per robot stats of all workers, by section as iRobotFleet.stats()
+        '''
+        merged: dict[str, dict[str, dict]] = {}
+        for worker in self._workers:
+            for section, robots in worker['robot_stats'].items():
+                merged.setdefault(section, {}).update(robots)
+        return merged
+
+    def stats(self) -> list[dict]:
+        return [{
+            'worker': index,
+            'pid': worker['process'].pid if worker['process'] else None,
+            'alive': worker['process'].is_alive() if worker['process'] else False,
+            'robots': worker['robots'],
+            'restarts': worker['restarts'],
+            'executors': worker['executors'],
+            'loop': worker['loop']
+        } for index, worker in enumerate(self._workers)]
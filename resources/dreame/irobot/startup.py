@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from __future__ import annotations
+
+import datetime
+import json
+import logging
+import os
+from pathlib import Path
+import time
+
+_IMPORTED = time.perf_counter()
+
+
+def process_start() -> float:
+    '''
+    time.perf_counter() value at the start of the process, so interpreter start and imports are measured too
+    '''
+    try:
+        with open('/proc/self/stat', encoding='ascii') as file:
+            # fields after the command name, starttime (22nd field) is in clock ticks since boot
+            fields = file.read().rsplit(')', 1)[1].split()
+        started = int(fields[19]) / os.sysconf('SC_CLK_TCK')
+        with open('/proc/uptime', encoding='ascii') as file:
+            uptime = float(file.read().split()[0])
+        return time.perf_counter() - max(0.0, uptime - started)
+    except (OSError, ValueError, IndexError):
+        return _IMPORTED
+
+
+class iRobotStartupReport:
+    '''
+    Durations of the daemon start phases, measured from the given start (a time.perf_counter() value)
+    '''
+
+    def __init__(self, start: float):
+        self._logger = logging.getLogger()
+        self._start = start
+        self._started_at = datetime.datetime.now().isoformat(timespec='seconds')
+        self._steps: dict[str, float] = {}
+
+    def mark(self, step: str):
+        '''
+        record the time elapsed until step, only the first mark of a step is kept
+        '''
+        if step not in self._steps:
+            self._steps[step] = round(time.perf_counter() - self._start, 3)
+
+    def __contains__(self, step: str):
+        return step in self._steps
+
+    def toJSON(self):
+        return {'started_at': self._started_at, **self._steps}
+
+    def write(self, file: Path):
+        self._logger.info('Startup times: %s', ', '.join(f"{step}={duration}s" for step, duration in self._steps.items()))
+        try:
+            file.write_text(json.dumps(self.toJSON(), indent=2), encoding='utf-8')
+        except OSError as e:
+            self._logger.warning('Unable to write startup report: %s', e)
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from __future__ import annotations
+
+import json
+import sys
+
+# strings up to this length are interned: keys, sku, firmware, phase names...
+INTERN_MAX_LEN = 64
+
+# large, rarely read and opaque list values, kept serialized until accessed; dicts are not wrapped
+# so their keys stay visible to the lookups and the flattened feedback
+LAZY_KEYS = frozenset(['pmaps', 'cleanSchedule2'])
+
+
+class iRobotLazyValue:
+    '''
+    JSON value kept in its serialized form, decoded on each access of value
+    '''
+
+    __slots__ = ('_data',)
+
+    def __init__(self, data: bytes):
+        self._data = data
+
+    @classmethod
+    def wrap(cls, value) -> iRobotLazyValue:
+        return cls(json.dumps(value, separators=(',', ':')).encode('utf-8'))
+
+    @property
+    def value(self):
+        return json.loads(self._data)
+
+    def __eq__(self, other):
+        return isinstance(other, iRobotLazyValue) and self._data == other._data
+
+    def __hash__(self):
+        return hash(self._data)
+
+    def __repr__(self):
+        return f"iRobotLazyValue({len(self._data)} bytes)"
+
+
+def unwrap(value):
+    if isinstance(value, iRobotLazyValue):
+        return value.value
+    return value
+
+
+def compact_object(pairs: list[tuple[str, object]]) -> dict:
+    '''
+    json object_pairs_hook: keys and short strings are interned so all robots share them,
+    values of LAZY_KEYS stay serialized
+    '''
+    result = {}
+    for key, value in pairs:
+        key = sys.intern(key)
+        if isinstance(value, str):
+            if len(value) <= INTERN_MAX_LEN:
+                value = sys.intern(value)
+        elif key in LAZY_KEYS and isinstance(value, list):
+            value = iRobotLazyValue.wrap(value)
+        result[key] = value
+    return result
+
+
+class iRobotStatus:
+    '''
+    View of the most read shadow fields: it keeps the master_state dicts holding them, located from
+    the changes of each message, so the hot properties neither search master_state nor copy its values
+    '''
+
+    # dicts of master_state holding the fields, by their key
+    __slots__ = ('cleanMissionStatus', 'reported', 'bin', 'hwPartsRev')
+
+    # dict and key of each field, the first one set is used
+    FIELDS = {
+        'cycle': (('cleanMissionStatus', 'cycle'),),
+        'phase': (('cleanMissionStatus', 'phase'),),
+        'error': (('cleanMissionStatus', 'error'),),
+        'sqft': (('cleanMissionStatus', 'sqft'),),
+        'mssnM': (('cleanMissionStatus', 'mssnM'),),
+        'mssnStrtTm': (('cleanMissionStatus', 'mssnStrtTm'),),
+        'rechrgM': (('cleanMissionStatus', 'rechrgM'),),
+        'batPct': (('reported', 'batPct'),),
+        'bin_full': (('bin', 'full'),),
+        'bin_present': (('bin', 'present'),),
+        'sku': (('reported', 'sku'),),
+        'mac': (('reported', 'mac'), ('hwPartsRev', 'wlan0HwAddr')),
+    }
+
+    def __init__(self):
+        for name in self.__slots__:
+            setattr(self, name, None)
+
+    def __getattr__(self, field):
+        sources = self.FIELDS.get(field)
+        if sources is None:
+            raise AttributeError(field)
+        for name, key in sources:
+            values = getattr(self, name)
+            if values is not None and values.get(key) is not None:
+                return values[key]
+        return None
+
+    def update(self, changes: list[tuple[tuple[str, ...], object]]):
+        '''
+        changes as collected by iRobot.dict_merge(), only a new or replaced sub dict can move a field
+        '''
+        for path, value in changes:
+            if not path:
+                continue
+            if path[-1] in self.__slots__:
+                setattr(self, path[-1], value if isinstance(value, dict) else None)
+            if not isinstance(value, dict):
+                continue
+            pending = [value]
+            while pending:
+                for key, sub_value in pending.pop().items():
+                    if isinstance(sub_value, dict):
+                        if key in self.__slots__:
+                            setattr(self, key, sub_value)
+                        pending.append(sub_value)
+
+
+def deep_sizeof(obj, seen: set[int] | None = None) -> int:
+    '''
+    approximate memory used by obj and everything it references, objects in seen are not counted again
+    '''
+    if seen is None:
+        seen = set()
+    size = 0
+    pending = [obj]
+    while pending:
+        obj = pending.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        size += sys.getsizeof(obj)
+        if isinstance(obj, dict):
+            pending.extend(obj.keys())
+            pending.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            pending.extend(obj)
+        elif isinstance(obj, iRobotLazyValue):
+            pending.append(obj._data)
+    return size
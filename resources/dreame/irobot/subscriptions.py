@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from __future__ import annotations
+
+import asyncio
+import copy
+import logging
+
+from .state import unwrap
+
+
+def compile_pattern(pattern: str) -> tuple[str, ...]:
+    '''
+    split a dotted path pattern, '*' (or '+' as in MQTT) matches one level, a trailing '#' matches any number of levels
+    '''
+    return tuple(pattern.split('.'))
+
+
+def match_pattern(pattern: tuple[str, ...], path: tuple[str, ...]) -> bool:
+    for i, segment in enumerate(pattern):
+        if segment == '#':
+            return True
+        if i >= len(path):
+            return False
+        if segment not in ('*', '+') and segment != path[i]:
+            return False
+    return len(pattern) == len(path)
+
+
+def changed_keys(changes: list[tuple[tuple[str, ...], object]]) -> set[str]:
+    '''
+    all keys along the changed paths, including the keys of changed sub dicts
+    '''
+    keys = set()
+    pending = []
+    for path, value in changes:
+        keys.update(path)
+        if isinstance(value, dict):
+            pending.append(value)
+    while pending:
+        value = pending.pop()
+        keys.update(value.keys())
+        pending.extend(v for v in value.values() if isinstance(v, dict))
+    return keys
+
+
+def leaf_changes(changes: list[tuple[tuple[str, ...], object]]) -> list[tuple[tuple[str, ...], object]]:
+    '''
+    changes with each new sub dict expanded into its leaves, lazy values decoded
+    '''
+    result = []
+
+    def expand(path: tuple[str, ...], value):
+        value = unwrap(value)
+        if isinstance(value, dict) and value:
+            for key, sub_value in value.items():
+                expand(path + (key,), sub_value)
+        else:
+            result.append((path, value))
+
+    for path, value in changes:
+        expand(path, value)
+    return result
+
+
+class iRobotStateSubscription:
+    '''
+    Queue of state changes matching some path patterns.
+
+    Each item is the list of (path, value) changed by one robot message, path being the
+    dotted path in master_state of a leaf and value a copy of it. When the consumer does not
+    keep up the oldest item is dropped.
+    '''
+
+    def __init__(self, owner: iRobotStateSubscriptions, patterns: list[str], maxsize: int):
+        self._owner = owner
+        self._patterns = [compile_pattern(pattern) for pattern in patterns]
+        self._queue: asyncio.Queue[list[tuple[str, object]]] = asyncio.Queue(maxsize)
+        self.dropped = 0
+        self.delivered = 0
+
+    @property
+    def patterns(self):
+        return ['.'.join(pattern) for pattern in self._patterns]
+
+    def _offer(self, changes: list[tuple[tuple[str, ...], object]]):
+        matching = [('.'.join(path), copy.deepcopy(value)) for path, value in changes
+                    if any(match_pattern(pattern, path) for pattern in self._patterns)]
+        if not matching:
+            return
+        if self._queue.full():
+            self._queue.get_nowait()
+            self.dropped += 1
+        self._queue.put_nowait(matching)
+        self.delivered += 1
+
+    async def get(self) -> list[tuple[str, object]]:
+        return await self._queue.get()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self._queue.get()
+
+    def close(self):
+        self._owner.unsubscribe(self)
+
+
+class iRobotStateSubscriptions:
+    '''
+    Subscribers to the changes of one robot state, notify() must be called from the event loop
+    '''
+
+    def __init__(self):
+        self._logger = logging.getLogger()
+        self._subscriptions: list[iRobotStateSubscription] = []
+
+    def __len__(self):
+        return len(self._subscriptions)
+
+    def subscribe(self, patterns: str | list[str], maxsize: int = 100) -> iRobotStateSubscription:
+        if isinstance(patterns, str):
+            patterns = [patterns]
+        subscription = iRobotStateSubscription(self, patterns, maxsize)
+        self._subscriptions.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: iRobotStateSubscription):
+        if subscription in self._subscriptions:
+            self._subscriptions.remove(subscription)
+
+    def notify(self, changes: list[tuple[tuple[str, ...], object]]):
+        '''
+        changes as reported by dict_merge, a new sub dict being one change
+        '''
+        changes = leaf_changes(changes)
+        for subscription in self._subscriptions:
+            try:
+                subscription._offer(changes)
+            except Exception as e:
+                self._logger.exception(e)
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from __future__ import annotations
+
+import json
+import logging
+from pathlib import Path
+
+import paho.mqtt.client as mqtt
+
+from .configs import iRobotConfig
+
+
+class iRobotTopicFilter:
+    '''
+    Topics received from a robot: include patterns (MQTT wildcards) are the subscriptions,
+    exclude patterns are checked on each message before it is handed over to the event loop.
+    Messages of topics matching a repeats pattern are processed even if identical to a recent one.
+    '''
+
+    DEFAULT_SUBSCRIPTIONS = ['#', '$SYS/#']
+
+    def __init__(self, include: list[str] | None = None, exclude: list[str] | None = None, repeats: list[str] | None = None):
+        self.include = list(include or [])
+        self.exclude = list(exclude or [])
+        self.repeats = list(repeats or [])
+        self._accepted: dict[str, bool] = {}
+        self.received: dict[str, int] = {}
+        self.dropped: dict[str, int] = {}
+
+    def subscriptions(self) -> list[str]:
+        if self.include:
+            return self.include
+        return [topic for topic in self.DEFAULT_SUBSCRIPTIONS if topic not in self.exclude]
+
+    def accept(self, topic: str) -> bool:
+        '''
+        called from the MQTT network thread for each message
+        '''
+        accepted = self._accepted.get(topic)
+        if accepted is None:
+            accepted = self._accepted[topic] = not any(mqtt.topic_matches_sub(pattern, topic) for pattern in self.exclude)
+        if accepted:
+            self.received[topic] = self.received.get(topic, 0) + 1
+        else:
+            self.dropped[topic] = self.dropped.get(topic, 0) + 1
+        return accepted
+
+    def stats(self) -> dict:
+        return {topic: {'received': self.received.get(topic, 0), 'dropped': self.dropped.get(topic, 0)}
+                for topic in sorted(self.received.keys() | self.dropped.keys())}
+
+
+class iRobotTopicFilters:
+    '''
+    Topic filters read from topic_filters.json, eg:
+    {
+        "models": {"R98": {"exclude": ["wifistat"]}},
+        "robots": {"<blid>": {"include": ["$aws/things/<blid>/shadow/#"], "repeats": ["wifistat"]}}
+    }
+    models are matched on the start of the robot sku, the longest match is used.
+    A robot include list replaces the model one, exclude and repeats lists are added.
+    '''
+
+    def __init__(self, path: Path):
+        self._logger = logging.getLogger()
+        self._models: dict[str, dict] = {}
+        self._robots: dict[str, dict] = {}
+        file = path/'topic_filters.json'
+        if file.exists():
+            try:
+                filters = json.loads(file.read_text(encoding='utf-8'))
+                self._models = filters.get('models', {})
+                self._robots = filters.get('robots', {})
+            except (OSError, ValueError) as e:
+                self._logger.error('Unable to read %s: %s', file, e)
+
+    def for_robot(self, config: iRobotConfig) -> iRobotTopicFilter:
+        include, exclude, repeats = [], [], []
+        sku = config.sku or ''
+        models = sorted((model for model in self._models if sku.lower().startswith(model.lower())), key=len)
+        if models:
+            include = self._models[models[-1]].get('include', [])
+            exclude = list(self._models[models[-1]].get('exclude', []))
+            repeats = list(self._models[models[-1]].get('repeats', []))
+        robot = self._robots.get(config.blid, {})
+        include = robot.get('include', include)
+        exclude += robot.get('exclude', [])
+        repeats += robot.get('repeats', [])
+        if include or exclude or repeats:
+            self._logger.info('Topic filter of %s: include %s, exclude %s, repeats %s', config.name, include, exclude, repeats)
+        return iRobotTopicFilter(include, exclude, repeats)
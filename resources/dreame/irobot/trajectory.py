@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from __future__ import annotations
+
+from array import array
+import logging
+import math
+from pathlib import Path
+import struct
+import time
+import zlib
+
+TRAJECTORY_MAGIC = b'DTRJ'
+TRAJECTORY_VERSION = 1
+# magic, version, start time (epoch seconds), number of points
+TRAJECTORY_HEADER = struct.Struct('<4sBqI')
+
+
+def distance_between(x1, y1, x2, y2):
+    '''
+    euclidean distance between two co-ordinates
+    '''
+    return math.hypot(x2 - x1, y2 - y1)
+
+
+def pose_to_point(pose):
+    '''
+    return (x, y) from a pose report, supports both {"point": {"x": .., "y": ..}, "theta": ..}
+    and flat {"x": .., "y": ..} formats, None if the pose is not usable
+    '''
+    if not isinstance(pose, dict):
+        return None
+    point = pose.get('point', pose)
+    try:
+        return int(point['x']), int(point['y'])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+class iRobotTrajectory:
+    '''
+    Record of the robot position during a mission.
+
+    Points are kept in typed arrays (x, y in cm, t in seconds since mission start),
+    bogus reports are rejected with a distance/velocity filter and runs of collinear
+    points are collapsed into their end points. new_segment tells if the last point kept
+    does not continue from the previous one (first point, re-anchor, after a bogus phase).
+    Finished trajectories are saved delta encoded and compressed under the given path.
+    '''
+
+    MAX_JUMP = 150  # cm, a larger change between two reports is considered bogus
+    MAX_SPEED = 60  # cm/s, robots never move faster than this
+    UNDOCK_DELAY = 10  # s, co-ordinates are wrong during undocking
+    REANCHOR_COUNT = 5  # consistent rejected reports needed to accept a new position
+    COLLINEAR_TOLERANCE = 2  # cm, max deviation of a dropped point from the simplified line
+    MAX_COLLAPSED = 64  # points a segment may replace, each one is checked against it
+    MAX_COORDINATE = 0x7FFF  # cm, points are kept in 16 bits, a larger value is bogus
+    BOGUS_PHASES = ('hmPostMsn', 'hmMidMsn', 'hmUsrDock')
+
+    def __init__(self, blid: str, path: Path | None = None):
+        self._logger = logging.getLogger()
+        self._blid = blid
+        self._path = path
+        self._active = False
+        self._start = 0.0
+        self._xs = array('h')
+        self._ys = array('h')
+        self._ts = array('H')
+        self._collapsed: list[tuple[int, int]] = []
+        self._rejected = None
+        self._rejected_count = 0
+        self._gap = False
+        self.new_segment = False
+        self.accepted = 0
+        self.dropped = 0
+
+    @property
+    def active(self):
+        return self._active
+
+    @property
+    def start_time(self):
+        return self._start
+
+    def __len__(self):
+        return len(self._xs)
+
+    def points(self):
+        '''
+        return the list of (x, y) kept so far
+        '''
+        return list(zip(self._xs, self._ys))
+
+    def start(self, start_time: float | None = None):
+        '''
+        start recording a new mission, previous points are discarded
+        '''
+        self._active = True
+        self._start = time.time() if start_time is None else start_time
+        self._xs = array('h')
+        self._ys = array('h')
+        self._ts = array('H')
+        self._collapsed = []
+        self._rejected = None
+        self._rejected_count = 0
+        self._gap = False
+        self.new_segment = False
+        self.accepted = 0
+        self.dropped = 0
+        self._logger.debug('Start trajectory of %s', self._blid)
+
+    def add(self, pose, phase=None, now: float | None = None):
+        '''
+        add a pose report, return True if the point has been kept
+        '''
+        if not self._active:
+            return False
+        if phase in self.BOGUS_PHASES:
+            self._gap = True
+            return False
+        point = pose_to_point(pose)
+        if point is None:
+            return False
+        now = time.time() if now is None else now
+        elapsed = now - self._start
+        if elapsed < self.UNDOCK_DELAY:
+            return False
+        x, y = point
+        if abs(x) > self.MAX_COORDINATE or abs(y) > self.MAX_COORDINATE:
+            self.dropped += 1
+            return False
+        t = min(int(elapsed), 0xFFFF)
+
+        new_segment = len(self._xs) == 0 or self._gap
+        if len(self._xs) > 0 and not self.__plausible(self._xs[-1], self._ys[-1], self._ts[-1], x, y, t):
+            if self._rejected is not None and self.__plausible(*self._rejected, x, y, t):
+                self._rejected_count += 1
+            else:
+                self._rejected_count = 1
+            self._rejected = (x, y, t)
+            if self._rejected_count < self.REANCHOR_COUNT:
+                self.dropped += 1
+                return False
+            self._logger.debug('Trajectory of %s re-anchored at %s, %s', self._blid, x, y)
+            new_segment = True
+
+        self._rejected = None
+        self._rejected_count = 0
+        self._gap = False
+        self.new_segment = new_segment
+        self.__append(x, y, t)
+        self.accepted += 1
+        return True
+
+    def __plausible(self, x1, y1, t1, x2, y2, t2):
+        distance = distance_between(x1, y1, x2, y2)
+        if distance > self.MAX_JUMP:
+            return False
+        return distance / max(1, t2 - t1) <= self.MAX_SPEED
+
+    def __append(self, x, y, t):
+        '''
+        the last point is replaced if it and every point it already replaced lie on the new segment
+        '''
+        count = len(self._xs)
+        if count > 0 and self._xs[-1] == x and self._ys[-1] == y:
+            return
+        if count > 1:
+            ax, ay = self._xs[-2], self._ys[-2]
+            collapsed = self._collapsed + [(self._xs[-1], self._ys[-1])]
+            if len(collapsed) <= self.MAX_COLLAPSED and all(self.__collinear(ax, ay, bx, by, x, y) for bx, by in collapsed):
+                self._xs[-1] = x
+                self._ys[-1] = y
+                self._ts[-1] = t
+                self._collapsed = collapsed
+                return
+        self._xs.append(x)
+        self._ys.append(y)
+        self._ts.append(t)
+        self._collapsed = []
+
+    def __collinear(self, ax, ay, bx, by, cx, cy):
+        '''
+        True if b lies on segment a-c within tolerance
+        '''
+        acx, acy = cx - ax, cy - ay
+        length = math.hypot(acx, acy)
+        if length == 0:
+            return False
+        if (bx - ax) * acx + (by - ay) * acy <= 0 or (cx - bx) * acx + (cy - by) * acy <= 0:
+            return False
+        return abs(acx * (by - ay) - acy * (bx - ax)) / length <= self.COLLINEAR_TOLERANCE
+
+    def finish(self):
+        '''
+        stop recording and save the trajectory, return the saved file if any
+        '''
+        if not self._active:
+            return None
+        self._active = False
+        self._logger.debug('End trajectory of %s: %i points kept, %i dropped', self._blid, len(self._xs), self.dropped)
+        if self._path is None or len(self._xs) == 0:
+            return None
+        try:
+            file = self._path/self._blid/time.strftime('%Y%m%d-%H%M%S.trj', time.localtime(self._start))
+            file.parent.mkdir(parents=True, exist_ok=True)
+            file.write_bytes(self.encode())
+            return file
+        except OSError as e:
+            self._logger.warning('Unable to save trajectory of %s: %s', self._blid, e)
+        return None
+
+    def encode(self) -> bytes:
+        '''
+        header followed by the zlib compressed deltas of x, y and t
+        '''
+        body = bytearray()
+        for values, typecode in ((self._xs, 'i'), (self._ys, 'i'), (self._ts, 'I')):
+            deltas = array(typecode, (b - a for a, b in zip((0, *values), values)))
+            body += deltas.tobytes()
+        header = TRAJECTORY_HEADER.pack(TRAJECTORY_MAGIC, TRAJECTORY_VERSION, int(self._start), len(self._xs))
+        return header + zlib.compress(bytes(body), 9)
+
+    @classmethod
+    def decode(cls, blid: str, data: bytes) -> iRobotTrajectory:
+        magic, version, start, count = TRAJECTORY_HEADER.unpack_from(data)
+        if magic != TRAJECTORY_MAGIC or version != TRAJECTORY_VERSION:
+            raise ValueError('Not a trajectory file')
+        body = zlib.decompress(data[TRAJECTORY_HEADER.size:])
+        trajectory = cls(blid)
+        trajectory._start = float(start)
+        offset = 0
+        for name, typecode, target in (('_xs', 'i', 'h'), ('_ys', 'i', 'h'), ('_ts', 'I', 'H')):
+            deltas = array(typecode)
+            deltas.frombytes(body[offset:offset + count * deltas.itemsize])
+            offset += count * deltas.itemsize
+            values = array(target)
+            total = 0
+            for delta in deltas:
+                total += delta
+                values.append(total)
+            setattr(trajectory, name, values)
+        return trajectory
+
+    @classmethod
+    def load(cls, blid: str, file: Path) -> iRobotTrajectory:
+        return cls.decode(blid, file.read_bytes())
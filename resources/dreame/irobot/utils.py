@@ -1,5 +1,26 @@
+from __future__ import annotations
+
 from functools import cache
 import ssl
+import time
+
+
+class iRobotSSLSocket(ssl.SSLSocket):
+    '''
+    SSLSocket reporting its handshake to the iRobotTLSContext which created it
+    '''
+
+    def do_handshake(self, *args, **kwargs):
+        owner = getattr(self, 'tls_owner', None)
+        if owner is None:
+            return super().do_handshake(*args, **kwargs)
+        start = time.perf_counter()
+        try:
+            super().do_handshake(*args, **kwargs)
+        except (ssl.SSLError, OSError):
+            owner.handshake_failed()
+            raise
+        owner.handshake_done(self, time.perf_counter() - start)
 
 
 @cache
@@ -9,9 +30,64 @@ def generate_tls_context() -> ssl.SSLContext:
     We only want to do this once ever because it's expensive.
     """
     ssl_context = ssl.SSLContext(ssl.PROTOCOL_TLS)
+    # robots use self signed certificates and verification is disabled: no need to load the CA store
     ssl_context.verify_mode = ssl.CERT_NONE
     ssl_context.set_ciphers("DEFAULT:!DH")
-    ssl_context.load_default_certs()
     # ssl.OP_LEGACY_SERVER_CONNECT is only available in Python 3.12a4+
     ssl_context.options |= getattr(ssl, "OP_LEGACY_SERVER_CONNECT", 0x4)
+    ssl_context.sslsocket_class = iRobotSSLSocket
     return ssl_context
+
+
+class iRobotTLSContext:
+    '''
+    TLS context of one robot, given to paho in place of the shared SSLContext.
+
+    The session of the last connection is offered on the next one, so the robot can resume it
+    with an abbreviated handshake; it falls back to a full handshake by itself if it does not.
+    A session is dropped after a failed handshake.
+    '''
+
+    def __init__(self, context: ssl.SSLContext | None = None):
+        self._context = context if context is not None else generate_tls_context()
+        self.session: ssl.SSLSession | None = None
+        self.handshakes = 0
+        self.resumed = 0
+        self.failures = 0
+        self.last_handshake_time: float | None = None
+        self.total_handshake_time = 0.0
+
+    @property
+    def check_hostname(self):
+        return self._context.check_hostname
+
+    @check_hostname.setter
+    def check_hostname(self, value: bool):
+        self._context.check_hostname = value
+
+    def wrap_socket(self, sock, *args, **kwargs) -> ssl.SSLSocket:
+        ssl_sock = self._context.wrap_socket(sock, *args, session=self.session, **kwargs)
+        ssl_sock.tls_owner = self
+        return ssl_sock
+
+    def handshake_done(self, ssl_sock: ssl.SSLSocket, duration: float):
+        self.handshakes += 1
+        if ssl_sock.session_reused:
+            self.resumed += 1
+        self.last_handshake_time = duration
+        self.total_handshake_time += duration
+        self.session = ssl_sock.session
+
+    def handshake_failed(self):
+        self.failures += 1
+        self.session = None
+
+    def stats(self) -> dict:
+        return {
+            'handshakes': self.handshakes,
+            'resumed': self.resumed,
+            'hit_rate': round(self.resumed / self.handshakes, 3) if self.handshakes else None,
+            'failures': self.failures,
+            'last_handshake_ms': round(self.last_handshake_time * 1000, 1) if self.last_handshake_time is not None else None,
+            'mean_handshake_ms': round(self.total_handshake_time * 1000 / self.handshakes, 1) if self.handshakes else None,
+        }
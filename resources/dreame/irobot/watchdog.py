@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from __future__ import annotations
+
+from collections.abc import Callable
+import logging
+
+from .scheduler import iRobotScheduler
+
+
+class iRobotCadence:
+    '''
+    Smoothed interval between two messages of a robot, and its mean deviation
+    '''
+
+    __slots__ = ('mean', 'deviation', 'samples')
+
+    ALPHA = 0.125  # same smoothing as TCP round trip estimation
+
+    def __init__(self):
+        self.mean = 0.0
+        self.deviation = 0.0
+        self.samples = 0
+
+    def add(self, interval: float):
+        if self.samples == 0:
+            self.mean = interval
+            self.deviation = interval / 2
+        else:
+            self.deviation += self.ALPHA * (abs(interval - self.mean) - self.deviation)
+            self.mean += self.ALPHA * (interval - self.mean)
+        self.samples += 1
+
+    def limit(self, factor: float) -> float:
+        return self.mean + factor * self.deviation
+
+
+class iRobotWatchdog:
+    '''
+    Detect a robot connection which stays open but does not deliver messages anymore.
+
+    The usual interval between messages is learnt per phase (a running robot talks a lot,
+    a docked one seldom). When nothing is received for much longer than usual, probe() is
+    called (eg a new subscription, answered by a SUBACK); if alive() is not called within
+    probe_timeout, stale() is called so the connection can be marked offline and restarted.
+    A connection is always declared stale at most deadline seconds after its last message.
+    '''
+
+    MIN_SAMPLES = 5  # messages in a phase before its learnt cadence is used
+    DEVIATION_FACTOR = 8
+    MIN_SILENCE = 15  # s
+
+    def __init__(self, scheduler: iRobotScheduler, owner: str, name: str, probe: Callable[[], None], stale: Callable[[], None],
+                 deadline: float = 300, probe_timeout: float = 10):
+        self._logger = logging.getLogger()
+        self._scheduler = scheduler
+        self._name = name
+        self._probe = probe
+        self._stale = stale
+        self.deadline = deadline
+        self.probe_timeout = probe_timeout
+        self._cadences: dict[str, iRobotCadence] = {}
+        self._phase = None
+        self._last: float | None = None
+        self._probing = False
+        self._timer = scheduler.register(owner, 'watchdog', self.__expired)
+        self.probes = 0
+        self.detections = 0
+        self.last_detection_latency: float | None = None
+
+    def silence_limit(self) -> float:
+        '''
+        silence after which the connection is probed
+        '''
+        longest = max(self.MIN_SILENCE, self.deadline - self.probe_timeout)
+        cadence = self._cadences.get(self._phase)
+        if cadence is None or cadence.samples < self.MIN_SAMPLES:
+            return longest
+        return min(longest, max(self.MIN_SILENCE, cadence.limit(self.DEVIATION_FACTOR)))
+
+    def feed(self, phase: str | None):
+        '''
+        a message has been received, to call from the event loop
+        '''
+        now = self._scheduler.now()
+        if self._last is not None and phase == self._phase:
+            cadence = self._cadences.get(phase)
+            if cadence is None:
+                cadence = self._cadences[phase] = iRobotCadence()
+            cadence.add(now - self._last)
+        self._phase = phase
+        self.alive(now)
+
+    def alive(self, now: float | None = None):
+        '''
+        the connection answered, a message or the answer to a probe
+        '''
+        self._last = now if now is not None else self._scheduler.now()
+        self._probing = False
+        self._timer.arm(self.silence_limit())
+
+    def stop(self):
+        self._timer.cancel()
+        self._last = None
+        self._probing = False
+
+    def __expired(self):
+        if self._last is None:
+            return
+        if not self._probing:
+            self._probing = True
+            self.probes += 1
+            self._logger.info('No message from %s for %.0fs, probing the connection', self._name, self._scheduler.now() - self._last)
+            self._timer.arm(self.probe_timeout)
+            self._probe()
+            return
+        self.detections += 1
+        self.last_detection_latency = round(self._scheduler.now() - self._last, 1)
+        self._logger.warning('Connection to %s is stale, no message for %ss', self._name, self.last_detection_latency)
+        self.stop()
+        self._stale()
+
+    def stats(self) -> dict:
+        return {
+            'silence_limit': round(self.silence_limit(), 1),
+            'cadence': {phase: round(cadence.mean, 1) for phase, cadence in self._cadences.items()},
+            'probes': self.probes,
+            'detections': self.detections,
+            'last_detection_latency': self.last_detection_latency,
+        }
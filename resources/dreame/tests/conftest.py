@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# the daemon imports its modules from resources/dreame
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
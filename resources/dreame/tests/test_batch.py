@@ -0,0 +1,35 @@
+import asyncio
+
+from irobot.batch import batch_command, bulk_get
+
+
+class FakeRobot:
+    def __init__(self, blid, connected=True, fail=False):
+        self.blid = blid
+        self.name = blid
+        self.connected = connected
+        self.fail = fail
+        self.commands = []
+
+    async def async_send_command(self, command):
+        if self.fail:
+            raise RuntimeError('queue closed')
+        self.commands.append(command)
+
+    def get_properties(self, items):
+        return {item: f'{self.blid}.{item}' for item in items}
+
+
+def test_batch_command():
+    robots = {'a': FakeRobot('a'), 'b': FakeRobot('b', connected=False), 'c': FakeRobot('c', fail=True)}
+    results = asyncio.run(batch_command(robots, None, 'dock'))
+    assert results == {'a': 'queued', 'b': 'offline', 'c': 'error'}
+    assert robots['a'].commands == ['dock'] and robots['b'].commands == []
+    results = asyncio.run(batch_command(robots, ['a', 'x'], 'start'))
+    assert results == {'a': 'queued', 'x': 'unknown'}
+
+
+def test_bulk_get():
+    robots = {'a': FakeRobot('a'), 'b': FakeRobot('b')}
+    assert bulk_get(robots, None, ['batPct']) == {'a': {'batPct': 'a.batPct'}, 'b': {'batPct': 'b.batPct'}}
+    assert bulk_get(robots, ['b', 'x'], ['state']) == {'b': {'state': 'b.state'}, 'x': None}
@@ -0,0 +1,40 @@
+from concurrent.futures import ThreadPoolExecutor
+import json
+
+from irobot.configs import iRobotConfigs
+
+
+def write_config(path, robots):
+    (path/'config.json').write_text(json.dumps(robots), encoding='utf-8')
+
+
+def test_update_saves_only_changes(tmp_path):
+    write_config(tmp_path, {'a': {'ip': '10.0.0.1', 'password': 'x', 'robotname': 'A'},
+                            'b': {'ip': '10.0.0.2', 'password': 'y', 'robotname': 'B'}})
+    configs = iRobotConfigs(tmp_path)
+    assert configs.update('a', {'ip': '10.0.0.9', 'mac': 'aa:bb'})
+    assert not configs.update('a', {'ip': '10.0.0.9', 'mac': 'aa:bb'})
+    assert not configs.update('unknown', {'ip': '10.0.0.3'})
+    saved = json.loads((tmp_path/'config.json').read_text(encoding='utf-8'))
+    assert saved['a']['ip'] == '10.0.0.9' and saved['a']['mac'] == 'aa:bb'
+    assert saved['b'] == {'ip': '10.0.0.2', 'password': 'y', 'robotname': 'B'}
+
+
+def test_concurrent_saves_keep_a_valid_file(tmp_path):
+    write_config(tmp_path, {str(index): {'ip': '10.0.0.1', 'password': 'x', 'robotname': str(index)} for index in range(20)})
+    configs = iRobotConfigs(tmp_path)
+    with ThreadPoolExecutor(8) as executor:
+        list(executor.map(lambda index: configs.update(str(index % 20), {'ip': f'10.0.1.{index}'}), range(200)))
+    saved = json.loads((tmp_path/'config.json').read_text(encoding='utf-8'))
+    assert {blid: data['ip'] for blid, data in saved.items()} == {blid: robot.ip for blid, robot in configs.robots.items()}
+    assert not (tmp_path/'config.tmp').exists()
+
+
+def test_update_of_a_config_object_changed_in_place(tmp_path):
+    write_config(tmp_path, {'a': {'ip': '10.0.0.1', 'password': 'x', 'robotname': 'A'}})
+    configs = iRobotConfigs(tmp_path)
+    # the running robot holds the same object and already moved it
+    configs.robots['a'].ip = '10.0.0.9'
+    assert configs.update('a', {'ip': '10.0.0.9'})
+    assert json.loads((tmp_path/'config.json').read_text(encoding='utf-8'))['a']['ip'] == '10.0.0.9'
+    assert not configs.update('a', {'ip': '10.0.0.9'})
@@ -0,0 +1,91 @@
+import struct
+import zlib
+
+from irobot.coveragemap import PNG_SIGNATURE, adler32_combine, iRobotCoverageMap
+
+
+def chunks(png):
+    assert png.startswith(PNG_SIGNATURE)
+    offset = len(PNG_SIGNATURE)
+    result = []
+    while offset < len(png):
+        length, = struct.unpack('>I', png[offset:offset + 4])
+        kind = png[offset + 4:offset + 8]
+        data = png[offset + 8:offset + 8 + length]
+        crc, = struct.unpack('>I', png[offset + 8 + length:offset + 12 + length])
+        assert crc == zlib.crc32(kind + data)
+        result.append((kind, data))
+        offset += 12 + length
+    return result
+
+
+def pixels(png):
+    parts = dict(chunks(png))
+    width, height = struct.unpack('>II', parts[b'IHDR'][:8])
+    raw = zlib.decompress(parts[b'IDAT'])
+    assert len(raw) == height * (width + 1)
+    return width, height, [raw[row * (width + 1) + 1:(row + 1) * (width + 1)] for row in range(height)]
+
+
+def test_adler32_combine():
+    first, second = b'coverage ' * 100, b'heatmap' * 1000
+    assert adler32_combine(zlib.adler32(first), zlib.adler32(second), len(second)) == zlib.adler32(first + second)
+    assert adler32_combine(1, zlib.adler32(second), len(second)) == zlib.adler32(second)
+
+
+def test_render_is_a_valid_png():
+    coverage = iRobotCoverageMap('blid')
+    assert coverage.render() is None and not coverage.dirty
+    coverage.add_point(0, 0)
+    assert coverage.dirty
+    png = coverage.render()
+    assert [kind for kind, _ in chunks(png)] == [b'IHDR', b'PLTE', b'tRNS', b'IDAT', b'IEND']
+    assert not coverage.dirty
+    width, height, rows = pixels(png)
+    assert width % coverage.TILE == 0 and height % coverage.TILE == 0
+    assert max(max(row) for row in rows) == 1
+
+
+def test_cached_bands_match_a_full_render():
+    coverage = iRobotCoverageMap('blid')
+    for x, y in [(0, 0), (300, 0), (300, 400), (0, 400), (0, 0)]:
+        coverage.add_point(x, y)
+    coverage.render()
+    # only the bands of this segment are compressed again
+    coverage.add_point(300, 400)
+    incremental = coverage.render()
+    coverage._bands.clear()
+    coverage._dirty_bands.clear()
+    assert pixels(incremental) == pixels(coverage.render())
+    assert max(max(row) for row in pixels(incremental)[2]) > 1
+
+
+def painted(coverage):
+    return sum(sum(1 for level in tile if level) for tile in coverage._tiles.values())
+
+
+def test_strokes_are_broken_on_new_segments_and_jumps():
+    coverage = iRobotCoverageMap('blid')
+    coverage.add_point(0, 0)
+    alone = painted(coverage)
+    coverage.add_point(100, 0)
+    stroke = painted(coverage)
+    assert stroke > 2 * alone
+    # a new segment only paints its first point
+    coverage.add_point(100, 300, new_stroke=True)
+    assert painted(coverage) == stroke + alone
+    # a far outlier neither paints a stroke nor allocates the tiles on the way
+    tiles = len(coverage._tiles)
+    coverage.add_point(100, 30000)
+    assert painted(coverage) == stroke + 2 * alone
+    assert len(coverage._tiles) <= tiles + 4
+
+
+def test_save_only_when_dirty(tmp_path):
+    coverage = iRobotCoverageMap('blid', tmp_path)
+    assert not coverage.save()
+    coverage.add_point(100, 100)
+    assert coverage.save()
+    assert (tmp_path/'blid.png').read_bytes().startswith(PNG_SIGNATURE)
+    assert not coverage.save()
+    assert not (tmp_path/'blid.tmp').exists()
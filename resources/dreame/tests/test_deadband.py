@@ -0,0 +1,91 @@
+import asyncio
+import json
+
+from irobot.deadband import iRobotDeadband
+from irobot.publisher import iRobotFeedbackPublisher
+from irobot.scheduler import iRobotScheduler
+
+
+class FakeClient:
+    def __init__(self):
+        self.published = []
+
+    def publish(self, topic, payload, retain=False, properties=None):
+        self.published.append((topic, payload))
+
+
+def test_absolute_band_and_heartbeat():
+    deadband = iRobotDeadband({'x': {'abs': 5, 'heartbeat': 60}})
+    assert deadband.accept('x', 100, now=0)
+    assert not deadband.accept('x', 104, now=1)
+    assert deadband.accept('x', 106, now=2)
+    assert not deadband.accept('x', 106, now=30)
+    assert deadband.accept('x', 106, now=63)
+    assert deadband.accept('other', 1, now=0) and deadband.accept('other', 1, now=0)
+    assert deadband.stats()['x'] == {'published': 2, 'heartbeat': 1, 'deadband': 2, 'interval': 0, 'trailing': 0}
+
+
+def test_relative_band_and_strings():
+    deadband = iRobotDeadband({'x': {'rel': 0.1}, 's': {}})
+    assert deadband.accept('x', 100, now=0)
+    assert not deadband.accept('x', 109, now=1)
+    assert deadband.accept('x', 111, now=2)
+    assert deadband.accept('s', 'a', now=0)
+    assert not deadband.accept('s', 'a', now=1)
+    assert deadband.accept('s', 'b', now=2)
+
+
+def test_min_interval_keeps_the_last_change():
+    deadband = iRobotDeadband({'x': {'min_interval': 10}})
+    assert deadband.accept('x', 1, now=0)
+    assert not deadband.accept('x', 2, now=1)
+    assert not deadband.accept('x', 3, now=2)
+    assert deadband.next_due() == 10
+    assert deadband.due(now=5) == []
+    assert deadband.due(now=10) == [('x', 3)]
+    assert deadband.next_due() == float('inf')
+    # back to the published value before it was due: nothing to publish
+    assert not deadband.accept('x', 4, now=11)
+    assert not deadband.accept('x', 3, now=12)
+    assert deadband.due(now=30) == []
+
+
+def test_from_file(tmp_path):
+    file = tmp_path/'feedback_filters.json'
+    file.write_text(json.dumps({'batPct': None, 'custom': {'abs': 1}}), encoding='utf-8')
+    rules = iRobotDeadband.from_file(file).rules
+    assert 'batPct' not in rules and rules['custom'] == {'abs': 1} and 'pose_theta' in rules
+    file.write_text('not json', encoding='utf-8')
+    assert iRobotDeadband.from_file(file).rules == iRobotDeadband.DEFAULT_RULES
+
+
+def test_held_back_change_is_flushed_without_other_publication():
+    async def run():
+        scheduler = iRobotScheduler()
+        task = asyncio.create_task(scheduler.run())
+        publisher = iRobotFeedbackPublisher('fb', deadband=iRobotDeadband({'x': {'min_interval': 0.05}}))
+        publisher.flush_timer = scheduler.register('blid', 'feedback_flush', publisher.flush)
+        client = FakeClient()
+        publisher.attach(client)
+        publisher.publish('x', 1)
+        publisher.publish('x', 2)
+        assert client.published == [('fb/x', 1)]
+        await asyncio.sleep(0.2)
+        assert client.published == [('fb/x', 1), ('fb/x', 2)]
+        task.cancel()
+
+    asyncio.run(run())
+
+
+def test_resend_bypasses_the_deadband_once():
+    publisher = iRobotFeedbackPublisher('fb', deadband=iRobotDeadband({'x': {'abs': 5, 'min_interval': 60}, 'y': {'abs': 5}}))
+    client = FakeClient()
+    publisher.attach(client)
+    for key, value in [('x', 1), ('y', 1), ('x', 2), ('y', 2), ('x', 20)]:
+        publisher.publish(key, value)
+    assert client.published == [('fb/x', 1), ('fb/y', 1)]
+    publisher.resend()
+    assert publisher.deadband.next_due() == float('inf')
+    for key, value in [('x', 20), ('y', 2), ('x', 20), ('y', 2)]:
+        publisher.publish(key, value)
+    assert client.published[2:] == [('fb/x', 20), ('fb/y', 2)]
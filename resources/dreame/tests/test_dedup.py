@@ -0,0 +1,65 @@
+import json
+
+from irobot.dedup import iRobotDuplicateFilter, sections
+
+TOPIC = '$aws/things/blid/shadow/update'
+
+
+def frame(**reported):
+    data = {'state': {'reported': reported}}
+    return json.dumps(data).encode(), data
+
+
+def process(dedup, payload, data, changes):
+    if dedup.is_duplicate(TOPIC, payload):
+        return False
+    dedup.processed(TOPIC, data, changes, 0.001)
+    return True
+
+
+def test_sections():
+    data = {'state': {'reported': {'signal': {'rssi': -50}, 'batPct': 90}}}
+    assert sections(data, 3) == {('state', 'reported', 'signal'), ('state', 'reported', 'batPct')}
+    assert sections({'state': {}}, 3) == {('state',)}
+
+
+def test_repeated_frame_is_skipped():
+    dedup = iRobotDuplicateFilter()
+    payload, data = frame(batPct=90)
+    assert process(dedup, payload, data, [(('state', 'reported', 'batPct'), 90)])
+    assert not process(dedup, payload, data, [])
+    assert dedup.hits == {TOPIC: 1} and dedup.misses == 1
+
+
+def test_frame_is_processed_again_after_its_section_changed():
+    dedup = iRobotDuplicateFilter()
+    a, a_data = frame(batPct=90)
+    b, b_data = frame(batPct=80)
+    assert process(dedup, a, a_data, [(('state', 'reported', 'batPct'), 90)])
+    assert process(dedup, b, b_data, [(('state', 'reported', 'batPct'), 80)])
+    # A/B/A: skipping the second A would leave the state at 80
+    assert process(dedup, a, a_data, [(('state', 'reported', 'batPct'), 90)])
+    # a change in another section does not matter
+    c, c_data = frame(signal={'rssi': -50})
+    assert process(dedup, c, c_data, [(('state', 'reported', 'signal'), {'rssi': -50})])
+    assert not process(dedup, a, a_data, [])
+
+
+def test_shallow_change_and_bypass():
+    dedup = iRobotDuplicateFilter(bypass=['$aws/things/+/shadow/#'])
+    payload, data = frame(batPct=90)
+    assert process(dedup, payload, data, [])
+    assert process(dedup, payload, data, [])
+    assert dedup.hits == {}
+
+    dedup = iRobotDuplicateFilter()
+    assert process(dedup, payload, data, [])
+    assert not process(dedup, payload, data, [])
+    # the whole reported state replaced forgets every recent frame
+    reset, reset_data = frame(signal={'rssi': -50})
+    assert process(dedup, reset, reset_data, [(('state', 'reported'), {})])
+    assert process(dedup, payload, data, [])
+    # frames which are not state fragments are never skipped
+    other = json.dumps({'state': 'x'}).encode()
+    assert process(dedup, other, {'state': 'x'}, [])
+    assert process(dedup, other, {'state': 'x'}, [])
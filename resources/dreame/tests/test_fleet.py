@@ -0,0 +1,138 @@
+import asyncio
+
+from irobot import irobot as irobot_module
+from irobot.configs import iRobotConfig
+from irobot.fleet import iRobotFleet
+from irobot.irobot import iRobot
+from irobot.topicfilter import iRobotTopicFilters
+
+
+class FakeRobot:
+    def __init__(self, config, topic_filter):
+        self.config = config
+        self.topic_filter = topic_filter
+        self.address = None
+        self.closed = False
+
+    @property
+    def blid(self):
+        return self.config.blid
+
+    @property
+    def name(self):
+        return self.config.name
+
+    def connect(self):
+        future = asyncio.get_running_loop().create_future()
+        future.set_result(True)
+        return future
+
+    async def close(self):
+        if self.config.name == 'hung':
+            await asyncio.sleep(60)
+        self.closed = True
+
+
+def config(blid, ip='10.0.0.1', name=None):
+    return iRobotConfig(blid, {'ip': ip, 'password': 'x', 'robotname': name or blid})
+
+
+def test_reconcile(tmp_path):
+    async def run():
+        online = []
+        fleet = iRobotFleet(FakeRobot, on_robot_online=online.append)
+        filters = iRobotTopicFilters(tmp_path)
+        configs = {'a': config('a'), 'b': config('b'), 'c': config('c')}
+        result = await fleet.reconcile(configs, filters, excluded=['c'])
+        assert sorted(result['started']) == ['a', 'b'] and len(fleet) == 2
+        await asyncio.sleep(0)
+        assert sorted(online) == ['a', 'b']
+        first_a, first_b = fleet.robots['a'], fleet.robots['b']
+
+        # the shared config object is renamed in place by a discovery
+        configs['a'].name = 'kitchen'
+        configs['b'] = config('b', ip='10.0.0.2')
+        del configs['c']
+        result = await fleet.reconcile(configs, filters)
+        assert result == {'started': [], 'stopped': [], 'restarted': ['b'], 'renamed': ['a']}
+        assert fleet.robots['a'] is first_a and fleet.robots['a'].name == 'kitchen'
+        assert first_b.closed and fleet.robots['b'] is not first_b
+
+        result = await fleet.reconcile(configs, filters)
+        assert result == {'started': [], 'stopped': [], 'restarted': [], 'renamed': []}
+
+        result = await fleet.reconcile({'a': configs['a']}, filters)
+        assert result['stopped'] == ['b'] and len(fleet) == 1
+        await fleet.stop()
+        assert first_a.closed and len(fleet) == 0
+
+    asyncio.run(run())
+
+
+def test_replacement_waits_for_a_clean_stop(tmp_path):
+    async def run():
+        fleet = iRobotFleet(FakeRobot)
+        fleet.STOP_TIMEOUT = 0.1
+        filters = iRobotTopicFilters(tmp_path)
+        await fleet.reconcile({'a': config('a', name='hung')}, filters)
+        result = await fleet.reconcile({'a': config('a', ip='10.0.0.2', name='hung')}, filters)
+        assert result['restarted'] == [] and len(fleet) == 0
+        # started again by the next reconciliation
+        result = await fleet.reconcile({'a': config('a', ip='10.0.0.2')}, filters)
+        assert result['started'] == ['a']
+        await fleet.stop()
+
+    asyncio.run(run())
+
+
+class FakeMqttClient:
+    clients = []
+
+    def __init__(self, *args, **kwargs):
+        self.calls = []
+        self.clients.append(self)
+
+    def __getattr__(self, name):
+        if name.startswith('on_') or name.startswith('_'):
+            raise AttributeError(name)
+        return lambda *args, **kwargs: self.calls.append((name, args, kwargs.get('retain')))
+
+    def loop_start(self):
+        self.calls.append(('loop_start', (), None))
+        if self.on_connect.__name__ == 'on_robot_mqtt_connect':
+            self.on_connect(self, None, None, 0, None)
+
+
+def test_close_disconnects_both_clients(monkeypatch):
+    monkeypatch.setattr(irobot_module.mqtt, 'Client', FakeMqttClient)
+    FakeMqttClient.clients = []
+
+    async def run():
+        robot = iRobot(config('a'))
+        await robot.setup_mqtt_client('broker', retain=True)
+        assert await robot.connect()
+        await robot.close()
+
+    asyncio.run(run())
+    local, remote = FakeMqttClient.clients
+    assert ('will_set', ('/irobot/feedback/a/status', 'Offline'), True) in local.calls
+    assert [name for name, _, _ in remote.calls[-2:]] == ['disconnect', 'loop_stop']
+    # the final status is sent before the clean disconnect, the broker discards the will
+    names = [name for name, _, _ in local.calls]
+    assert names[-2:] == ['disconnect', 'loop_stop']
+    topic, status = local.calls[names.index('disconnect') - 1][1][:2]
+    assert topic == '/irobot/feedback/a/status' and status.startswith('Offline at')
+
+
+def test_close_disconnects_the_broker_client_of_an_unconnected_robot(monkeypatch):
+    monkeypatch.setattr(irobot_module.mqtt, 'Client', FakeMqttClient)
+    FakeMqttClient.clients = []
+
+    async def run():
+        robot = iRobot(config('a'))
+        await robot.setup_mqtt_client('broker', retain=True)
+        await robot.close()
+
+    asyncio.run(run())
+    [local] = FakeMqttClient.clients
+    assert [name for name, _, _ in local.calls][-2:] == ['disconnect', 'loop_stop']
@@ -0,0 +1,25 @@
+import asyncio
+
+from irobot import irobot as irobot_module
+from irobot.configs import iRobotConfig
+from irobot.irobot import iRobot
+
+
+def test_address_is_looked_for_again_during_an_outage(monkeypatch):
+    lookups = []
+
+    async def resolve(blid, mac, ip):
+        lookups.append(blid)
+        return None  # robot still off
+
+    monkeypatch.setattr(irobot_module, 'resolve', resolve)
+
+    async def run():
+        robot = iRobot(iRobotConfig('a', {'ip': '10.0.0.1', 'password': 'x', 'robotname': 'A'}))
+        for _ in range(robot.resolve_after_failures * 3 + 1):
+            robot.on_robot_mqtt_connect_fail(None, None)
+            await asyncio.sleep(0.01)
+        await robot.close()
+
+    asyncio.run(run())
+    assert lookups == ['a', 'a', 'a']
@@ -0,0 +1,25 @@
+import asyncio
+import time
+
+from irobot.loopmonitor import iRobotLoopMonitor
+
+
+def blocking_call():
+    time.sleep(0.3)
+
+
+def test_blocked_loop_is_measured_and_captured():
+    async def run():
+        monitor = iRobotLoopMonitor(interval=0.02, threshold=0.1)
+        monitor.start()
+        await asyncio.sleep(0.1)
+        blocking_call()
+        await asyncio.sleep(0.1)
+        monitor.stop()
+        return monitor.stats()
+
+    stats = asyncio.run(run())
+    assert stats['stalls'] == 1 and stats['max_lag_ms'] >= 200
+    assert sum(stats['histogram'].values()) == stats['samples']
+    [capture] = stats['captures']
+    assert 'blocking_call' in capture['stack'] and capture['blocked_ms'] >= 100
@@ -0,0 +1,57 @@
+import json
+import time
+
+from irobot.missions import iRobotMission, iRobotMissionLog
+
+
+def summary(blid, start, result='completed'):
+    return {'blid': blid, 'cycle': 'clean', 'result': result, 'start': start, 'end': start + 600}
+
+
+def test_mission_counters_on_transitions_only():
+    mission = iRobotMission('blid')
+    mission.start('clean', start_time=0)
+    for phase, bin_full in [('run', False), ('stuck', False), ('stuck', False), ('run', True), ('run', True),
+                            ('evac', False), ('hmMidMsn', False), ('run', True)]:
+        mission.update(phase, sqft=10, bin_full=bin_full)
+    result = mission.finish('completed', end_time=1200)
+    assert (result['stuck'], result['evacs'], result['recharges'], result['bin_full']) == (1, 1, 1, 2)
+    assert result['duration'] == 20
+    assert mission.finish('completed') is None
+
+
+def test_append_and_query(tmp_path):
+    now = int(time.time())
+    log = iRobotMissionLog(tmp_path)
+    log.append(summary('a', now))
+    log.append(summary('b', now))
+    log.append(summary('a', now - 100 * 86400))
+    assert [mission['blid'] for mission in log.query()] == ['a', 'b']
+    assert [mission['blid'] for mission in log.query('a', days=365)] == ['a', 'a']
+    # the index is appended, one line per mission
+    assert len((tmp_path/'index.jsonl').read_text().splitlines()) == 3
+    assert len(iRobotMissionLog(tmp_path).query(days=365)) == 3
+
+
+def test_stale_index_is_repaired(tmp_path):
+    now = int(time.time())
+    log = iRobotMissionLog(tmp_path)
+    log.append(summary('a', now))
+    # crash after the log line was written, before the index line
+    with (tmp_path/'missions.jsonl').open('a') as file:
+        file.write(json.dumps(summary('b', now)) + '\n')
+    log = iRobotMissionLog(tmp_path)
+    assert [mission['blid'] for mission in log.query()] == ['a', 'b']
+    log.append(summary('c', now))
+    assert [mission['blid'] for mission in iRobotMissionLog(tmp_path).query()] == ['a', 'b', 'c']
+
+
+def test_index_past_the_log_is_rebuilt(tmp_path):
+    now = int(time.time())
+    log = iRobotMissionLog(tmp_path)
+    log.append(summary('a', now))
+    log.append(summary('b', now))
+    (tmp_path/'missions.jsonl').write_text(json.dumps(summary('c', now)) + '\n')
+    assert [mission['blid'] for mission in iRobotMissionLog(tmp_path).query()] == ['c']
+    (tmp_path/'index.jsonl').write_text('not json\n')
+    assert [mission['blid'] for mission in iRobotMissionLog(tmp_path).query()] == ['c']
@@ -0,0 +1,52 @@
+from irobot.publisher import iRobotFeedbackPublisher
+
+
+class FakeClient:
+    def __init__(self):
+        self.published = []
+
+    def publish(self, topic, payload, retain=False, properties=None):
+        self.published.append((topic, payload))
+
+
+def attached():
+    publisher = iRobotFeedbackPublisher('fb')
+    client = FakeClient()
+    publisher.attach(client)
+    return publisher, client
+
+
+def test_values_are_normalised():
+    publisher, client = attached()
+    publisher.publish('bin_full', True)
+    publisher.publish('netinfo_addr', 1677830336)
+    publisher.publish('lastCommand_regions', [{'region_id': '1', 'type': 'rid'}])
+    publisher.publish('batPct', 80)
+    assert client.published == [('fb/bin_full', 1), ('fb/netinfo_addr', '100.1.168.192'),
+                                ('fb/lastCommand_regions', '[{"region_id": "1", "type": "rid"}]'), ('fb/batPct', 80)]
+
+
+def test_configuration_values_are_only_sent_on_change():
+    publisher, client = attached()
+    for value in ['R98', 'R98', 'R99']:
+        publisher.publish('sku', value)
+    assert client.published == [('fb/sku', 'R98'), ('fb/sku', 'R99')]
+    publisher.resend()
+    publisher.publish('sku', 'R99')
+    publisher.connected()
+    publisher.publish('sku', 'R99')
+    publisher.publish('sku', 'R99')
+    assert client.published[2:] == [('fb/sku', 'R99'), ('fb/sku', 'R99')]
+    assert publisher.stats()['unchanged'] == 2
+
+
+def test_critical_values_overtake_a_batch():
+    publisher, client = attached()
+    with publisher.batch():
+        publisher.publish('softwareVer', '3.1')
+        publisher.publish('pose_theta', 10)
+        publisher.publish('state', 'Running')
+        publisher.publish('pose_theta', 20)
+        assert client.published == [('fb/state', 'Running')]
+    assert client.published == [('fb/state', 'Running'), ('fb/pose_theta', 20), ('fb/softwareVer', '3.1')]
+    assert publisher.stats()['lanes']['progress']['coalesced'] == 1
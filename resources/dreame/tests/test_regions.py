@@ -0,0 +1,60 @@
+from irobot.regions import iRobotRegionCatalogue, region_key
+
+
+def cloud_map(pmap_id, name, regions, zones=()):
+    return {
+        'pmap_id': pmap_id,
+        'visible_name': name,
+        'active_pmapv_details': {
+            'active_pmapv': {'user_pmapv_id': f'{pmap_id}-v1'},
+            'regions': [{'id': region_id, 'name': region_name} for region_id, region_name in regions],
+            'zones': [{'id': zone_id, 'name': zone_name} for zone_id, zone_name in zones],
+        },
+    }
+
+
+def catalogue(path=None):
+    regions = iRobotRegionCatalogue('blid', path)
+    regions.update_from_shadow([{'ground': 'ground-v2'}, {'upstairs': 'upstairs-v1'}])
+    regions.update_from_cloud([
+        cloud_map('ground', 'Ground floor', [(1, 'Kitchen'), (2, 'Living  Room')], zones=[(10, 'Rug')]),
+        cloud_map('upstairs', 'Upstairs', [(1, 'Bedroom'), (2, 'Kitchen')]),
+    ])
+    return regions
+
+
+def test_region_key():
+    assert region_key('  Living \t Room ') == region_key('living room')
+
+
+def test_shadow_and_cloud_versions():
+    regions = catalogue()
+    assert len(regions) == 2 and regions.region_count() == 5
+    assert regions.default_map() == 'ground'
+    # the version reported by the robot wins over the cloud one
+    assert regions.user_pmapv_id('ground') == 'ground-v2'
+    assert regions.map_of_version('upstairs-v1') == 'upstairs'
+    assert not regions.update_from_shadow([{'ground': 'ground-v2'}, {'upstairs': 'upstairs-v1'}])
+    assert regions.update_from_shadow([{'upstairs': 'upstairs-v1'}, {'ground': 'ground-v2'}])
+    assert regions.default_map() == 'upstairs'
+
+
+def test_find_region():
+    regions = catalogue()
+    assert regions.find_region('2') == ('ground', {'region_id': '2', 'type': 'rid'})
+    assert regions.find_region('living room') == ('ground', {'region_id': '2', 'type': 'rid'})
+    assert regions.find_region('rug') == ('ground', {'region_id': '10', 'type': 'zid'})
+    assert regions.find_region('bedroom') == ('upstairs', {'region_id': '1', 'type': 'rid'})
+    # a name used in both maps is taken from the default map unless one is given
+    assert regions.find_region('Kitchen') == ('ground', {'region_id': '1', 'type': 'rid'})
+    assert regions.find_region('Kitchen', 'upstairs') == ('upstairs', {'region_id': '2', 'type': 'rid'})
+    assert regions.find_region('bedroom', 'ground') is None
+    assert regions.find_region('garage') is None
+    assert regions.find_region('42') == (None, {'region_id': '42', 'type': 'rid'})
+
+
+def test_save_and_load(tmp_path):
+    catalogue(tmp_path).save()
+    regions = iRobotRegionCatalogue('blid', tmp_path)
+    assert regions.region_count() == 5 and regions.default_map() == 'ground'
+    assert regions.find_region('living room') == ('ground', {'region_id': '2', 'type': 'rid'})
@@ -0,0 +1,54 @@
+from irobot.scheduler import iRobotScheduler, VirtualClock
+
+
+def test_timers_fire_in_order():
+    clock = VirtualClock()
+    scheduler = iRobotScheduler(clock)
+    fired = []
+    for name, delay in [('b', 2), ('a', 1), ('c', 3)]:
+        scheduler.register('robot', name, lambda name=name: fired.append(name)).arm(delay)
+    assert scheduler.run_due() == 1
+    clock.advance(2)
+    assert scheduler.run_due() == 1
+    assert fired == ['a', 'b']
+    clock.advance(1)
+    assert scheduler.run_due() is None
+    assert fired == ['a', 'b', 'c']
+
+
+def test_rearm_cancel_and_unregister():
+    clock = VirtualClock()
+    scheduler = iRobotScheduler(clock)
+    fired = []
+    timer = scheduler.register('robot', 'watchdog', lambda: fired.append(clock()))
+    assert scheduler.register('robot', 'watchdog') is timer
+    timer.arm(5)
+    timer.arm(10)  # later: the heap entry is moved when it pops
+    clock.advance(5)
+    scheduler.run_due()
+    assert fired == [] and timer.remaining() == 5
+    timer.arm(1)  # earlier
+    clock.advance(1)
+    scheduler.run_due()
+    assert fired == [6] and not timer.armed and timer.fired == 1
+    timer.arm(1)
+    timer.cancel()
+    clock.advance(2)
+    scheduler.run_due()
+    assert fired == [6]
+    timer.arm(1)
+    scheduler.unregister('robot')
+    clock.advance(2)
+    scheduler.run_due()
+    assert fired == [6] and scheduler.dump() == []
+
+
+def test_callback_error_does_not_stop_other_timers():
+    clock = VirtualClock()
+    scheduler = iRobotScheduler(clock)
+    fired = []
+    scheduler.register('robot', 'bad', lambda: 1 / 0).arm(1)
+    scheduler.register('robot', 'good', lambda: fired.append(True)).arm(1)
+    clock.advance(1)
+    scheduler.run_due()
+    assert fired == [True]
@@ -0,0 +1,147 @@
+import asyncio
+import multiprocessing
+from multiprocessing.connection import Connection
+import os
+
+from irobot.shards import iRobotShardSupervisor, shard_of
+
+
+class FakeProcess:
+    '''
+    worker process which does not run: the test answers on its end of the pipe
+    '''
+
+    started = []
+
+    def __init__(self, target, args, name, daemon):
+        self.index = args[0]
+        self.pid = 1000 + len(self.started)
+        self.exitcode = None
+        self.conn = None
+        self._child_conn = args[3]
+        self._alive = False
+
+    def start(self):
+        # the supervisor closes its copy of the child end, as a real process keeps its own
+        self.conn = Connection(os.dup(self._child_conn.fileno()))
+        self._alive = True
+        self.started.append(self)
+
+    def is_alive(self):
+        return self._alive
+
+    def join(self, timeout=None):
+        pass
+
+    def kill(self):
+        self._alive = False
+        self.exitcode = -9
+
+
+class FakeContext:
+    def Pipe(self):
+        return multiprocessing.Pipe()
+
+    def Process(self, **kwargs):
+        return FakeProcess(**kwargs)
+
+
+def supervisor(count=2):
+    FakeProcess.started = []
+    result = iRobotShardSupervisor(count, {}, mission_log=None)
+    result._context = FakeContext()
+    return result
+
+
+def workers():
+    '''
+    last started process of each worker
+    '''
+    return {process.index: process for process in FakeProcess.started}
+
+
+async def received(conn):
+    for _ in range(100):
+        if conn.poll():
+            return conn.recv()
+        await asyncio.sleep(0.01)
+    raise AssertionError('no message')
+
+
+def test_shard_of_is_stable():
+    # the assignment must not change between runs nor python versions (no hash randomization)
+    assert [shard_of(blid, 4) for blid in ['3145C21032515678', 'ABCDEF0123456789', 'a', 'b', 'c', 'd']] == [1, 1, 3, 1, 3, 0]
+    blids = [f'blid{i}' for i in range(1000)]
+    counts = [0] * 8
+    for blid in blids:
+        counts[shard_of(blid, 8)] += 1
+    assert all(80 < count < 170 for count in counts)
+
+
+def test_worker_stats_are_merged():
+    async def run():
+        shards = supervisor()
+        await shards.start()
+        for index, process in workers().items():
+            blid = f'robot{index}'
+            process.conn.send({'pong': index, 'robots': 1, 'executors': {}, 'loop': {},
+                               'robot_stats': {'dedup': {blid: {'hits': index}}, 'watchdog': {blid: {'stale': False}}}})
+        await asyncio.sleep(0.05)
+        assert shards.robot_stats() == {
+            'dedup': {'robot0': {'hits': 0}, 'robot1': {'hits': 1}},
+            'watchdog': {'robot0': {'stale': False}, 'robot1': {'stale': False}},
+        }
+        assert [worker['robots'] for worker in shards.stats()] == [1, 1]
+        await shards.stop()
+
+    asyncio.run(run())
+
+
+def test_batch_answers_are_merged():
+    async def run():
+        shards = supervisor()
+        await shards.start()
+        blids = {index: next(f'blid{i}' for i in range(100) if shard_of(f'blid{i}', 2) == index) for index in range(2)}
+
+        async def answer(index, results):
+            message = await received(workers()[index].conn)
+            assert message['action'] == 'command'
+            workers()[index].conn.send({'response': message['request'], 'results': results})
+
+        request = asyncio.create_task(shards.request({'action': 'command', 'command': 'dock', 'blids': list(blids.values())}))
+        await answer(0, {blids[0]: 'queued'})
+        await answer(1, {blids[1]: 'offline'})
+        assert await request == {blids[0]: 'queued', blids[1]: 'offline'}
+
+        # a worker which does not answer: its robots are reported unknown
+        request = asyncio.create_task(shards.request({'action': 'command', 'command': 'dock', 'blids': list(blids.values())}, timeout=0.2))
+        await answer(0, {blids[0]: 'queued'})
+        assert await request == {blids[0]: 'queued', blids[1]: 'unknown'}
+        await received(workers()[1].conn)
+
+        request = asyncio.create_task(shards.request({'action': 'get', 'properties': ['batPct'], 'blids': list(blids.values())}, timeout=0.2))
+        message = await received(workers()[1].conn)
+        workers()[1].conn.send({'response': message['request'], 'results': {blids[1]: {'batPct': 80}}})
+        assert await request == {blids[0]: None, blids[1]: {'batPct': 80}}
+        await shards.stop()
+
+    asyncio.run(run())
+
+
+def test_dead_worker_is_restarted():
+    async def run():
+        shards = supervisor()
+        shards.HEALTH_CHECK_INTERVAL = 0.01
+        await shards.start()
+        dead, alive = workers()[0], workers()[1]
+        dead.kill()
+        await asyncio.sleep(0.1)
+        assert workers()[0] is not dead and workers()[0].is_alive()
+        assert workers()[1] is alive
+        assert [worker['restarts'] for worker in shards.stats()] == [1, 0]
+        # the new worker is watched as the others
+        assert (await received(workers()[0].conn))['action'] == 'ping'
+        assert (await received(alive.conn))['action'] == 'ping'
+        await shards.stop()
+
+    asyncio.run(run())
@@ -0,0 +1,47 @@
+import asyncio
+import json
+
+from irobot.configs import iRobotConfig
+from irobot.irobot import iRobot
+from irobot.state import iRobotLazyValue, iRobotStatus
+
+
+def merge(robot, data):
+    changes = []
+    robot.dict_merge(robot.master_state, robot.decode_payload('topic', json.dumps(data).encode()), changes)
+    robot.status.update(changes)
+
+
+def test_status_is_a_view_of_the_state():
+    async def run():
+        robot = iRobot(iRobotConfig('blid', {'ip': '127.0.0.1', 'password': 'x', 'robotname': 'test'}))
+        assert robot.status.phase is None and robot.status.mac is None
+        merge(robot, {'state': {'reported': {'batPct': 90, 'cleanMissionStatus': {'phase': 'charge', 'cycle': 'none'},
+                                             'hwPartsRev': {'wlan0HwAddr': 'aa:bb'}}}})
+        reported = robot.master_state['state']['reported']
+        assert robot.status.reported is reported and robot.status.cleanMissionStatus is reported['cleanMissionStatus']
+        assert (robot.status.phase, robot.status.batPct, robot.status.mac, robot.status.bin_full) == ('charge', 90, 'aa:bb', None)
+        merge(robot, {'state': {'reported': {'cleanMissionStatus': {'phase': 'run'}, 'bin': {'full': True}, 'mac': 'cc:dd'}}})
+        assert (robot.status.phase, robot.status.cycle, robot.status.bin_full, robot.status.mac) == ('run', 'none', True, 'cc:dd')
+        # a field replaced by a value which is not a dict
+        merge(robot, {'state': {'reported': {'bin': 0}}})
+        assert robot.status.bin_full is None
+
+    asyncio.run(run())
+
+
+def test_status_has_no_copy_of_the_fields():
+    assert not hasattr(iRobotStatus(), '__dict__')
+    assert len(iRobotStatus.__slots__) < len(iRobotStatus.FIELDS)
+
+
+def test_only_lists_are_kept_serialized():
+    async def run():
+        robot = iRobot(iRobotConfig('blid', {'ip': '127.0.0.1', 'password': 'x', 'robotname': 'test'}))
+        merge(robot, {'state': {'reported': {'pmaps': [{'abc': '1'}], 'langs2': {'sLang': 'fr-FR', 'dLangs': {'ver': 1}}}}})
+        reported = robot.master_state['state']['reported']
+        assert isinstance(reported['pmaps'], iRobotLazyValue) and robot.get_property('pmaps') == [{'abc': '1'}]
+        assert isinstance(reported['langs2'], dict)
+        assert robot.get_property('sLang') == 'fr-FR' and robot.get_property('langs')['dLangs'] == {'ver': 1}
+
+    asyncio.run(run())
@@ -0,0 +1,71 @@
+import asyncio
+import json
+
+from irobot.configs import iRobotConfig
+from irobot.irobot import iRobot
+from irobot.subscriptions import compile_pattern, leaf_changes, match_pattern
+from irobot.state import iRobotLazyValue
+
+
+FIRST = {'state': {'reported': {'cleanMissionStatus': {'phase': 'charge', 'cycle': 'none'},
+                                'bin': {'full': False}, 'pmaps': [{'abc': '1'}]}}}
+DELTA = {'state': {'reported': {'cleanMissionStatus': {'phase': 'run'}}}}
+
+
+def test_match_pattern():
+    assert match_pattern(compile_pattern('state.reported.bin.full'), ('state', 'reported', 'bin', 'full'))
+    assert match_pattern(compile_pattern('state.*.bin.*'), ('state', 'reported', 'bin', 'full'))
+    assert match_pattern(compile_pattern('state.+.bin.+'), ('state', 'reported', 'bin', 'full'))
+    assert not match_pattern(compile_pattern('state.*.bin'), ('state', 'reported', 'bin', 'full'))
+    assert match_pattern(compile_pattern('state.#'), ('state', 'reported', 'bin', 'full'))
+    assert match_pattern(compile_pattern('#'), ('state',))
+    assert not match_pattern(compile_pattern('state.reported.bin.full'), ('state', 'reported', 'bin'))
+
+
+def test_leaf_changes():
+    lazy = iRobotLazyValue.wrap([1, 2])
+    changes = [(('state',), {'reported': {'a': 1, 'b': {}, 'c': lazy}}), (('x',), 2)]
+    assert leaf_changes(changes) == [(('state', 'reported', 'a'), 1), (('state', 'reported', 'b'), {}),
+                                     (('state', 'reported', 'c'), [1, 2]), (('x',), 2)]
+
+
+def feed(robot, data):
+    changes = []
+    robot.dict_merge(robot.master_state, robot.decode_payload('topic', json.dumps(data).encode()), changes)
+    robot.subscriptions.notify(changes)
+
+
+def drain(subscription):
+    items = []
+    while not subscription._queue.empty():
+        items.append(subscription._queue.get_nowait())
+    return items
+
+
+def test_first_message_and_deltas_are_delivered():
+    async def run():
+        robot = iRobot(iRobotConfig('blid', {'ip': '127.0.0.1', 'password': 'x', 'robotname': 'test'}))
+        phase = robot.subscribe('state.reported.cleanMissionStatus.phase')
+        mission = robot.subscribe('state.reported.cleanMissionStatus.+')
+        everything = robot.subscribe('state.reported.#')
+        maps = robot.subscribe('state.reported.pmaps')
+
+        feed(robot, FIRST)
+        assert drain(phase) == [[('state.reported.cleanMissionStatus.phase', 'charge')]]
+        assert drain(mission) == [[('state.reported.cleanMissionStatus.phase', 'charge'),
+                                   ('state.reported.cleanMissionStatus.cycle', 'none')]]
+        assert len(drain(everything)[0]) == 4
+        # lazy values are delivered decoded, as a copy
+        [[(path, pmaps)]] = drain(maps)
+        assert pmaps == [{'abc': '1'}]
+        pmaps[0]['abc'] = 'changed'
+        assert robot.get_property('pmaps') == [{'abc': '1'}]
+
+        feed(robot, DELTA)
+        feed(robot, DELTA)  # no change, nothing delivered
+        assert drain(phase) == [[('state.reported.cleanMissionStatus.phase', 'run')]]
+        assert drain(mission) == [[('state.reported.cleanMissionStatus.phase', 'run')]]
+        assert drain(everything) == [[('state.reported.cleanMissionStatus.phase', 'run')]]
+        assert drain(maps) == []
+
+    asyncio.run(run())
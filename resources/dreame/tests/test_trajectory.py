@@ -0,0 +1,129 @@
+import asyncio
+import json
+import math
+
+from irobot.configs import iRobotConfig
+from irobot.irobot import iRobot
+from irobot.trajectory import iRobotTrajectory, pose_to_point
+
+
+def pose(x, y):
+    return {'point': {'x': x, 'y': y}, 'theta': 0}
+
+
+def started():
+    trajectory = iRobotTrajectory('blid')
+    trajectory.start(start_time=0)
+    return trajectory
+
+
+def distance_to_segment(px, py, ax, ay, bx, by):
+    dx, dy = bx - ax, by - ay
+    ratio = max(0, min(1, ((px - ax) * dx + (py - ay) * dy) / (dx * dx + dy * dy)))
+    return math.hypot(px - ax - ratio * dx, py - ay - ratio * dy)
+
+
+def test_pose_to_point():
+    assert pose_to_point(pose(10, -5)) == (10, -5)
+    assert pose_to_point({'x': '3', 'y': 4}) == (3, 4)
+    assert pose_to_point({'point': {}}) is None
+    assert pose_to_point(None) is None
+
+
+def test_undocking_and_bogus_phases_are_ignored():
+    trajectory = started()
+    assert not trajectory.add(pose(0, 0), now=5)
+    assert not trajectory.add(pose(0, 0), phase='hmPostMsn', now=20)
+    assert trajectory.add(pose(0, 0), now=20)
+    assert len(trajectory) == 1
+
+
+def test_out_of_range_points_are_dropped():
+    trajectory = started()
+    # first point: nothing to compare with, it must still fit in 16 bits
+    assert not trajectory.add(pose(40000, 0), now=20)
+    assert trajectory.add(pose(0, 0), now=21)
+    # enough consistent reports to re-anchor, still out of range
+    for second in range(22, 22 + 2 * iRobotTrajectory.REANCHOR_COUNT):
+        assert not trajectory.add(pose(-40000, 50000), now=second)
+    assert trajectory.points() == [(0, 0)]
+    assert trajectory.dropped == 1 + 2 * iRobotTrajectory.REANCHOR_COUNT
+
+
+def test_jump_is_rejected_then_re_anchored():
+    trajectory = started()
+    trajectory.add(pose(0, 0), now=20)
+    for second in range(21, 21 + iRobotTrajectory.REANCHOR_COUNT - 1):
+        assert not trajectory.add(pose(1000, 1000), now=second)
+    assert trajectory.add(pose(1000, 1000), now=30)
+    assert trajectory.points() == [(0, 0), (1000, 1000)]
+    assert trajectory.new_segment
+
+
+def test_new_segment_after_a_bogus_phase():
+    trajectory = started()
+    assert trajectory.add(pose(0, 0), now=20) and trajectory.new_segment
+    assert trajectory.add(pose(10, 0), now=21) and not trajectory.new_segment
+    assert not trajectory.add(pose(0, 0), phase='hmMidMsn', now=22)
+    assert trajectory.add(pose(20, 0), now=23) and trajectory.new_segment
+    assert trajectory.add(pose(30, 10), now=24) and not trajectory.new_segment
+
+
+def test_collinear_points_are_collapsed():
+    trajectory = started()
+    for second, x in enumerate(range(0, 200, 10), start=20):
+        trajectory.add(pose(x, 0), now=second)
+    assert trajectory.points() == [(0, 0), (190, 0)]
+
+
+def test_collapsed_line_stays_within_tolerance_of_dropped_points():
+    # a slow arc: each triple is nearly straight, the whole run is not
+    trajectory = started()
+    reported = []
+    for step in range(60):
+        angle = math.radians(step)
+        point = (round(2000 * math.sin(angle)), round(2000 - 2000 * math.cos(angle)))
+        reported.append(point)
+        trajectory.add(pose(*point), now=20 + step)
+    kept = trajectory.points()
+    assert len(kept) > 2
+    segments = list(zip(kept, kept[1:]))
+    for px, py in reported:
+        deviation = min(distance_to_segment(px, py, ax, ay, bx, by) for (ax, ay), (bx, by) in segments)
+        assert deviation <= iRobotTrajectory.COLLINEAR_TOLERANCE + 1
+
+
+def test_encode_decode():
+    trajectory = started()
+    for second, point in enumerate([(0, 0), (50, 10), (80, -60), (-30, -90)], start=20):
+        trajectory.add(pose(*point), now=second)
+    decoded = iRobotTrajectory.decode('blid', trajectory.encode())
+    assert decoded.points() == trajectory.points()
+    assert decoded.start_time == trajectory.start_time
+    assert list(decoded._ts) == list(trajectory._ts)
+
+
+def test_finish_saves_the_file(tmp_path):
+    trajectory = iRobotTrajectory('blid', tmp_path)
+    trajectory.start(start_time=0)
+    trajectory.add(pose(0, 0), now=20)
+    trajectory.add(pose(30, 40), now=21)
+    file = trajectory.finish()
+    assert file is not None and file.parent == tmp_path/'blid'
+    assert iRobotTrajectory.load('blid', file).points() == [(0, 0), (30, 40)]
+
+
+def test_pose_history_is_not_aliased_to_the_state():
+    async def run():
+        robot = iRobot(iRobotConfig('blid', {'ip': '127.0.0.1', 'password': 'x', 'robotname': 'test'}))
+        changed = []
+        for x in (10, 20, 20):
+            # the pose dict of the state is updated in place by the merge
+            data = {'state': {'reported': {'pose': pose(x, 5)}}}
+            robot.dict_merge(robot.master_state, robot.decode_payload('topic', json.dumps(data).encode()))
+            robot.update_history('pose')
+            changed.append(robot.changed('pose'))
+        assert changed == [False, True, False]
+        assert robot.current('pose') is not robot.get_property('pose')
+
+    asyncio.run(run())
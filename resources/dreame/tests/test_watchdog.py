@@ -0,0 +1,139 @@
+import asyncio
+
+import pytest
+
+from irobot import irobot as irobot_module
+from irobot.configs import iRobotConfig
+from irobot.irobot import iRobot
+from irobot.scheduler import iRobotScheduler, VirtualClock
+from irobot.watchdog import iRobotCadence, iRobotWatchdog
+
+
+def watchdog(clock):
+    events = []
+    scheduler = iRobotScheduler(clock)
+    result = iRobotWatchdog(scheduler, 'blid', 'robot', lambda: events.append(('probe', clock())),
+                            lambda: events.append(('stale', clock())), deadline=300, probe_timeout=10)
+    return result, scheduler, events
+
+
+def silence(clock, scheduler, seconds):
+    clock.advance(seconds)
+    scheduler.run_due()
+
+
+def test_cadence_is_smoothed():
+    cadence = iRobotCadence()
+    cadence.add(10)
+    assert (cadence.mean, cadence.deviation) == (10, 5)
+    cadence.add(20)
+    assert cadence.mean == pytest.approx(11.25) and cadence.deviation == pytest.approx(5.625)
+    assert cadence.limit(8) == pytest.approx(11.25 + 8 * 5.625)
+
+
+def test_silence_limit_is_learnt_per_phase():
+    clock = VirtualClock()
+    dog, scheduler, events = watchdog(clock)
+    dog.feed('run')
+    for _ in range(dog.MIN_SAMPLES - 1):
+        clock.advance(10)
+        dog.feed('run')
+    # not enough messages yet: only the deadline applies
+    assert dog.silence_limit() == 290
+    clock.advance(10)
+    dog.feed('run')
+    learnt = 10 + dog.DEVIATION_FACTOR * 5 * (1 - iRobotCadence.ALPHA) ** (dog.MIN_SAMPLES - 1)
+    assert dog.silence_limit() == pytest.approx(learnt)
+    assert dog._timer.remaining() == pytest.approx(learnt)
+    # the interval across a phase change is not a sample of either phase
+    clock.advance(100)
+    dog.feed('charge')
+    assert dog.silence_limit() == 290 and 'charge' not in dog._cadences
+    clock.advance(100)
+    dog.feed('run')
+    assert dog.silence_limit() == pytest.approx(learnt)
+    # a chatty phase is never probed before the minimum silence
+    for _ in range(40):
+        clock.advance(1)
+        dog.feed('run')
+    assert dog.silence_limit() == dog.MIN_SILENCE
+    assert events == []
+
+
+def test_probe_answered_by_a_suback():
+    clock = VirtualClock()
+    dog, scheduler, events = watchdog(clock)
+    dog.feed('charge')
+    silence(clock, scheduler, 290)
+    assert events == [('probe', 290)] and dog.probes == 1
+    clock.advance(5)
+    dog.alive()  # the SUBACK of the probe subscription
+    silence(clock, scheduler, 10)
+    assert events == [('probe', 290)] and dog.detections == 0
+    # watched again from the answer
+    assert dog._timer.remaining() == 280
+
+
+def test_stale_after_an_unanswered_probe():
+    clock = VirtualClock()
+    dog, scheduler, events = watchdog(clock)
+    dog.feed('charge')
+    silence(clock, scheduler, 290)
+    silence(clock, scheduler, 10)
+    assert events == [('probe', 290), ('stale', 300)]
+    assert dog.detections == 1 and dog.last_detection_latency == 300
+    assert not dog._timer.armed
+    silence(clock, scheduler, 1000)
+    assert len(events) == 2
+
+
+class FakeMqttClient:
+    clients = []
+
+    def __init__(self, *args, **kwargs):
+        self.calls = []
+        self.clients.append(self)
+
+    def __getattr__(self, name):
+        if name.startswith('on_') or name.startswith('_'):
+            raise AttributeError(name)
+        return lambda *args, **kwargs: self.calls.append(name)
+
+    def loop_start(self):
+        self.calls.append('loop_start')
+        self.on_connect(self, None, None, 0, None)
+
+
+def test_stale_connection_is_restarted(monkeypatch):
+    monkeypatch.setattr(irobot_module.mqtt, 'Client', FakeMqttClient)
+    FakeMqttClient.clients = []
+    clock = VirtualClock()
+    scheduler = iRobotScheduler(clock)
+
+    async def run():
+        robot = iRobot(iRobotConfig('a', {'ip': '10.0.0.1', 'password': 'x', 'robotname': 'A'}), scheduler=scheduler)
+        assert await robot.connect()
+        [client] = FakeMqttClient.clients
+        await asyncio.sleep(0)
+        limit = robot.watchdog.silence_limit()
+
+        # the probe is answered: nothing else happens
+        client.calls.clear()
+        silence(clock, scheduler, limit)
+        assert client.calls == ['subscribe']
+        robot.on_robot_mqtt_subscribe(client, None, 1, [0], None)
+        await asyncio.sleep(0)
+        silence(clock, scheduler, robot.watchdog.probe_timeout)
+        assert client.calls == ['subscribe'] and robot.connected
+
+        # then the robot goes silent: the connection is restarted
+        silence(clock, scheduler, limit)
+        silence(clock, scheduler, robot.watchdog.probe_timeout)
+        assert robot.watchdog.detections == 1
+        await asyncio.sleep(0.1)
+        assert client.calls[1:4] == ['subscribe', 'loop_stop', 'loop_stop']
+        assert client.calls[4:6] == ['reconnect', 'loop_start'] and robot.connected
+        assert robot.watchdog._timer.armed
+        await robot.close()
+
+    asyncio.run(run())